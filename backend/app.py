@@ -1,13 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+from typing import Optional
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from tortoise.contrib.fastapi import register_tortoise
 
+from . import governor, memory, settings
+from .assets import FingerprintedStaticFiles
+from .bots import RUNNER as BOTS
+from .db import build_tortoise_config, upgrade_schema
+from .images import ResponsiveImageFiles
+from .logs import LOG, AccessLogMiddleware
+from .profiling import ProfilingMiddleware
+from .routers import admin as admin_router
+from .routers import matchmaking as matchmaking_router
+from .routers import metrics as metrics_router
 from .routers import users as users_router
 from .routers import rooms as rooms_router
 from .routers import websockets as ws_router
+from .scheduler import SCHEDULER
 from .lobby import broadcast_lobbies  # imported for side-effects / completeness
 
 # -----------------------------
@@ -25,40 +38,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Samples a fraction of HTTP requests under cProfile (off unless configured).
+app.add_middleware(ProfilingMiddleware)
+
+# One sampled ``http_request`` record per request (see ``backend.logs``).
+app.add_middleware(AccessLogMiddleware)
+
 # Register routers
 app.include_router(users_router.router)
 app.include_router(rooms_router.router)
+app.include_router(matchmaking_router.router)
 app.include_router(ws_router.router)
+app.include_router(metrics_router.router)
+app.include_router(admin_router.router)
 
 # -----------------------------
 # Static file mounting
 # -----------------------------
 
-# Mount images at /images (caching allowed)
-app.mount("/images", StaticFiles(directory="images"), name="images")
-
-# Custom StaticFiles variant that disables caching for the SPA assets.
-class NoCacheStaticFiles(StaticFiles):
-    async def get_response(self, path: str, scope):  # type: ignore[override]
-        response = await super().get_response(path, scope)
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
-        return response
+# Mount images at /images. Role portraits are served as resized WebP/PNG
+# variants negotiated from ``Accept`` and ``?w=`` (see ``backend.images``);
+# the originals until the variants are built.
+image_files = ResponsiveImageFiles(directory="images")
+app.mount("/images", image_files, name="images")
 
-# Mount the frontend (index.html etc.) at root path.
-app.mount("/", NoCacheStaticFiles(directory="frontend", html=True), name="frontend")
+# Mount the frontend (index.html etc.) at root path. Sub-resources are served
+# under content-hashed names with long-lived caching; HTML entries revalidate.
+app.mount("/", FingerprintedStaticFiles(directory="frontend", html=True), name="frontend")
 
 # -----------------------------
 # Database (Tortoise ORM)
 # -----------------------------
 
+
+@app.on_event("startup")
+async def _upgrade_schema() -> None:
+    # Registered before Tortoise's own hook so older database files get new
+    # columns before ``generate_schemas`` indexes them.
+    upgrade_schema()
+
+
+# WAL-mode SQLite with a pool of read-only connections (see ``backend.db``).
 register_tortoise(
     app,
-    db_url="sqlite://database.db",
-    modules={"models": ["backend.models"]},
+    config=build_tortoise_config(),
     generate_schemas=True,
     add_exception_handlers=True,
 )
 
+# -----------------------------
+# Lifecycle
+# -----------------------------
+
+
+@app.on_event("startup")
+async def _start_log_writer() -> None:
+    # Log records are written by a background thread, never on the event loop.
+    LOG.start()
+    LOG.info("server_started")
+
+
+@app.on_event("startup")
+async def _start_tracemalloc() -> None:
+    # Opt-in allocation tracing for /admin/memory (see ``backend.memory``).
+    if settings.TRACEMALLOC_FRAMES:
+        memory.start_tracing(settings.TRACEMALLOC_FRAMES)
+
+
+@app.on_event("startup")
+async def _start_lag_probe() -> None:
+    # Event-loop lag feeds the governor's load shedding (see ``backend.governor``).
+    governor.ensure_started()
+
+
+_image_build: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def _build_image_variants() -> None:
+    # Rendered off the event loop; startup does not wait for it.
+    global _image_build
+    _image_build = asyncio.get_running_loop().create_task(image_files.refresh())
+
+
+@app.on_event("shutdown")
+async def _stop_bots() -> None:
+    # Cancel pending bot moves and stop the search worker processes.
+    BOTS.shutdown()
+
+
+@app.on_event("shutdown")
+async def _stop_scheduler() -> None:
+    # Room expiry and turn timers all live in this one heap.
+    SCHEDULER.shutdown()
+
+
+@app.on_event("shutdown")
+async def _stop_log_writer() -> None:
+    # Registered last so records from the other shutdown hooks are written too.
+    LOG.info("server_stopped")
+    LOG.close()
+
+
 __all__ = ["app"] 
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""Fingerprinted, precompressed static assets for the SPA.
+
+At startup every file in the frontend directory is read once, and each
+sub-resource (scripts, JSON, stylesheets) is renamed to
+``<stem>.<content-hash><suffix>``. References to those names inside the
+other assets are rewritten so that the HTML entry points always point at
+the current fingerprint. Hashed names can then be cached forever
+(``immutable``) while the HTML entries revalidate cheaply via ``ETag``.
+
+gzip and (when the optional ``brotli`` package is installed) brotli
+variants are computed up front and picked per request from
+``Accept-Encoding``.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Scope
+
+try:  # optional dependency – gzip alone is fine without it
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+# Sub-resources that get a content hash in their public name.
+FINGERPRINT_SUFFIXES = {".js", ".css", ".json"}
+# Only compress text formats; images are already compressed.
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".svg", ".txt"}
+# Anything smaller gains nothing from compression.
+MIN_COMPRESS_BYTES = 512
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".json": "application/json",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+
+@dataclass
+class Asset:
+    """A single servable file and its precompressed encodings."""
+
+    name: str
+    media_type: str
+    digest: str
+    immutable: bool
+    # encoding ("identity" | "gzip" | "br") -> body
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}-{encoding}"'
+
+
+# -----------------------------
+# Build step
+# -----------------------------
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    stem, suffix = os.path.splitext(name)
+    return f"{stem}.{digest}{suffix}"
+
+
+def _rewrite_references(text: str, mapping: Dict[str, str]) -> str:
+    """Replace quoted / path references to original names with hashed names."""
+    for original, hashed in mapping.items():
+        pattern = r"(?<=[\"'/])" + re.escape(original) + r"(?=[\"'?#])"
+        text = re.sub(pattern, hashed, text)
+    return text
+
+
+def _encode(data: bytes, suffix: str) -> Dict[str, bytes]:
+    bodies = {"identity": data}
+    if suffix in COMPRESSIBLE_SUFFIXES and len(data) >= MIN_COMPRESS_BYTES:
+        bodies["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(data, quality=11)
+    return bodies
+
+
+def build_assets(directory: str) -> Tuple[Dict[str, Asset], Dict[str, str]]:
+    """Fingerprint and precompress every file in *directory*.
+
+    Returns ``(assets, manifest)`` where *assets* maps each public path to
+    its :class:`Asset` and *manifest* maps original names to hashed names.
+    """
+    raw: Dict[str, bytes] = {}
+    for root, _dirs, files in os.walk(directory):
+        for fname in files:
+            full = os.path.join(root, fname)
+            rel = os.path.relpath(full, directory).replace(os.sep, "/")
+            with open(full, "rb") as fh:
+                raw[rel] = fh.read()
+
+    # Hash every fingerprintable file, rewrite references in all text files
+    # and re-hash until the manifest stops changing. Each pass settles one
+    # level of the reference chain (HTML -> JS -> JSON).
+    manifest: Dict[str, str] = {}
+    contents = dict(raw)
+    for _ in range(len(raw) + 1):
+        new_manifest: Dict[str, str] = {}
+        for rel, data in contents.items():
+            if os.path.splitext(rel)[1] in FINGERPRINT_SUFFIXES:
+                new_manifest[rel] = _hashed_name(rel, _digest(data))
+        if new_manifest == manifest:
+            break
+        manifest = new_manifest
+        rewritten: Dict[str, bytes] = {}
+        for rel, data in raw.items():
+            if os.path.splitext(rel)[1] in COMPRESSIBLE_SUFFIXES:
+                text = data.decode("utf-8")
+                rewritten[rel] = _rewrite_references(text, manifest).encode("utf-8")
+            else:
+                rewritten[rel] = data
+        contents = rewritten
+
+    assets: Dict[str, Asset] = {}
+    for rel, data in contents.items():
+        suffix = os.path.splitext(rel)[1]
+        media_type = MEDIA_TYPES.get(suffix, "application/octet-stream")
+        digest = _digest(data)
+        bodies = _encode(data, suffix)
+        if rel in manifest:
+            assets[manifest[rel]] = Asset(manifest[rel], media_type, digest, True, bodies)
+        # Original names stay reachable (old clients, direct links) but revalidate.
+        assets[rel] = Asset(rel, media_type, digest, False, bodies)
+    return assets, manifest
+
+
+# -----------------------------
+# Content negotiation
+# -----------------------------
+
+
+def _accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    if not header:
+        return accepted
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header: Optional[str], available: List[str]) -> str:
+    """Pick the best of *available* encodings allowed by an ``Accept-Encoding`` header."""
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    for enc in ("br", "gzip"):
+        if enc in available and accepted.get(enc, wildcard) > 0:
+            return enc
+    return "identity"
+
+
+# -----------------------------
+# ASGI static file handler
+# -----------------------------
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """``StaticFiles`` that serves the in-memory fingerprinted asset table.
+
+    Paths not present in the table fall through to the regular disk-backed
+    implementation with revalidation headers.
+    """
+
+    def __init__(self, *, directory: str, html: bool = True, **kwargs) -> None:
+        super().__init__(directory=directory, html=html, **kwargs)
+        self.assets, self.manifest = build_assets(directory)
+
+    def _lookup(self, path: str) -> Optional[Asset]:
+        if path in ("", "."):
+            path = "index.html"
+        elif path.endswith("/"):
+            path += "index.html"
+        asset = self.assets.get(path)
+        if asset is None and self.html and not os.path.splitext(path)[1]:
+            asset = self.assets.get(path.rstrip("/") + "/index.html")
+        return asset
+
+    async def get_response(self, path: str, scope: Scope) -> Response:  # type: ignore[override]
+        asset = self._lookup(path.replace(os.sep, "/"))
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            response = await super().get_response(path, scope)
+            response.headers["Cache-Control"] = REVALIDATE_CACHE
+            return response
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding"), list(asset.bodies))
+        etag = asset.etag(encoding)
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE if asset.immutable else REVALIDATE_CACHE,
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if_none_match = request_headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        body = asset.bodies[encoding] if scope["method"] == "GET" else b""
+        response = Response(body, media_type=asset.media_type, headers=headers)
+        if scope["method"] == "HEAD":
+            response.headers["Content-Length"] = str(len(asset.bodies[encoding]))
+        return response
+
+
+__all__ = [
+    "Asset",
+    "build_assets",
+    "choose_encoding",
+    "FingerprintedStaticFiles",
+]
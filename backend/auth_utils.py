@@ -1,9 +1,12 @@
-from typing import Optional
+import asyncio
+import hmac
+from typing import Optional, Tuple
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from passlib.context import CryptContext
 
+from . import metrics, settings
 from .models import User
 
 # -----------------------------
@@ -16,9 +19,30 @@ def hash_password(password: str) -> str:
     """Return a secure bcrypt hash of *password*."""
     return pwd_context.hash(password)
 
+def _timed_verify(password: str, hashed: str) -> Tuple[bool, float]:
+    start = metrics.now()
+    ok = pwd_context.verify(password, hashed)
+    return ok, metrics.now() - start
+
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify *password* against *hashed* bcrypt digest."""
-    return pwd_context.verify(password, hashed)
+    """Verify *password* against *hashed* bcrypt digest (on the event loop thread)."""
+    ok, elapsed = _timed_verify(password, hashed)
+    metrics.BCRYPT_VERIFY_SECONDS.observe(elapsed)
+    return ok
+
+# bcrypt takes hundreds of milliseconds by design; on the event loop a burst
+# of signups or logins would stall every game. Async callers use these.
+
+async def hash_password_async(password: str) -> str:
+    """:func:`hash_password` in a worker thread."""
+    return await asyncio.to_thread(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """:func:`verify_password` in a worker thread."""
+    # Metrics are loop-only objects, so the thread just reports its timing.
+    ok, elapsed = await asyncio.to_thread(_timed_verify, password, hashed)
+    metrics.BCRYPT_VERIFY_SECONDS.observe(elapsed)
+    return ok
 
 # -----------------------------
 # FastAPI dependency helpers
@@ -35,14 +59,43 @@ async def get_current_user(credentials: HTTPBasicCredentials = Depends(security)
         If the credentials are invalid.
     """
     user: Optional[User] = await User.filter(username=credentials.username).first()
-    if not user or not verify_password(credentials.password, user.password_hash):
+    if not user or not await verify_password_async(credentials.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     return user
 
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+async def require_admin(request: Request, authorization: Optional[str] = Header(default=None)) -> None:
+    """Guard for operator-only endpoints.
+
+    Accepts ``Authorization: Bearer <AVALON_ADMIN_TOKEN>``. When no token is
+    configured only loopback clients are allowed.
+
+    Raises
+    ------
+    HTTPException
+        If the caller is not authorised.
+    """
+    token = settings.ADMIN_TOKEN
+    if token:
+        supplied = ""
+        if authorization and authorization.lower().startswith("bearer "):
+            supplied = authorization.split(" ", 1)[1].strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
+        return
+    client_host = request.client.host if request.client else ""
+    if client_host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are local-only")
+
 __all__ = [
     "pwd_context",
     "hash_password",
     "verify_password",
+    "hash_password_async",
+    "verify_password_async",
     "security",
     "get_current_user",
+    "require_admin",
 ] 
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""Server-side bot players.
+
+Bots are ordinary seats whose ``user_id`` starts with ``bot-``; they have
+no websocket and no database row. Whenever a room's state changes
+(:func:`backend.game_logic.dispatch_events` calls :meth:`BotRunner.notify`)
+every bot that now owes a decision gets a task that runs an ISMCTS search
+(:mod:`backend.ismcts`) in a process pool under a per-move time budget and
+then plays the chosen move through ``handle_ws_message`` exactly like a
+human client would. The event loop only ever awaits the pool future, so a
+thinking bot never delays other rooms.
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import random
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Set, Tuple
+
+from . import ismcts, metrics, settings
+from .engine import GameState
+from .logs import LOG
+from .room import RoomPlayer
+
+BOT_PREFIX = "bot-"
+BOT_NAMES = (
+    "Galahad", "Gawain", "Tristan", "Bedivere", "Kay", "Lancelot",
+    "Gareth", "Bors", "Lamorak", "Ywain", "Dagonet", "Pelleas",
+)
+# Seats a table can hold (largest key of ``QUEST_SIZES``).
+MAX_PLAYERS = 10
+
+
+def is_bot(user_id: str) -> bool:
+    return user_id.startswith(BOT_PREFIX)
+
+
+def new_bot(state: GameState) -> RoomPlayer:
+    """Return a ready bot :class:`RoomPlayer` with a name not yet used at the table."""
+    taken = {p.name for p in state.players.values()}
+    name = next((f"{n} (bot)" for n in BOT_NAMES if f"{n} (bot)" not in taken), f"Bot {len(taken) + 1}")
+    return RoomPlayer(f"{BOT_PREFIX}{uuid.uuid4().hex[:12]}", name, ready=True, bot=True)
+
+
+def decision_key(state: GameState, user_id: str) -> Optional[Tuple[Any, ...]]:
+    """Identify the decision *user_id* owes in *state*, or ``None`` if there is none.
+
+    A search result is only played if the key is unchanged when it comes back.
+    """
+    player = state.players.get(user_id)
+    if player is None:
+        return None
+    if state.phase == "lobby":
+        return ("ready",) if not player.ready else None
+    if not ismcts.legal_actions(state, user_id):
+        return None
+    return (state.phase, state.subphase, state.round_number, state.consecutive_rejections,
+            len(state.quest_history), tuple(state.assassin_candidates))
+
+
+class BotRunner:
+    """Schedules bot decisions and owns the search process pool."""
+
+    def __init__(self, workers: int, budget_ms: int, max_iterations: int) -> None:
+        self.workers = workers
+        self.budget_ms = budget_ms
+        self.max_iterations = max_iterations
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._thinking: Set[Tuple[str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # "spawn" so workers never inherit the server's event loop or DB threads.
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def shutdown(self) -> None:
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def notify(self, room: Any) -> None:
+        """Start a decision task for every bot in *room* that owes a move."""
+        if self._closed:
+            return
+        for uid in list(room.players):
+            if not is_bot(uid) or (room.room_id, uid) in self._thinking:
+                continue
+            key = decision_key(room, uid)
+            if key is None:
+                continue
+            self._thinking.add((room.room_id, uid))
+            task = asyncio.create_task(self._act(room, uid, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _act(self, room: Any, uid: str, key: Tuple[Any, ...]) -> None:
+        from .game_logic import handle_ws_message
+        from .state import rooms
+
+        kind = "ready" if key == ("ready",) else str(room.subphase or room.phase)
+        failed = False
+        try:
+            actions = ismcts.legal_actions(room, uid)
+            if key == ("ready",):
+                msg: Dict[str, Any] = {"type": "toggle_ready"}
+            elif len(actions) == 1:
+                msg = ismcts.to_message(actions[0])
+            else:
+                start = metrics.now()
+                obs = ismcts.observe(room, uid)
+                msg, iterations = await asyncio.get_running_loop().run_in_executor(
+                    self.pool(), ismcts.choose, obs, self.budget_ms, self.max_iterations, random.getrandbits(32),
+                )
+                metrics.BOT_THINK_SECONDS.observe(metrics.now() - start, kind)
+                metrics.BOT_ITERATIONS.observe(iterations, kind)
+            # Only play the move if the game has not moved on while we were thinking.
+            if rooms.get(room.room_id) is room and decision_key(room, uid) == key:
+                metrics.BOT_MOVES.inc(kind)
+                await handle_ws_message(room, uid, msg)
+        except Exception:
+            failed = True
+            metrics.BOT_ERRORS.inc(kind)
+            LOG.exception("bot_error", room_id=room.room_id, user_id=uid, type=kind)
+        finally:
+            self._thinking.discard((room.room_id, uid))
+        # Decisions that became due while this one was running were skipped by notify().
+        if not failed and rooms.get(room.room_id) is room:
+            self.notify(room)
+
+
+RUNNER = BotRunner(settings.BOT_WORKERS, settings.BOT_MOVE_BUDGET_MS, settings.BOT_MAX_ITERATIONS)
+
+__all__ = ["BOT_PREFIX", "MAX_PLAYERS", "is_bot", "new_bot", "decision_key", "BotRunner", "RUNNER"]
@@ -0,0 +1,78 @@
+"""Named channels over one multiplexed websocket (``/mux``).
+
+A :class:`ChannelSocket` stands in for a websocket wherever room and
+lobby code expects one (``Room.connections``, ``state.lobby_connections``).
+Whatever is sent through it goes out on the shared connection with a
+``"channel"`` key spliced into the already serialised JSON, so fan-outs
+that serialise once per change keep doing so. Closing a channel only
+tells the client that this channel ended; the connection stays up.
+
+Client → server frames::
+
+    {"op": "subscribe", "channel": "lobbies"}
+    {"op": "subscribe", "channel": "room:<room_id>", "since": 17, "auth": "<base64 user:pass>"}
+    {"op": "subscribe", "channel": "spectate:<room_id>", "password": "<room password, if any>"}
+    {"op": "unsubscribe", "channel": "room:<room_id>"}
+    {"channel": "room:<room_id>", "type": "vote_team", "approve": true}
+
+Server → client frames carry the same ``"channel"`` key; a channel that
+ends gets ``{"channel": ..., "type": "closed", "code": <close code>}``
+(plus ``"reason"`` when the close carries one, e.g. ``"retry-after=5"``)
+using the codes of the single-purpose endpoints (4001 bad credentials,
+4002 not a member, 4003 superseded, 4004 room closed, 4005 spectator
+limit reached).
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from fastapi import WebSocket
+
+LOBBIES = "lobbies"
+ROOM_PREFIX = "room:"
+SPECTATE_PREFIX = "spectate:"
+
+
+def room_id_of(channel: Any, prefix: str = ROOM_PREFIX) -> Optional[str]:
+    """Return the room id of a ``<prefix><id>`` channel name, else ``None``."""
+    if isinstance(channel, str) and channel.startswith(prefix) and len(channel) > len(prefix):
+        return channel[len(prefix):]
+    return None
+
+
+class ChannelSocket:
+    """WebSocket look-alike that writes into one channel of a shared connection."""
+
+    __slots__ = ("websocket", "name", "closed", "_prefix")
+
+    def __init__(self, websocket: WebSocket, name: str) -> None:
+        self.websocket = websocket
+        self.name = name
+        self.closed = False
+        self._prefix = '{"channel":' + json.dumps(name)
+
+    async def send_text(self, text: str) -> None:
+        if self.closed:
+            raise RuntimeError(f"channel {self.name} is closed")
+        # ``text`` is always a serialised JSON object: splice the channel in front.
+        body = text[1:]
+        await self.websocket.send_text(self._prefix + ("," + body if body != "}" else body))
+
+    async def send_json(self, data: Any, mode: str = "text") -> None:
+        await self.send_text(json.dumps(data, separators=(",", ":")))
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        frame: dict = {"channel": self.name, "type": "closed", "code": code}
+        if reason:
+            frame["reason"] = reason
+        try:
+            await self.websocket.send_text(json.dumps(frame, separators=(",", ":")))
+        except Exception:
+            pass
+
+
+__all__ = ["LOBBIES", "ROOM_PREFIX", "SPECTATE_PREFIX", "room_id_of", "ChannelSocket"]
@@ -1,5 +1,8 @@
-GOOD_ROLES = {"Merlin", "Percival", "Loyal Servant of Arthur"}
-EVIL_ROLES = {"Mordred", "Morgana", "Oberon", "Minion of Mordred"}
+from .roles import team_roles
+
+# Role names per team, derived from the role table (``backend.roles``).
+GOOD_ROLES = set(team_roles("Good"))
+EVIL_ROLES = set(team_roles("Evil"))
 
 # Required team sizes per quest round for each total player count.
 # Index 0-4 correspond to quests 1-5 respectively.
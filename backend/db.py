@@ -0,0 +1,229 @@
+"""Tortoise ORM configuration for the SQLite backing store.
+
+The database runs in WAL mode so readers never block the single writer.
+Writes (signup, profile edits, game statistics) go through the ``default``
+connection while read-only queries (profiles, leaderboard, auth lookups)
+are spread round-robin across a small pool of ``query_only`` reader
+connections by :class:`ReadPoolRouter`.
+
+This module doubles as the Tortoise engine for those connections: its
+``client_class`` is the stock SQLite client, except that a connection is
+published only once it is open, with per-query latency recorded in
+:data:`backend.metrics.DB_QUERY_SECONDS`.
+"""
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from itertools import cycle
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+import aiosqlite
+from tortoise.backends.sqlite.client import SqliteClient
+
+from . import metrics, settings
+
+WRITER = "default"
+MODELS_MODULES = ["backend.models"]
+ENGINE = "backend.db"
+
+
+def _pragmas(read_only: bool) -> Dict[str, Any]:
+    """Return the PRAGMA settings applied to every new SQLite connection.
+
+    Tortoise's SQLite client forwards unknown credential keys as
+    ``PRAGMA key=value`` statements when the connection is opened.
+    """
+    pragmas: Dict[str, Any] = {
+        "journal_mode": "WAL",
+        "synchronous": settings.DB_SYNCHRONOUS,
+        "busy_timeout": settings.DB_BUSY_TIMEOUT_MS,
+        "cache_size": -abs(settings.DB_CACHE_KB),
+        "temp_store": "MEMORY",
+        "mmap_size": settings.DB_MMAP_BYTES,
+        "foreign_keys": "ON",
+    }
+    if read_only:
+        pragmas["query_only"] = "ON"
+    return pragmas
+
+
+def reader_names(count: Optional[int] = None) -> List[str]:
+    """Return the connection names used for the read pool."""
+    n = settings.DB_READERS if count is None else count
+    return [f"reader_{i}" for i in range(n)]
+
+
+def build_tortoise_config(db_path: Optional[str] = None, readers: Optional[int] = None) -> Dict[str, Any]:
+    """Return a ``Tortoise.init`` config dict for *db_path* with *readers* read connections."""
+    path = db_path or settings.DB_PATH
+    n_readers = settings.DB_READERS if readers is None else readers
+    if path == ":memory:":
+        # Every in-memory connection is a separate database – no pool possible.
+        n_readers = 0
+
+    connections: Dict[str, Any] = {
+        WRITER: {
+            "engine": ENGINE,
+            "credentials": {"file_path": path, **_pragmas(read_only=False)},
+        }
+    }
+    for name in reader_names(n_readers):
+        connections[name] = {
+            "engine": ENGINE,
+            "credentials": {"file_path": path, **_pragmas(read_only=True)},
+        }
+
+    config: Dict[str, Any] = {
+        "connections": connections,
+        "apps": {
+            "models": {
+                "models": MODELS_MODULES,
+                "default_connection": WRITER,
+            }
+        },
+    }
+    if n_readers:
+        ReadPoolRouter.configure(reader_names(n_readers))
+        config["routers"] = ["backend.db.ReadPoolRouter"]
+    return config
+
+
+# -----------------------------
+# Schema upgrades
+# -----------------------------
+
+# Columns added to tables after their first release. ``generate_schemas``
+# only creates missing tables (and would fail creating an index on a missing
+# column), so older database files are brought up to date before it runs.
+ADDED_COLUMNS: Dict[str, List[Tuple[str, str]]] = {
+    "users": [
+        ("rating", "REAL NOT NULL DEFAULT {rating_initial}"),
+        ("rated_games", "INT NOT NULL DEFAULT 0"),
+    ],
+}
+
+
+def upgrade_schema(db_path: Optional[str] = None) -> List[str]:
+    """Add missing :data:`ADDED_COLUMNS` to an existing database; return what was added."""
+    path = db_path or settings.DB_PATH
+    if path == ":memory:":
+        return []
+    added: List[str] = []
+    conn = sqlite3.connect(path)
+    try:
+        for table, columns in ADDED_COLUMNS.items():
+            present = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if not present:
+                continue  # new database – generate_schemas creates the table
+            for name, ddl in columns:
+                if name not in present:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} "
+                                 + ddl.format(rating_initial=float(settings.RATING_INITIAL)))
+                    added.append(f"{table}.{name}")
+        conn.commit()
+    finally:
+        conn.close()
+    return added
+
+
+# -----------------------------
+# Engine
+# -----------------------------
+
+
+class PoolSqliteClient(SqliteClient):
+    """``SqliteClient`` that is safe to open lazily from concurrent queries.
+
+    The stock client sets ``_connection`` before the sqlite handle is open,
+    and a query starting meanwhile picks up that half-open handle ("no
+    active connection"). Reader connections are opened by whichever queries
+    reach them first, so here the connection is opened under a lock and
+    published only once its pragmas are applied.
+    """
+
+    def __init__(self, file_path: str, **kwargs: Any) -> None:
+        super().__init__(file_path, **kwargs)
+        self._connect_lock = asyncio.Lock()
+
+    async def create_connection(self, with_db: bool) -> None:
+        async with self._connect_lock:
+            if self._connection is not None:
+                return
+            connection = await aiosqlite.connect(self.filename, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            for pragma, val in self.pragmas.items():
+                cursor = await connection.execute(f"PRAGMA {pragma}={val}")
+                await cursor.close()
+            self._connection = connection
+
+
+def _statement_kind(query: str) -> str:
+    head = query.lstrip()[:8].split(None, 1)
+    return head[0].lower() if head else "unknown"
+
+
+class InstrumentedSqliteClient(PoolSqliteClient):
+    """:class:`PoolSqliteClient` that records the latency of every statement."""
+
+    async def execute_insert(self, query: str, values: list) -> int:
+        start = metrics.now()
+        try:
+            return await super().execute_insert(query, values)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(metrics.now() - start, self.connection_name, "insert")
+
+    async def execute_many(self, query: str, values: List[list]) -> None:
+        start = metrics.now()
+        try:
+            return await super().execute_many(query, values)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(metrics.now() - start, self.connection_name, "many")
+
+    async def execute_query(self, query: str, values: Optional[list] = None) -> Any:
+        start = metrics.now()
+        try:
+            return await super().execute_query(query, values)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(metrics.now() - start, self.connection_name, _statement_kind(query))
+
+    async def execute_query_dict(self, query: str, values: Optional[Sequence] = None) -> List[dict]:
+        start = metrics.now()
+        try:
+            return await super().execute_query_dict(query, values)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(metrics.now() - start, self.connection_name, _statement_kind(query))
+
+
+# Entry point looked up by Tortoise when ``engine`` is ``backend.db``.
+client_class = InstrumentedSqliteClient
+
+
+class ReadPoolRouter:
+    """Route reads round-robin across the reader pool and writes to ``default``."""
+
+    _readers: Iterator[str] = cycle([WRITER])
+
+    @classmethod
+    def configure(cls, names: List[str]) -> None:
+        cls._readers = cycle(names or [WRITER])
+
+    def db_for_read(self, model: Type[Any]) -> str:
+        return next(self._readers)
+
+    def db_for_write(self, model: Type[Any]) -> str:
+        return WRITER
+
+
+__all__ = [
+    "WRITER",
+    "MODELS_MODULES",
+    "build_tortoise_config",
+    "reader_names",
+    "ADDED_COLUMNS",
+    "upgrade_schema",
+    "ReadPoolRouter",
+    "PoolSqliteClient",
+    "InstrumentedSqliteClient",
+    "client_class",
+]
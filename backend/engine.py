@@ -0,0 +1,679 @@
+"""Headless Avalon rules engine.
+
+Every rule of the game lives here as a plain synchronous state transition:
+a function takes a :class:`GameState` plus the acting user's id and the
+action's arguments, mutates the state and returns the list of
+:class:`Event` objects the transition produced. Nothing in this module
+touches websockets, FastAPI, pydantic or the database, so it can drive
+simulations, bots and fuzzers directly. ``backend.game_logic`` wraps the
+same transitions for the live server and turns the events into network
+messages and statistics writes.
+
+Players only need ``user_id``, ``name``, ``role`` and ``ready``
+attributes, and the config only needs the :class:`GameConfig` attributes,
+so the server's slotted ``RoomPlayer`` and the lightweight :class:`Seat` /
+:class:`GameConfig` classes below are interchangeable.
+"""
+from __future__ import annotations
+
+import random
+from collections import Counter
+from math import ceil
+from typing import Any, Dict, List, Optional, Tuple
+
+from .constants import EVIL_ROLES, GOOD_ROLES, QUEST_SIZES
+from .roles import compile_visibility
+
+# -----------------------------
+# Plain data containers
+# -----------------------------
+
+
+class Seat:
+    """Minimal player record used by headless games."""
+
+    __slots__ = ("user_id", "name", "role", "ready")
+
+    def __init__(self, user_id: str, name: str, role: Optional[str] = None, ready: bool = False) -> None:
+        self.user_id = user_id
+        self.name = name
+        self.role = role
+        self.ready = ready
+
+    def __repr__(self) -> str:
+        return f"Seat({self.user_id!r}, {self.name!r}, role={self.role!r}, ready={self.ready!r})"
+
+
+class GameConfig:
+    """Framework-free mirror of :class:`backend.schemas.RoomConfig`."""
+
+    __slots__ = ("merlin", "mordred", "morgana", "percival", "oberon", "lady_enabled", "lady_after_rounds")
+
+    def __init__(
+        self,
+        merlin: bool = True,
+        mordred: bool = True,
+        morgana: bool = True,
+        percival: bool = True,
+        oberon: bool = False,
+        lady_enabled: bool = True,
+        lady_after_rounds: Optional[List[int]] = None,
+    ) -> None:
+        self.merlin = merlin
+        self.mordred = mordred
+        self.morgana = morgana
+        self.percival = percival
+        self.oberon = oberon
+        self.lady_enabled = lady_enabled
+        self.lady_after_rounds = [2, 3, 4] if lady_after_rounds is None else list(lady_after_rounds)
+
+
+class Event:
+    """Something a transition wants the outside world to know about.
+
+    ``kind`` is one of ``state`` (public snapshot changed), ``lobbies``
+    (lobby list changed), ``game_over`` (a game just finished) or the
+    ``type`` of a wire message carried in ``payload``. ``to`` is the
+    recipient's user id, or ``None`` for everyone in the room.
+    """
+
+    __slots__ = ("kind", "payload", "to")
+
+    def __init__(self, kind: str, payload: Optional[Dict[str, Any]] = None, to: Optional[str] = None) -> None:
+        self.kind = kind
+        self.payload = payload
+        self.to = to
+
+    def __repr__(self) -> str:
+        return f"Event({self.kind!r}, {self.payload!r}, to={self.to!r})"
+
+
+# Payload-free events are shared to keep transitions allocation-light.
+STATE = Event("state")
+LOBBIES = Event("lobbies")
+GAME_OVER = Event("game_over")
+
+
+class GameState:
+    """All rule-relevant state of one table. ``backend.room.Room`` extends it."""
+
+    __slots__ = (
+        "host_id", "players", "config", "phase", "quest_history", "current_leader",
+        "consecutive_rejections", "round_number", "good_wins", "evil_wins", "subphase",
+        "current_team", "votes", "winner", "submissions", "proposal_leader",
+        "assassin_candidates", "assassin_votes", "lady_holder", "lady_history", "visibility",
+    )
+
+    def __init__(self, host_id: str, players: Dict[str, Any], config: Any = None) -> None:
+        self.host_id = host_id
+        self.players: Dict[str, Any] = players
+        self.config = config if config is not None else GameConfig()
+        self.phase = "lobby"
+        self.quest_history: List[dict] = []
+        self.current_leader: Optional[str] = None
+        self.consecutive_rejections: int = 0
+        # Game progression fields
+        self.round_number: int = 0
+        self.good_wins: int = 0
+        self.evil_wins: int = 0
+        self.subphase: Optional[str] = None
+        self.current_team: List[str] = []
+        self.votes: Dict[str, bool] = {}
+        self.winner: Optional[str] = None
+        self.submissions: Dict[str, str] = {}
+        self.proposal_leader: Optional[str] = None
+        # Assassination phase voting data
+        self.assassin_candidates: List[str] = []
+        self.assassin_votes: Dict[str, str] = {}
+        # --- Lady of the Lake runtime state --- #
+        self.lady_holder: Optional[str] = None  # user_id of the player currently holding the token
+        self.lady_history: List[str] = []  # track all previous holders to enforce uniqueness
+        # Night knowledge compiled when roles are dealt (``backend.roles.Visibility``).
+        self.visibility: Any = None
+
+    @classmethod
+    def new(cls, names: List[str], config: Any = None) -> "GameState":
+        """Return a lobby of :class:`Seat` players named *names* (ids ``p0``..``pN``)."""
+        seats = {f"p{i}": Seat(f"p{i}", name) for i, name in enumerate(names)}
+        return cls(next(iter(seats)), seats, config)
+
+    def all_ready(self) -> bool:
+        """Every player has toggled *ready* and there are at least 5 players."""
+        return all(p.ready for p in self.players.values()) and len(self.players) >= 5
+
+    def snapshot(self) -> "GameState":
+        """Return an independent headless copy of the rule state."""
+        cfg = self.config
+        copy = GameState(
+            self.host_id,
+            {uid: Seat(p.user_id, p.name, p.role, p.ready) for uid, p in self.players.items()},
+            GameConfig(cfg.merlin, cfg.mordred, cfg.morgana, cfg.percival, cfg.oberon,
+                       cfg.lady_enabled, cfg.lady_after_rounds),
+        )
+        for attr in (
+            "phase", "current_leader", "consecutive_rejections", "round_number", "good_wins",
+            "evil_wins", "subphase", "winner", "proposal_leader", "lady_holder", "visibility",
+        ):
+            setattr(copy, attr, getattr(self, attr))
+        copy.quest_history = [dict(rec) for rec in self.quest_history]
+        copy.current_team = list(self.current_team)
+        copy.votes = dict(self.votes)
+        copy.submissions = dict(self.submissions)
+        copy.assassin_candidates = list(self.assassin_candidates)
+        copy.assassin_votes = dict(self.assassin_votes)
+        copy.lady_history = list(self.lady_history)
+        return copy
+
+
+# -----------------------------
+# Role deck & night information
+# -----------------------------
+
+
+def role_options(num_players: int, morgana: bool, percival: bool, oberon: bool) -> Tuple[bool, bool, bool]:
+    """Return ``(morgana, percival, oberon)`` made legal for *num_players*.
+
+    Oberon needs at least 7 players (otherwise evil outnumbers its slots),
+    and Morgana and Percival only make sense together: asking for either
+    enables both.
+    """
+    if num_players < 7:
+        oberon = False
+    if morgana != percival:
+        morgana = percival = morgana or percival
+    return morgana, percival, oberon
+
+
+def build_role_deck(num_players: int, config: Any, rng: Any = random) -> List[str]:
+    """Return a shuffled list of roles according to *num_players* & *config*."""
+
+    # Minimum number of evil players so that evil ≥ 33 % of the table (can be a bit above)
+    num_evil_required = max(2, ceil(num_players / 3))
+
+    # Mandatory evil roles
+    evil_roles: List[str] = ["Mordred"]
+
+    # Optional evil roles based on config
+    if config.morgana:
+        evil_roles.append("Morgana")
+    if config.oberon:
+        evil_roles.append("Oberon")
+
+    # Pad remaining evil slots with generic minions
+    remaining_evil = num_evil_required - len(evil_roles)
+    evil_roles.extend(["Minion of Mordred"] * remaining_evil)
+
+    # Good roles – Merlin is mandatory. Percival only makes sense with Morgana.
+    good_roles: List[str] = ["Merlin"]
+    if config.percival:
+        good_roles.append("Percival")
+
+    remaining_good = num_players - (len(good_roles) + len(evil_roles))
+    good_roles.extend(["Loyal Servant of Arthur"] * remaining_good)
+
+    roles = good_roles + evil_roles
+    rng.shuffle(roles)
+    return roles
+
+
+def private_info(state: GameState, user_id: str) -> Dict[str, List[str]]:
+    """Return the night-phase knowledge of *user_id* (empty if none).
+
+    A lookup in the visibility matrix compiled by :func:`start_game`; tables
+    whose roles were assigned some other way get theirs compiled on first use.
+    """
+    if state.visibility is None:
+        player = state.players.get(user_id)
+        if not player or player.role is None:
+            return {}
+        state.visibility = compile_visibility(state.players.values())
+    return state.visibility.info(user_id)
+
+
+def night_info_events(state: GameState) -> List[Event]:
+    """Private ``info`` messages for every player that learns something at night."""
+    events: List[Event] = []
+    for uid in state.players:
+        info = private_info(state, uid)
+        if info:
+            events.append(Event("info", {"type": "info", **info}, to=uid))
+    return events
+
+
+# -----------------------------
+# Game flow helpers
+# -----------------------------
+
+
+def next_leader(state: GameState) -> None:
+    order = list(state.players.keys())
+    if state.current_leader not in order:
+        state.current_leader = order[0]
+        return
+    idx = order.index(state.current_leader)
+    state.current_leader = order[(idx + 1) % len(order)]
+
+
+def majority_approved(votes: Dict[str, bool]) -> bool:
+    return sum(1 for v in votes.values() if v) > (len(votes) / 2)
+
+
+def quest_requires_two_fails(state: GameState) -> bool:
+    if len(state.players) < 7:
+        return False
+    return state.round_number == 4
+
+
+def remove_seat(state: GameState, user_id: str) -> None:
+    """Drop *user_id* from the table, handing the host role on if needed."""
+    state.players.pop(user_id, None)
+    if user_id == state.host_id and state.players:
+        state.host_id = next(iter(state.players))
+
+
+def _reset_progress(state: GameState) -> None:
+    state.phase = "lobby"
+    state.quest_history = []
+    state.round_number = 0
+    state.good_wins = 0
+    state.evil_wins = 0
+    state.subphase = None
+    state.current_team = []
+    state.votes = {}
+    state.winner = None
+    state.current_leader = None
+    state.proposal_leader = None
+    state.consecutive_rejections = 0
+    state.assassin_candidates = []
+    state.assassin_votes = {}
+    state.lady_holder = None
+    state.lady_history = []
+    state.visibility = None
+
+
+# -----------------------------
+# Transitions
+# -----------------------------
+
+
+def toggle_ready(state: GameState, user_id: str) -> List[Event]:
+    player = state.players.get(user_id)
+    if not player:
+        return []
+    player.ready = not player.ready
+    return [STATE]
+
+
+def kick(state: GameState, user_id: str, target_id: str) -> List[Event]:
+    if user_id != state.host_id or target_id == user_id:
+        return []
+    message = {"type": "kicked", "target": target_id}
+    remove_seat(state, target_id)
+    return [Event("kicked", message, to=target_id), Event("kicked", message), STATE]
+
+
+def start_game(state: GameState, rng: Any = random) -> List[Event]:
+    """Deal roles and enter round 1. Callers check host / readiness first."""
+    state.phase = "in_game"
+    roles = build_role_deck(len(state.players), state.config, rng)
+    shuffled_players = list(state.players.values())
+    rng.shuffle(shuffled_players)
+    for player, role in zip(shuffled_players, roles):
+        player.role = role
+
+    # Reorder the players dict to match the newly shuffled order so that
+    # turn rotation (leader clockwise) and Lady-of-the-Lake progression are
+    # randomised every time the game starts (even after resetting/restarting).
+    state.players = {p.user_id: p for p in shuffled_players}
+    state.visibility = compile_visibility(shuffled_players)
+    events = night_info_events(state)
+    state.current_leader = shuffled_players[0].user_id
+    if state.config.lady_enabled:
+        state.lady_holder = shuffled_players[-1].user_id
+        state.lady_history = [state.lady_holder]
+    state.round_number = 1
+    state.good_wins = 0
+    state.evil_wins = 0
+    state.subphase = "proposal"
+    state.current_team = []
+    state.votes = {}
+    state.quest_history = []
+    state.consecutive_rejections = 0
+    events.append(LOBBIES)
+    return events
+
+
+def request_start(state: GameState, user_id: str, rng: Any = random) -> List[Event]:
+    if user_id != state.host_id or not state.all_ready():
+        return []
+    events = start_game(state, rng)
+    events.append(STATE)
+    return events
+
+
+def propose_team(state: GameState, user_id: str, team: List[str]) -> List[Event]:
+    if state.subphase != "proposal" or state.current_leader != user_id:
+        return []
+    required = QUEST_SIZES[len(state.players)][state.round_number - 1]
+    if len(team) != required or not all(p in state.players for p in team):
+        return []
+    state.current_team = team
+    state.proposal_leader = user_id
+    state.subphase = "voting"
+    state.votes = {}
+    return [STATE]
+
+
+def vote_team(state: GameState, user_id: str, approve: bool) -> List[Event]:
+    if state.subphase != "voting" or user_id not in state.players:
+        return []
+    state.votes[user_id] = approve
+    if len(state.votes) != len(state.players):
+        return [STATE]
+    events: List[Event] = []
+    if majority_approved(state.votes):
+        state.subphase = "quest"
+        state.consecutive_rejections = 0
+    else:
+        state.consecutive_rejections += 1
+        if state.consecutive_rejections >= 5:
+            state.phase = "finished"
+            state.winner = "evil"
+            events.append(GAME_OVER)
+        else:
+            next_leader(state)
+            state.subphase = "proposal"
+    events.append(STATE)
+    return events
+
+
+def submit_card(state: GameState, user_id: str, card: Any) -> List[Event]:
+    if state.subphase != "quest" or user_id not in state.current_team:
+        return []
+    if card not in {"S", "F"}:
+        return []
+    # enforce good must play Success
+    player_role = state.players[user_id].role
+    if player_role in GOOD_ROLES and card == "F":
+        return []
+    state.submissions[user_id] = card
+    if len(state.submissions) != len(state.current_team):
+        return [STATE]
+
+    events: List[Event] = []
+    fail_count = list(state.submissions.values()).count("F")
+    required_fails = 2 if quest_requires_two_fails(state) else 1
+    success = fail_count < required_fails
+    if success:
+        state.good_wins += 1
+    else:
+        state.evil_wins += 1
+
+    players = state.players
+    history_entry = {
+        "round": state.round_number,
+        "team": [players[p].name for p in state.current_team],
+        "votes": {players[pid].name: v for pid, v in state.votes.items()},
+        "fails": fail_count,
+        "success": success,
+        "proposer": players[state.proposal_leader].name if state.proposal_leader else None,
+        "leader": players[state.current_leader].name if state.current_leader else None,
+        "next_leader": None,
+    }
+
+    state.submissions = {}
+    state.current_team = []
+    state.votes = {}
+    state.proposal_leader = None
+
+    if state.good_wins >= 3:
+        state.phase = "assassination"
+        state.subphase = "assassination"
+        state.assassin_candidates = [pid for pid, pl in players.items() if pl.role in GOOD_ROLES]
+        state.assassin_votes = {}
+    elif state.evil_wins >= 3:
+        state.phase = "finished"
+        state.winner = "evil"
+        events.append(GAME_OVER)
+    else:
+        current_round_completed = state.round_number
+        state.round_number += 1
+        next_leader(state)
+        history_entry["next_leader"] = players[state.current_leader].name if state.current_leader else None
+
+        if (
+            state.config.lady_enabled
+            and current_round_completed in state.config.lady_after_rounds
+            and state.lady_holder is not None
+        ):
+            state.subphase = "lady"
+        else:
+            state.subphase = "proposal"
+
+    state.quest_history.append(history_entry)
+    events.append(Event("quest_result", {"type": "quest_result", "data": history_entry}))
+    events.append(STATE)
+    return events
+
+
+def assassination_vote(state: GameState, user_id: str, target: Any) -> List[Event]:
+    if state.phase != "assassination":
+        return []
+    voter = state.players.get(user_id)
+    if voter is None or voter.role not in EVIL_ROLES:
+        return []
+    if target not in state.assassin_candidates:
+        return []
+    state.assassin_votes[user_id] = target
+    evil_count = sum(1 for p in state.players.values() if p.role in EVIL_ROLES)
+    if len(state.assassin_votes) < evil_count:
+        return [STATE]
+
+    counts = Counter(state.assassin_votes.values())
+    max_votes = max(counts.values())
+    top_ids = [pid for pid, cnt in counts.items() if cnt == max_votes]
+    if len(top_ids) == 1:
+        chosen_id = top_ids[0]
+        state.winner = "evil" if state.players[chosen_id].role == "Merlin" else "good"
+        state.phase = "finished"
+        return [GAME_OVER, STATE]
+    state.assassin_candidates = top_ids
+    state.assassin_votes = {}
+    return [
+        Event("assassination_tie", {
+            "type": "assassination_tie",
+            "candidates": [state.players[pid].name for pid in top_ids],
+        }),
+        STATE,
+    ]
+
+
+def set_config(state: GameState, user_id: str, data: Dict[str, Any]) -> List[Event]:
+    if state.phase != "lobby" or user_id != state.host_id:
+        return []
+    config = state.config
+    config.morgana, config.percival, config.oberon = role_options(
+        len(state.players),
+        bool(data.get("morgana", config.morgana)),
+        bool(data.get("percival", config.percival)),
+        bool(data.get("oberon", config.oberon)),
+    )
+
+    lady_enabled = bool(data.get("lady_enabled", config.lady_enabled))
+    lady_after_rounds_in = data.get("lady_after_rounds")
+    if isinstance(lady_after_rounds_in, list) and all(isinstance(r, int) for r in lady_after_rounds_in):
+        lady_rounds = [r for r in lady_after_rounds_in if 1 <= r <= 5]
+        if lady_rounds:
+            config.lady_after_rounds = sorted(set(lady_rounds))
+
+    config.lady_enabled = lady_enabled
+    return [STATE]
+
+
+def restart_game(state: GameState, user_id: str) -> List[Event]:
+    if state.phase != "finished" or user_id != state.host_id:
+        return []
+    for p in state.players.values():
+        p.ready = False
+        p.role = None
+    _reset_progress(state)
+    return [STATE, LOBBIES]
+
+
+def reset_lobby(state: GameState, user_id: str) -> List[Event]:
+    if user_id != state.host_id:
+        return []
+    for p in state.players.values():
+        p.ready = False
+    _reset_progress(state)
+    return [STATE, LOBBIES]
+
+
+def lady_choose(state: GameState, user_id: str, target: Any) -> List[Event]:
+    if state.subphase != "lady" or state.lady_holder != user_id:
+        return []
+    target_id: str = str(target) if target else ""
+    if target_id not in state.players or target_id == user_id or target_id in state.lady_history:
+        return []
+
+    target_role = state.players[target_id].role or ""
+    loyalty = "good" if target_role in GOOD_ROLES else "evil"
+    events = [
+        Event("lady_result", {
+            "type": "lady_result",
+            "target": state.players[target_id].name,
+            "loyalty": loyalty,
+        }, to=user_id),
+        Event("lady_inspect", {
+            "type": "lady_inspect",
+            "inspector": state.players[user_id].name,
+            "target": state.players[target_id].name,
+        }),
+    ]
+
+    state.lady_holder = target_id
+    state.lady_history.append(target_id)
+    state.subphase = "proposal"
+    events.append(STATE)
+    return events
+
+
+# -----------------------------
+# Turn timeouts
+# -----------------------------
+
+
+def pending_decision(state: GameState) -> Optional[str]:
+    """Name of the decision the table is waiting on (``"proposal"``, ``"voting"``, ...), if any."""
+    if state.phase == "assassination":
+        return "assassination"
+    if state.phase == "in_game":
+        return state.subphase
+    return None
+
+
+def timeout_moves(state: GameState, rng: Any = random) -> List[Tuple[str, Dict[str, Any]]]:
+    """Default ``(user_id, message)`` moves for everyone the current decision still waits on.
+
+    Leaders propose themselves plus random players, missing votes approve,
+    missing quest cards succeed, the Lady goes to a random eligible player
+    and missing assassins follow the current plurality (or a random pick).
+    """
+    decision = pending_decision(state)
+    if decision == "proposal" and state.current_leader in state.players:
+        leader = state.current_leader
+        size = QUEST_SIZES[len(state.players)][state.round_number - 1]
+        others = [uid for uid in state.players if uid != leader]
+        return [(leader, {"type": "propose_team", "team": [leader, *rng.sample(others, size - 1)]})]
+    if decision == "voting":
+        return [(uid, {"type": "vote_team", "approve": True}) for uid in state.players if uid not in state.votes]
+    if decision == "quest":
+        return [(uid, {"type": "submit_card", "card": "S"})
+                for uid in state.current_team if uid not in state.submissions]
+    if decision == "lady" and state.lady_holder in state.players:
+        targets = [uid for uid in state.players if uid != state.lady_holder and uid not in state.lady_history]
+        return [(state.lady_holder, {"type": "lady_choose", "target": rng.choice(targets)})] if targets else []
+    if decision == "assassination" and state.assassin_candidates:
+        counts = Counter(state.assassin_votes.values())
+        target = counts.most_common(1)[0][0] if counts else rng.choice(state.assassin_candidates)
+        return [(uid, {"type": "assassination_vote", "target": target})
+                for uid, p in state.players.items() if p.role in EVIL_ROLES and uid not in state.assassin_votes]
+    return []
+
+
+# -----------------------------
+# Single entry point
+# -----------------------------
+
+
+def apply(state: GameState, user_id: str, msg: Dict[str, Any], rng: Any = random) -> List[Event]:
+    """Apply the client message *msg* sent by *user_id*; return the emitted events.
+
+    *msg* uses the websocket wire format (``{"type": ..., ...}``). Invalid
+    or out-of-turn actions leave the state untouched and return ``[]``.
+    """
+    msg_type = msg.get("type")
+    if msg_type == "toggle_ready":
+        return toggle_ready(state, user_id)
+    if msg_type == "kick":
+        return kick(state, user_id, str(msg.get("target")) if msg.get("target") else "")
+    if msg_type == "start_game":
+        return request_start(state, user_id, rng)
+    if msg_type == "propose_team":
+        return propose_team(state, user_id, msg.get("team", []))
+    if msg_type == "vote_team":
+        return vote_team(state, user_id, bool(msg.get("approve")))
+    if msg_type == "submit_card":
+        return submit_card(state, user_id, msg.get("card"))
+    if msg_type in ("assassin_guess", "assassination_vote"):
+        return assassination_vote(state, user_id, msg.get("target"))
+    if msg_type == "set_config":
+        return set_config(state, user_id, msg)
+    if msg_type == "restart_game":
+        return restart_game(state, user_id)
+    if msg_type == "reset_lobby":
+        return reset_lobby(state, user_id)
+    if msg_type == "lady_choose":
+        return lady_choose(state, user_id, msg.get("target"))
+    return []
+
+
+def transition(state: GameState, user_id: str, msg: Dict[str, Any], rng: Any = random) -> Tuple[GameState, List[Event]]:
+    """Pure variant of :func:`apply`: returns ``(new_state, events)`` and leaves *state* untouched."""
+    new_state = state.snapshot()
+    return new_state, apply(new_state, user_id, msg, rng)
+
+
+__all__ = [
+    "Seat",
+    "GameConfig",
+    "Event",
+    "STATE",
+    "LOBBIES",
+    "GAME_OVER",
+    "GameState",
+    "role_options",
+    "build_role_deck",
+    "private_info",
+    "night_info_events",
+    "next_leader",
+    "majority_approved",
+    "quest_requires_two_fails",
+    "remove_seat",
+    "toggle_ready",
+    "kick",
+    "start_game",
+    "request_start",
+    "propose_team",
+    "vote_team",
+    "submit_card",
+    "assassination_vote",
+    "set_config",
+    "restart_game",
+    "reset_lobby",
+    "lady_choose",
+    "pending_decision",
+    "timeout_moves",
+    "apply",
+    "transition",
+]
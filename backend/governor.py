@@ -0,0 +1,311 @@
+"""Resource governor: caps and load-based admission for rooms and connections.
+
+Everything the server holds in memory grows with what clients ask for, so
+new work is admitted here first:
+
+* **Hard caps** (``AVALON_MAX_*``, 0 = unlimited) on rooms, running games,
+  websocket connections and their per-user shares. Hitting a global cap is
+  reported as overload (HTTP 503, close code 1013); hitting a per-user cap
+  as a client error (HTTP 429, close code 4029).
+* **Load shedding** on event-loop lag. A probe timer measures how late the
+  loop runs its callbacks; above ``AVALON_MAX_LOOP_LAG_MS`` new rooms,
+  lobby feeds and spectators are turned away while seated players can still
+  connect and play, so the games already running get the CPU.
+* **Accept smoothing** against reconnect storms (every client coming back
+  at once after a deploy). New websockets draw from a token bucket
+  (``AVALON_ACCEPT_RATE_PER_SECOND``) whose refill shrinks as loop lag
+  grows; this check runs before authentication so a storm does not also
+  queue up bcrypt work.
+
+Every refusal carries a retry-after hint (:func:`retry_after`): the
+``Retry-After`` header over HTTP, ``"retry-after=<s>"`` as the websocket
+close reason. The hint grows with load and is jittered so refused clients
+spread out instead of returning together.
+
+:func:`usage` is what ``GET /admin/usage`` reports.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import metrics, settings
+from .ratelimit import TokenBucket
+from .scheduler import SCHEDULER
+from .state import rooms
+
+CLOSE_OVERLOADED = 1013  # "try again later"
+CLOSE_USER_LIMIT = 4029
+
+# Every reason a request can be turned away, for the admin view.
+REJECTION_REASONS = (
+    "rooms", "rooms_in_game", "rooms_per_user", "connections", "connections_per_user", "loop_lag",
+    "accept_rate",
+)
+
+_PROBE_KEY = ("governor", "lag")
+# Smoothing of the lag estimate: a single blocking call should not shed load,
+# lag that persists for a few probes should. (bcrypt runs in worker threads,
+# so signup and login bursts do not show up here at all.)
+_LAG_ALPHA = 0.3
+
+_lag = 0.0
+_connections = 0
+_user_connections: Dict[str, int] = {}
+_accepts: Optional[TokenBucket] = None
+
+
+# -----------------------------
+# Event-loop lag
+# -----------------------------
+
+
+def ensure_started() -> None:
+    """Arm the lag probe if it is not pending yet."""
+    if SCHEDULER.get(_PROBE_KEY) is None:
+        _arm(asyncio.get_running_loop())
+
+
+def _arm(loop: asyncio.AbstractEventLoop) -> None:
+    interval = settings.LAG_PROBE_INTERVAL_SECONDS
+    SCHEDULER.call_later(interval, _probe, loop.time() + interval, key=_PROBE_KEY, kind="lag_probe")
+
+
+def _probe(due: float) -> None:
+    global _lag
+    loop = asyncio.get_running_loop()
+    sample = max(0.0, loop.time() - due)
+    _lag += _LAG_ALPHA * (sample - _lag)
+    metrics.LOOP_LAG_SECONDS.observe(sample)
+    _arm(loop)
+
+
+def loop_lag() -> float:
+    """Recent event-loop lag in seconds (moving average of the probe samples)."""
+    return _lag
+
+
+def overloaded() -> bool:
+    limit = settings.MAX_LOOP_LAG_MS
+    return limit > 0 and _lag * 1000.0 > limit
+
+
+def shed() -> bool:
+    """Whether optional work should be refused right now (counted as a rejection)."""
+    if overloaded():
+        _reject("loop_lag")
+        return True
+    return False
+
+
+def _reject(reason: str) -> str:
+    metrics.GOVERNOR_REJECTIONS.inc(reason)
+    return reason
+
+
+def retry_after(wait: float = 0.0) -> int:
+    """Seconds a refused client should wait: at least *wait*, longer under lag, jittered."""
+    base = settings.RETRY_AFTER_SECONDS
+    limit = settings.MAX_LOOP_LAG_MS
+    if limit > 0:
+        base *= 1.0 + min(4.0, _lag * 1000.0 / limit)
+    base = max(base, wait)
+    return max(1, min(settings.RETRY_AFTER_MAX_SECONDS, math.ceil(base + random.uniform(0.0, base))))
+
+
+def retry_headers(wait: float = 0.0) -> Dict[str, str]:
+    return {"Retry-After": str(retry_after(wait))}
+
+
+def close_reason(wait: float = 0.0) -> str:
+    """Websocket close reason carrying a retry-after hint (parsed by the web client)."""
+    return f"retry-after={retry_after(wait)}"
+
+
+# -----------------------------
+# Rooms
+# -----------------------------
+
+
+def _in_game(room: Any) -> bool:
+    return room.phase not in ("lobby", "finished")
+
+
+def can_open_room() -> bool:
+    """Non-raising room check for server-initiated rooms (matchmaking): global cap and loop lag."""
+    if settings.MAX_ROOMS and len(rooms) >= settings.MAX_ROOMS:
+        _reject("rooms")
+        return False
+    if overloaded():
+        _reject("loop_lag")
+        return False
+    return True
+
+
+def check_room_creation(user_id: str) -> None:
+    """Raise :class:`HTTPException` unless *user_id* may open another room now."""
+    if settings.MAX_ROOMS and len(rooms) >= settings.MAX_ROOMS:
+        _reject("rooms")
+        raise HTTPException(status_code=503, detail="The server is full – please try again in a moment.",
+                            headers=retry_headers())
+    if overloaded():
+        _reject("loop_lag")
+        raise HTTPException(status_code=503, detail="The server is busy – please try again in a moment.",
+                            headers=retry_headers())
+    if settings.MAX_ROOMS_PER_USER:
+        hosted = sum(1 for room in rooms.values() if room.host_id == user_id and room.phase != "finished")
+        if hosted >= settings.MAX_ROOMS_PER_USER:
+            _reject("rooms_per_user")
+            raise HTTPException(status_code=429, detail="You already host as many rooms as allowed.",
+                                headers=retry_headers(settings.RETRY_AFTER_MAX_SECONDS))
+
+
+def can_start_game() -> bool:
+    """Whether one more game may leave the lobby (``AVALON_MAX_ROOMS_IN_GAME``)."""
+    limit = settings.MAX_ROOMS_IN_GAME
+    if limit and sum(1 for room in rooms.values() if _in_game(room)) >= limit:
+        _reject("rooms_in_game")
+        return False
+    return True
+
+
+# -----------------------------
+# Connections
+# -----------------------------
+
+
+def accept_wait() -> float:
+    """0 if a new websocket may be accepted now, else seconds until the next slot.
+
+    The bucket refills at ``ACCEPT_RATE_PER_SECOND`` while the loop is
+    healthy and proportionally slower as lag approaches the shedding
+    threshold (down to a tenth), so reconnect storms are let in gradually.
+    """
+    global _accepts
+    rate = settings.ACCEPT_RATE_PER_SECOND
+    if rate <= 0:
+        return 0.0
+    now = time.monotonic()
+    if _accepts is None:
+        _accepts = TokenBucket(rate, settings.ACCEPT_BURST, now)
+    limit = settings.MAX_LOOP_LAG_MS
+    headroom = 1.0 - _lag * 1000.0 / limit if limit > 0 else 1.0
+    _accepts.refill(now)
+    _accepts.rate = rate * min(1.0, max(0.1, headroom))
+    if _accepts.tokens < 1.0:
+        return _accepts.wait()
+    _accepts.tokens -= 1.0
+    return 0.0
+
+
+async def smooth_accept(ws: Any) -> bool:
+    """Rate-limit new websockets before any authentication work; closes *ws* when deferred."""
+    wait = accept_wait()
+    if not wait:
+        return True
+    _reject("accept_rate")
+    await ws.close(code=CLOSE_OVERLOADED, reason=close_reason(wait))
+    return False
+
+
+def admit_connection(user_id: Optional[str], shed: bool = True) -> Optional[Tuple[int, str]]:
+    """Count a new websocket, or return ``(close code, reason)`` to refuse it.
+
+    *shed* marks optional traffic (lobby feeds, spectators) that is also
+    refused while the loop lags. Every admitted connection must be given
+    back through :func:`release_connection`.
+    """
+    global _connections
+    if settings.MAX_CONNECTIONS and _connections >= settings.MAX_CONNECTIONS:
+        return CLOSE_OVERLOADED, _reject("connections")
+    if shed and overloaded():
+        return CLOSE_OVERLOADED, _reject("loop_lag")
+    if user_id is not None and settings.MAX_CONNECTIONS_PER_USER:
+        if _user_connections.get(user_id, 0) >= settings.MAX_CONNECTIONS_PER_USER:
+            return CLOSE_USER_LIMIT, _reject("connections_per_user")
+    _connections += 1
+    if user_id is not None:
+        _user_connections[user_id] = _user_connections.get(user_id, 0) + 1
+    return None
+
+
+def release_connection(user_id: Optional[str]) -> None:
+    global _connections
+    _connections -= 1
+    if user_id is not None:
+        left = _user_connections.get(user_id, 0) - 1
+        if left > 0:
+            _user_connections[user_id] = left
+        else:
+            _user_connections.pop(user_id, None)
+
+
+async def admit_socket(ws: Any, user_id: Optional[str], shed: bool = True) -> bool:
+    """:func:`admit_connection` for an accepted websocket; closes it when refused."""
+    refused = admit_connection(user_id, shed)
+    if refused is None:
+        return True
+    code = refused[0]
+    wait = settings.RETRY_AFTER_MAX_SECONDS if code == CLOSE_USER_LIMIT else 0.0
+    await ws.close(code=code, reason=close_reason(wait))
+    return False
+
+
+# -----------------------------
+# Admin view
+# -----------------------------
+
+
+def usage() -> Dict[str, Any]:
+    """Current usage against every limit (``limit`` ``None`` = unlimited)."""
+    hosted: Dict[str, int] = {}
+    in_game = 0
+    for room in rooms.values():
+        if _in_game(room):
+            in_game += 1
+        if room.phase != "finished":
+            hosted[room.host_id] = hosted.get(room.host_id, 0) + 1
+
+    def entry(current: float, limit: float) -> Dict[str, Optional[float]]:
+        return {"current": current, "limit": limit or None}
+
+    return {
+        "resources": {
+            "rooms": entry(len(rooms), settings.MAX_ROOMS),
+            "rooms_in_game": entry(in_game, settings.MAX_ROOMS_IN_GAME),
+            "rooms_per_user": entry(max(hosted.values(), default=0), settings.MAX_ROOMS_PER_USER),
+            "connections": entry(_connections, settings.MAX_CONNECTIONS),
+            "connections_per_user": entry(max(_user_connections.values(), default=0), settings.MAX_CONNECTIONS_PER_USER),
+            "loop_lag_ms": entry(round(_lag * 1000.0, 3), settings.MAX_LOOP_LAG_MS),
+        },
+        "overloaded": overloaded(),
+        "rejected": {reason: int(metrics.GOVERNOR_REJECTIONS.value(reason)) for reason in REJECTION_REASONS},
+    }
+
+
+__all__ = [
+    "CLOSE_OVERLOADED",
+    "CLOSE_USER_LIMIT",
+    "REJECTION_REASONS",
+    "ensure_started",
+    "loop_lag",
+    "overloaded",
+    "shed",
+    "retry_after",
+    "retry_headers",
+    "close_reason",
+    "can_open_room",
+    "check_room_creation",
+    "can_start_game",
+    "accept_wait",
+    "smooth_accept",
+    "admit_connection",
+    "release_connection",
+    "admit_socket",
+    "usage",
+]
@@ -0,0 +1,126 @@
+"""Application-level heartbeats for the websocket endpoints.
+
+Browsers cannot answer protocol pings from JavaScript, and a half-open TCP
+connection never delivers a close frame, so liveness is tracked in the
+application protocol instead. Every ``HEARTBEAT_INTERVAL_SECONDS`` one
+scheduler timer sends ``{"type": "ping", "ts": ...}`` to each open socket;
+clients echo it back as ``{"type": "pong", "ts": ...}``. Endpoints read
+through :func:`receive_text`, which gives up after
+``HEARTBEAT_TIMEOUT_SECONDS`` of silence (any frame counts, not only
+pongs), closes the socket and raises :class:`WebSocketDisconnect`, so the
+usual disconnect clean-up runs without waiting for a failed send. A reap
+records how long the socket had left its first ping unanswered.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from . import metrics, settings
+from .logs import LOG
+from .scheduler import SCHEDULER
+
+# Close code sent to connections that stopped answering.
+CLOSE_TIMED_OUT = 4008
+
+_KEY = ("heartbeat", "sweep")
+# id(socket) -> its ping still being sent; that socket is skipped by the next sweep.
+_sending: Dict[int, "asyncio.Task[None]"] = {}
+# id(socket) -> loop time of the first ping sent since its last received frame.
+_unanswered: Dict[int, float] = {}
+
+
+def enabled() -> bool:
+    return settings.HEARTBEAT_TIMEOUT_SECONDS > 0
+
+
+def ensure_started() -> None:
+    """Arm the ping sweep if it is not pending yet (cheap; call on every accept)."""
+    if enabled() and SCHEDULER.get(_KEY) is None:
+        SCHEDULER.call_later(settings.HEARTBEAT_INTERVAL_SECONDS, _sweep, key=_KEY, kind="heartbeat")
+
+
+def is_pong(data: Any) -> bool:
+    """Record the round trip of a pong *data* and return *True* if it was one."""
+    if not isinstance(data, dict) or data.get("type") != "pong":
+        return False
+    ts = data.get("ts")
+    if isinstance(ts, (int, float)):
+        rtt = asyncio.get_running_loop().time() - ts / 1000.0
+        if 0 <= rtt < 3600:
+            metrics.HEARTBEAT_RTT_SECONDS.observe(rtt)
+    return True
+
+
+async def receive_text(ws: WebSocket, endpoint: str) -> str:
+    """``ws.receive_text()`` that treats a silent peer as disconnected."""
+    if not enabled():
+        return await ws.receive_text()
+    key = id(ws)
+    try:
+        return await asyncio.wait_for(ws.receive_text(), settings.HEARTBEAT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        metrics.HEARTBEAT_REAPED.inc(endpoint)
+        first_ping = _unanswered.pop(key, None)
+        if first_ping is not None:
+            metrics.HEARTBEAT_DETECTION_SECONDS.observe(asyncio.get_running_loop().time() - first_ping, endpoint)
+        LOG.info("heartbeat_timeout", endpoint=endpoint)
+        try:
+            await asyncio.wait_for(ws.close(code=CLOSE_TIMED_OUT), 1.0)
+        except Exception:
+            pass
+        raise WebSocketDisconnect(code=CLOSE_TIMED_OUT)
+    finally:
+        _unanswered.pop(key, None)
+
+
+async def _sweep() -> None:
+    from .channels import ChannelSocket
+    from .room import dumps
+    from .state import lobby_connections, mux_connections, rooms
+
+    try:
+        ping = dumps({"type": "ping", "ts": round(asyncio.get_running_loop().time() * 1000)})
+        # Multiplexed connections get one ping, not one per channel.
+        sockets: Dict[int, WebSocket] = {id(ws): ws for ws in mux_connections}
+        for ws in list(lobby_connections):
+            if not isinstance(ws, ChannelSocket):
+                sockets[id(ws)] = ws
+        for room in list(rooms.values()):
+            viewers = list(room.spectators.sockets) if room.spectators is not None else []
+            for ws in list(room.connections.values()) + viewers:
+                if not isinstance(ws, ChannelSocket):
+                    sockets[id(ws)] = ws
+        # One task per socket: a send to a dying socket can block until its close
+        # handshake times out, and it must not hold back everyone else's ping.
+        loop = asyncio.get_running_loop()
+        for key, ws in sockets.items():
+            if key not in _sending:
+                _sending[key] = loop.create_task(_ping(key, ws, ping))
+    finally:
+        if SCHEDULER.get(_KEY) is None and _has_connections():
+            SCHEDULER.call_later(settings.HEARTBEAT_INTERVAL_SECONDS, _sweep, key=_KEY, kind="heartbeat")
+
+
+async def _ping(key: int, ws: WebSocket, text: str) -> None:
+    _unanswered.setdefault(key, asyncio.get_running_loop().time())
+    try:
+        await ws.send_text(text)
+        metrics.HEARTBEAT_PINGS.inc()
+    except Exception:
+        pass  # the receive side times out and cleans up
+    finally:
+        _sending.pop(key, None)
+
+
+def _has_connections() -> bool:
+    from .state import lobby_connections, mux_connections, rooms
+
+    return bool(lobby_connections or mux_connections) or any(
+        room.connections or room.spectators is not None for room in rooms.values()
+    )
+
+
+__all__ = ["CLOSE_TIMED_OUT", "enabled", "ensure_started", "is_pong", "receive_text"]
@@ -0,0 +1,280 @@
+"""Resized, modern-format variants of the role portraits.
+
+The source PNGs in ``images/`` are ~1.5 MB each. :func:`build_variants`
+renders each of them at a few widths as WebP (plus an optimised PNG
+fallback) into a cache directory, naming every file after the source's
+content hash so the variants themselves are immutable. Rendering every
+portrait takes close to a minute, so it never runs on import: either
+offline via::
+
+    python -m backend.images
+
+or in a worker thread after startup (:meth:`ResponsiveImageFiles.refresh`),
+skipping work that is already cached.
+
+:class:`ResponsiveImageFiles` keeps serving the original URLs
+(``/images/merlin.png``) but answers with the best variant for the
+request's ``Accept`` header and optional ``?w=<css-pixels>`` parameter.
+Until a manifest exists, and always without Pillow or when ``images/`` is
+not writable, the originals are served unchanged.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, Response
+from starlette.types import Scope
+
+from . import settings
+from .logs import LOG
+
+try:  # optional dependency – originals are served as-is without it
+    from PIL import Image  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - depends on environment
+    Image = None
+
+SOURCE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+# Formats in order of preference; the last one is the universal fallback.
+VARIANT_FORMATS: List[Tuple[str, str]] = [("webp", "image/webp"), ("png", "image/png")]
+MANIFEST_NAME = "manifest.json"
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Original URLs are negotiated, so they get a shorter (but still long) lifetime.
+NEGOTIATED_CACHE = "public, max-age=86400, stale-while-revalidate=604800"
+
+# stem -> format -> width -> variant filename
+Manifest = Dict[str, Dict[str, Dict[int, str]]]
+
+
+# -----------------------------
+# Offline / startup build step
+# -----------------------------
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def _render(src_path: str, dest_path: str, width: int, fmt: str) -> None:
+    with Image.open(src_path) as im:
+        im.load()
+        if im.width > width:
+            height = round(im.height * width / im.width)
+            im = im.resize((width, height), Image.LANCZOS)
+        if fmt == "webp":
+            im.save(dest_path, "WEBP", quality=settings.IMAGE_WEBP_QUALITY, method=6)
+        else:
+            if im.mode not in ("RGB", "RGBA", "P", "L", "LA"):
+                im = im.convert("RGBA")
+            im.save(dest_path, "PNG", optimize=True)
+
+
+def build_variants(src_dir: str, out_dir: str, widths: Optional[List[int]] = None) -> Manifest:
+    """Render every source image in *src_dir* into *out_dir* at *widths*.
+
+    Variants whose file already exists are reused, so repeated startups are
+    cheap. Returns the manifest (also written to ``<out_dir>/manifest.json``).
+    """
+    if Image is None:
+        return {}
+    widths = sorted(set(widths or settings.IMAGE_WIDTHS))
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest: Manifest = {}
+    for fname in sorted(os.listdir(src_dir)):
+        stem, suffix = os.path.splitext(fname)
+        src_path = os.path.join(src_dir, fname)
+        if suffix.lower() not in SOURCE_SUFFIXES or not os.path.isfile(src_path):
+            continue
+        digest = _file_digest(src_path)
+        with Image.open(src_path) as im:
+            src_width = im.width
+        # Never upscale: clamp to the source width and drop duplicates.
+        stem_widths = sorted({min(w, src_width) for w in widths})
+        entry: Dict[str, Dict[int, str]] = {}
+        for fmt, _media in VARIANT_FORMATS:
+            entry[fmt] = {}
+            for width in stem_widths:
+                variant = f"{stem}.{digest}.{width}w.{fmt}"
+                dest_path = os.path.join(out_dir, variant)
+                if not os.path.exists(dest_path):
+                    tmp_path = dest_path + ".tmp"
+                    _render(src_path, tmp_path, width, fmt)
+                    os.replace(tmp_path, dest_path)
+                entry[fmt][width] = variant
+        manifest[stem] = entry
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(out_dir: str) -> Manifest:
+    """Manifest written by :func:`build_variants` into *out_dir* (empty if there is none)."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as fh:
+            raw = json.load(fh)
+        manifest: Manifest = {
+            stem: {fmt: {int(width): name for width, name in sizes.items()} for fmt, sizes in formats.items()}
+            for stem, formats in raw.items()
+        }
+    except (OSError, ValueError, AttributeError):
+        return {}
+    # Serve originals for anything whose variants were removed since.
+    return {
+        stem: formats for stem, formats in manifest.items()
+        if all(os.path.exists(os.path.join(out_dir, name)) for sizes in formats.values() for name in sizes.values())
+    }
+
+
+# -----------------------------
+# Negotiation
+# -----------------------------
+
+
+def _accepts(accept: Optional[str], media_type: str) -> bool:
+    """Return *True* if the ``Accept`` header lists *media_type* with q > 0."""
+    if not accept:
+        return False
+    for part in accept.split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() != media_type:
+            continue
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def select_variant(entry: Dict[str, Dict[int, str]], accept: Optional[str], width: Optional[int]) -> Optional[Tuple[str, str]]:
+    """Return ``(filename, media_type)`` of the best variant, or ``None``.
+
+    The format is the first of :data:`VARIANT_FORMATS` the client accepts
+    (the fallback is always acceptable). The width is the smallest variant
+    at least *width* pixels wide, or the largest one when *width* is unset
+    or bigger than every variant.
+    """
+    for index, (fmt, media_type) in enumerate(VARIANT_FORMATS):
+        is_fallback = index == len(VARIANT_FORMATS) - 1
+        sizes = entry.get(fmt)
+        if not sizes or not (is_fallback or _accepts(accept, media_type)):
+            continue
+        ordered = sorted(sizes)
+        chosen = ordered[-1]
+        if width:
+            chosen = next((w for w in ordered if w >= width), ordered[-1])
+        return sizes[chosen], media_type
+    return None
+
+
+# -----------------------------
+# ASGI static file handler
+# -----------------------------
+
+
+class ResponsiveImageFiles(StaticFiles):
+    """``StaticFiles`` for ``/images`` that serves negotiated, resized variants.
+
+    * ``/images/<name>.png[?w=N]`` – best variant for ``Accept`` and width.
+    * ``/images/_variants/<hashed file>`` – a specific variant, immutable.
+    """
+
+    def __init__(self, *, directory: str, variants_dir: Optional[str] = None, **kwargs) -> None:
+        super().__init__(directory=directory, **kwargs)
+        self.source_dir = directory
+        self.variants_dir = variants_dir or os.path.join(directory, settings.IMAGE_VARIANTS_SUBDIR)
+        self.manifest: Manifest = load_manifest(self.variants_dir)
+
+    async def refresh(self) -> None:
+        """Render missing variants in a worker thread, then serve them."""
+        if Image is None:
+            return
+        try:
+            self.manifest = await asyncio.to_thread(build_variants, self.source_dir, self.variants_dir)
+        except OSError as exc:  # e.g. a read-only checkout – keep serving originals
+            LOG.warning("image_variants_failed", error=repr(exc))
+
+    async def get_response(self, path: str, scope: Scope) -> Response:  # type: ignore[override]
+        rel = path.replace(os.sep, "/")
+        prefix = settings.IMAGE_VARIANTS_SUBDIR + "/"
+        if rel.startswith(prefix):
+            response = await super().get_response(path, scope)
+            if response.status_code == 200:
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE
+            return response
+
+        stem, suffix = os.path.splitext(rel)
+        entry = self.manifest.get(stem) if suffix.lower() in SOURCE_SUFFIXES else None
+        if entry is None:
+            response = await super().get_response(path, scope)
+            response.headers["Cache-Control"] = NEGOTIATED_CACHE
+            return response
+
+        headers = Headers(scope=scope)
+        try:
+            width: Optional[int] = int(QueryParams(scope.get("query_string", b"")).get("w", ""))
+        except ValueError:
+            width = None
+        chosen = select_variant(entry, headers.get("accept"), width)
+        if chosen is None:
+            response = await super().get_response(path, scope)
+            response.headers["Cache-Control"] = NEGOTIATED_CACHE
+            return response
+
+        filename, media_type = chosen
+        variant_path = os.path.join(self.variants_dir, filename)
+        response = FileResponse(
+            variant_path,
+            media_type=media_type,
+            stat_result=os.stat(variant_path),
+            method=scope["method"],
+        )
+        response.headers["Cache-Control"] = NEGOTIATED_CACHE
+        response.headers["Vary"] = "Accept"
+        if self.is_not_modified(response.headers, headers):
+            return Response(status_code=304, headers={
+                "ETag": response.headers["etag"],
+                "Cache-Control": NEGOTIATED_CACHE,
+                "Vary": "Accept",
+            })
+        return response
+
+
+__all__ = [
+    "build_variants",
+    "load_manifest",
+    "select_variant",
+    "ResponsiveImageFiles",
+]
+
+
+if __name__ == "__main__":
+    import sys
+
+    src = sys.argv[1] if len(sys.argv) > 1 else "images"
+    out = sys.argv[2] if len(sys.argv) > 2 else os.path.join(src, settings.IMAGE_VARIANTS_SUBDIR)
+    if Image is None:
+        sys.exit("Pillow is not installed – pip install Pillow")
+    result = build_variants(src, out)
+    total = 0
+    for stem, formats in result.items():
+        for fmt, sizes in formats.items():
+            for width, name in sizes.items():
+                size = os.path.getsize(os.path.join(out, name))
+                total += size
+                print(f"{stem:<24} {fmt:<5} {width:>5}w  {size / 1024:8.1f} KiB")
+    print(f"{len(result)} images, {total / 1024 / 1024:.2f} MiB of variants in {out}")
@@ -0,0 +1,338 @@
+"""Information-set Monte Carlo tree search over :mod:`backend.engine`.
+
+Single-observer ISMCTS: every iteration samples a *determinization* – an
+assignment of the hidden roles consistent with everything the searching
+player knows (own role, night information, Lady of the Lake results,
+failed quests) – and walks one shared tree of actions with UCB1. A child
+only counts as available when its action is legal in the current
+determinization, and every node keeps good wins and visits so it can be
+scored from the side of whoever moves there in that determinization.
+Leaves are finished with a cheap random-but-plausible rollout.
+
+:func:`observe` runs in the server process and strips everything the bot
+may not know, other players' quest cards included; :func:`choose` runs in
+a worker process and only sees that redacted :class:`Observation`.
+Nothing here touches the network, so the module is cheap to import from
+``concurrent.futures`` workers.
+"""
+from __future__ import annotations
+
+import itertools
+import math
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from . import engine
+from .constants import EVIL_ROLES, GOOD_ROLES, QUEST_SIZES
+from .roles import ROLES
+
+# Exploration constant for UCB1 and cap on distinct team proposals per node.
+EXPLORATION = 0.7
+MAX_PROPOSALS = 48
+# Searches always run at least this many iterations, even past the deadline.
+MIN_ITERATIONS = 32
+# Stands in for another player's quest card in an observation.
+HIDDEN_CARD = "?"
+
+Action = Tuple[str, Any]
+
+# -----------------------------
+# Observations & determinization
+# -----------------------------
+
+
+class Observation:
+    """What one player knows: a role-redacted snapshot plus role constraints."""
+
+    __slots__ = ("state", "me", "allowed", "deck", "failed_teams")
+
+    def __init__(self, state: engine.GameState, me: str, allowed: Dict[str, FrozenSet[str]],
+                 deck: List[str], failed_teams: List[Tuple[List[str], int]]) -> None:
+        self.state = state
+        self.me = me
+        self.allowed = allowed
+        self.deck = deck
+        self.failed_teams = failed_teams
+
+
+def observe(state: engine.GameState, me: str) -> Observation:
+    """Return the information set of *me* in *state* (roles of others removed)."""
+    snap = state.snapshot()
+    roles = {uid: p.role for uid, p in snap.players.items()}
+    deck = [r for r in roles.values() if r is not None]
+    everyone = frozenset(deck)
+    allowed: Dict[str, FrozenSet[str]] = {uid: everyone for uid in roles}
+    mine = roles[me]
+
+    def split(seen: FrozenSet[str]) -> None:
+        for uid, role in roles.items():
+            allowed[uid] &= seen if role in seen else everyone - seen
+
+    # Night knowledge: each set of roles this role sees is told apart from the rest.
+    if mine in ROLES:
+        for seen in ROLES[mine].knows.values():
+            split(seen)
+    # Lady of the Lake: each holder inspected the next entry of the history.
+    for holder, target in zip(snap.lady_history, snap.lady_history[1:]):
+        if holder == me:
+            allowed[target] &= GOOD_ROLES if roles[target] in GOOD_ROLES else EVIL_ROLES
+    # Evil players are revealed to everyone for the assassination.
+    if snap.phase == "assassination":
+        for uid, role in roles.items():
+            allowed[uid] &= EVIL_ROLES if role in EVIL_ROLES else GOOD_ROLES
+    allowed[me] = frozenset({mine}) if mine else everyone
+
+    by_name = {p.name: uid for uid, p in snap.players.items()}
+    failed_teams = [
+        ([by_name[n] for n in rec["team"] if n in by_name], rec["fails"])
+        for rec in snap.quest_history if rec.get("fails")
+    ]
+    for uid, p in snap.players.items():
+        if uid != me:
+            p.role = None
+    # Quest cards are secret until the quest resolves; only who has played is known.
+    snap.submissions = {uid: card if uid == me else HIDDEN_CARD for uid, card in snap.submissions.items()}
+    snap.visibility = None  # compiled from the real roles
+    return Observation(snap, me, allowed, deck, failed_teams)
+
+
+def _sample_roles(obs: Observation, rng: random.Random) -> Optional[Dict[str, str]]:
+    remaining = Counter(obs.deck)
+    assignment: Dict[str, str] = {}
+    seats = sorted(obs.allowed, key=lambda uid: (len(obs.allowed[uid]), rng.random()))
+    for uid in seats:
+        options = [r for r, n in remaining.items() if n and r in obs.allowed[uid]]
+        if not options:
+            return None
+        role = rng.choices(options, weights=[remaining[r] for r in options])[0]
+        remaining[role] -= 1
+        assignment[uid] = role
+    return assignment
+
+
+def determinize(obs: Observation, rng: random.Random, attempts: int = 64) -> engine.GameState:
+    """Return a full copy of the observed state with hidden roles filled in plausibly."""
+    roles: Optional[Dict[str, str]] = None
+    for _ in range(attempts):
+        candidate = _sample_roles(obs, rng)
+        if candidate is None:
+            continue
+        roles = candidate
+        if all(sum(candidate[uid] in EVIL_ROLES for uid in team) >= fails for team, fails in obs.failed_teams):
+            break
+    state = obs.state.snapshot()
+    if roles is not None:
+        for uid, p in state.players.items():
+            p.role = roles[uid]
+    for uid, card in state.submissions.items():
+        if card == HIDDEN_CARD:
+            state.submissions[uid] = _rollout_action(state, uid, rng)[1]
+    return state
+
+
+# -----------------------------
+# Actions
+# -----------------------------
+
+
+def _proposals(state: engine.GameState, leader: str) -> List[Action]:
+    size = QUEST_SIZES[len(state.players)][state.round_number - 1]
+    others = [uid for uid in state.players if uid != leader]
+    teams = [(leader,) + rest for rest in itertools.combinations(others, size - 1)]
+    if len(teams) > MAX_PROPOSALS:
+        # Same subset for the same decision so tree statistics accumulate.
+        picker = random.Random(f"{state.round_number}:{state.consecutive_rejections}:{leader}")
+        teams = picker.sample(teams, MAX_PROPOSALS)
+    return [("propose", team) for team in teams]
+
+
+def to_move(state: engine.GameState) -> Optional[str]:
+    """Who acts next in a canonical order (simultaneous choices are serialised)."""
+    if state.phase == "assassination":
+        return next((uid for uid, p in state.players.items()
+                     if p.role in EVIL_ROLES and uid not in state.assassin_votes), None)
+    if state.phase != "in_game":
+        return None
+    sub = state.subphase
+    if sub == "proposal":
+        return state.current_leader
+    if sub == "voting":
+        return next((uid for uid in state.players if uid not in state.votes), None)
+    if sub == "quest":
+        return next((uid for uid in state.current_team if uid not in state.submissions), None)
+    if sub == "lady":
+        return state.lady_holder
+    return None
+
+
+def legal_actions(state: engine.GameState, uid: str) -> List[Action]:
+    """Moves *uid* may make right now (empty when it is not their turn to decide)."""
+    player = state.players.get(uid)
+    if player is None:
+        return []
+    if state.phase == "assassination":
+        if player.role in EVIL_ROLES and uid not in state.assassin_votes:
+            return [("assassinate", t) for t in state.assassin_candidates]
+        return []
+    if state.phase != "in_game":
+        return []
+    sub = state.subphase
+    if sub == "proposal" and state.current_leader == uid:
+        return _proposals(state, uid)
+    if sub == "voting" and uid not in state.votes:
+        return [("vote", True), ("vote", False)]
+    if sub == "quest" and uid in state.current_team and uid not in state.submissions:
+        return [("card", "S"), ("card", "F")] if player.role in EVIL_ROLES else [("card", "S")]
+    if sub == "lady" and state.lady_holder == uid:
+        return [("lady", t) for t in state.players if t != uid and t not in state.lady_history]
+    return []
+
+
+def apply_action(state: engine.GameState, uid: str, action: Action) -> None:
+    kind, arg = action
+    if kind == "propose":
+        engine.propose_team(state, uid, list(arg))
+    elif kind == "vote":
+        engine.vote_team(state, uid, arg)
+    elif kind == "card":
+        engine.submit_card(state, uid, arg)
+    elif kind == "lady":
+        engine.lady_choose(state, uid, arg)
+    elif kind == "assassinate":
+        engine.assassination_vote(state, uid, arg)
+
+
+def to_message(action: Action) -> Dict[str, Any]:
+    """Convert *action* into the websocket message a human client would send."""
+    kind, arg = action
+    if kind == "propose":
+        return {"type": "propose_team", "team": list(arg)}
+    if kind == "vote":
+        return {"type": "vote_team", "approve": arg}
+    if kind == "card":
+        return {"type": "submit_card", "card": arg}
+    if kind == "lady":
+        return {"type": "lady_choose", "target": arg}
+    return {"type": "assassination_vote", "target": arg}
+
+
+def _rollout_action(state: engine.GameState, uid: str, rng: random.Random) -> Action:
+    role = state.players[uid].role
+    evil = role in EVIL_ROLES
+    if state.phase == "assassination":
+        return "assassinate", rng.choice(state.assassin_candidates)
+    sub = state.subphase
+    if sub == "proposal":
+        size = QUEST_SIZES[len(state.players)][state.round_number - 1]
+        others = [p for p in state.players if p != uid]
+        return "propose", (uid, *rng.sample(others, size - 1))
+    if sub == "voting":
+        if evil:
+            dirty = any(state.players[p].role in EVIL_ROLES for p in state.current_team)
+            return "vote", dirty or rng.random() < 0.3
+        return "vote", state.consecutive_rejections >= 4 or rng.random() < 0.6
+    if sub == "quest":
+        return "card", "F" if evil and rng.random() < 0.8 else "S"
+    targets = [t for t in state.players if t != uid and t not in state.lady_history]
+    return "lady", rng.choice(targets)
+
+
+def rollout(state: engine.GameState, rng: random.Random, limit: int = 400) -> Optional[str]:
+    """Play *state* to the end with the default policy and return the winner."""
+    for _ in range(limit):
+        uid = to_move(state)
+        if uid is None:
+            break
+        apply_action(state, uid, _rollout_action(state, uid, rng))
+    return state.winner
+
+
+# -----------------------------
+# Search
+# -----------------------------
+
+
+class Node:
+    __slots__ = ("children", "visits", "available", "good_wins")
+
+    def __init__(self) -> None:
+        self.children: Dict[Action, "Node"] = {}
+        self.visits = 0
+        self.available = 1
+        self.good_wins = 0.0
+
+    def score(self, side_is_good: bool) -> float:
+        mean = self.good_wins / self.visits
+        value = mean if side_is_good else 1.0 - mean
+        return value + EXPLORATION * math.sqrt(math.log(self.available) / self.visits)
+
+
+def search(obs: Observation, budget_s: float, max_iterations: int,
+           rng: Optional[random.Random] = None) -> Tuple[Action, int]:
+    """Run ISMCTS for *obs.me* and return ``(best action, iterations run)``."""
+    rng = rng or random.Random()
+    root_actions = legal_actions(obs.state, obs.me)
+    if not root_actions:
+        raise ValueError(f"{obs.me} has nothing to decide")
+    if len(root_actions) == 1:
+        return root_actions[0], 0
+
+    root = Node()
+    deadline = time.perf_counter() + budget_s
+    iterations = 0
+    while iterations < max_iterations and (iterations < MIN_ITERATIONS or time.perf_counter() < deadline):
+        iterations += 1
+        state = determinize(obs, rng)
+        node, path = root, [root]
+        uid: Optional[str] = obs.me
+        actions: Sequence[Action] = root_actions
+        while uid is not None and actions:
+            good = state.players[uid].role in GOOD_ROLES
+            untried = [a for a in actions if a not in node.children]
+            for a in actions:
+                child = node.children.get(a)
+                if child is not None:
+                    child.available += 1
+            if untried:
+                action = rng.choice(untried)
+                child = Node()
+                node.children[action] = child
+                apply_action(state, uid, action)
+                path.append(child)
+                break
+            action = max(actions, key=lambda a: node.children[a].score(good))
+            node = node.children[action]
+            apply_action(state, uid, action)
+            path.append(node)
+            uid = to_move(state)
+            actions = legal_actions(state, uid) if uid else ()
+
+        good_won = 1.0 if rollout(state, rng) == "good" else 0.0
+        for n in path:
+            n.visits += 1
+            n.good_wins += good_won
+
+    best = max(root.children.items(), key=lambda kv: kv[1].visits)[0]
+    return best, iterations
+
+
+def choose(obs: Observation, budget_ms: int, max_iterations: int, seed: Optional[int] = None) -> Tuple[Dict[str, Any], int]:
+    """Worker entry point: pick a move for ``obs.me`` within *budget_ms*."""
+    action, iterations = search(obs, budget_ms / 1000.0, max_iterations, random.Random(seed))
+    return to_message(action), iterations
+
+
+__all__ = [
+    "Observation",
+    "observe",
+    "determinize",
+    "to_move",
+    "legal_actions",
+    "apply_action",
+    "to_message",
+    "rollout",
+    "search",
+    "choose",
+]
@@ -3,6 +3,8 @@ from __future__ import annotations
 
 from typing import List
 
+from . import metrics
+from .room import dumps
 from .schemas import LobbySummary
 from .state import lobby_connections, rooms
 
@@ -33,6 +35,9 @@ async def broadcast_lobbies() -> None:
     if not lobby_connections:
         return
 
+    start = metrics.now()
+    sent_bytes = 0
+    recipients = 0
     # Build personalised payloads per connection (each user sees their own in-progress games)
     for ws, uid in list(lobby_connections.items()):
         try:
@@ -52,9 +57,16 @@ async def broadcast_lobbies() -> None:
                             phase=room.phase,
                         )
                     )
-            await ws.send_json({"type": "lobbies", "data": [s.model_dump() for s in data]})
+            text = dumps({"type": "lobbies", "data": [s.model_dump() for s in data]})
+            sent_bytes += len(text)
+            recipients += 1
+            await ws.send_text(text)
         except Exception:
             # Client disconnected unexpectedly
             lobby_connections.pop(ws, None)
 
+    metrics.BROADCAST_SECONDS.observe(metrics.now() - start, "lobbies")
+    metrics.BROADCAST_BYTES.observe(sent_bytes, "lobbies")
+    metrics.BROADCAST_RECIPIENTS.inc("lobbies", amount=recipients)
+
 __all__ = ["broadcast_lobbies", "_collect_lobby_summaries"] 
\ No newline at end of file
@@ -0,0 +1,333 @@
+"""Structured JSON-lines logging that never writes on the event loop.
+
+``LOG.info("room_created", room_id=..., user_id=...)`` only appends a
+``(time, level, event, fields)`` tuple to an in-memory queue. A daemon
+thread wakes every ``AVALON_LOG_FLUSH_SECONDS``, drains the queue in
+batches and writes one JSON object per line to ``AVALON_LOG_PATH`` (or
+stderr). The file is rotated by size, keeping ``AVALON_LOG_BACKUPS`` old
+files. Records carry ``room_id``, ``user_id`` and the message ``type``
+where they have one, so one player's or one room's history can be pulled
+out with ``grep`` or ``jq``.
+
+A disabled level costs one method call and an integer comparison.
+Callers that would do real work to build their fields check
+:meth:`StructuredLogger.enabled` first. High-volume events (every websocket
+message, every HTTP request) are sampled with per-event rates
+(``AVALON_LOG_SAMPLE_RATES``). A kept record says which rate it was kept
+at, so counts can be scaled back up. When the writer falls behind, the
+queue stops at ``AVALON_LOG_QUEUE_MAX`` records and new ones are dropped
+and counted, never blocking the caller.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import settings
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS: Dict[str, int] = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+_LEVEL_NAMES: Dict[int, str] = {value: name for name, value in LEVELS.items()}
+
+# (unix time, level, event, fields)
+Record = Tuple[float, int, str, Dict[str, Any]]
+
+
+def parse_level(name: str) -> int:
+    """Level number of *name* (``debug`` … ``error``, or ``off``); raises :class:`ValueError`."""
+    name = name.strip().lower()
+    if name == "off":
+        return ERROR + 10
+    try:
+        return LEVELS[name]
+    except KeyError:
+        raise ValueError(f"unknown log level {name!r}") from None
+
+
+def level_name(level: int) -> str:
+    return _LEVEL_NAMES.get(level, "off")
+
+
+class StructuredLogger:
+    """Queue of pending records plus the thread that writes them out."""
+
+    def __init__(
+        self,
+        level: int,
+        path: str,
+        max_bytes: int,
+        backups: int,
+        sample_rates: Dict[str, float],
+        flush_interval: float,
+        batch_size: int,
+        queue_max: int,
+    ) -> None:
+        self.level = level
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rates = {event: max(0.0, min(1.0, rate)) for event, rate in sample_rates.items()}
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.queue_max = queue_max
+        self._queue: Deque[Record] = deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._atexit = False
+        self._file: Any = None
+        self._size = 0
+        # Plain tallies, each bumped by one thread only; /metrics reads them
+        # through callbacks on the loop, so neither side touches the other's
+        # objects. ``written`` has a fixed key set and never changes size.
+        self.sampled_out = 0
+        self.overflowed = 0
+        self.written: Dict[int, int] = {level: 0 for level in _LEVEL_NAMES}
+        self.write_errors = 0
+
+    # -------------------- Hot path -------------------- #
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def debug(self, event: str, **fields: Any) -> None:
+        if DEBUG >= self.level:
+            self._emit(DEBUG, event, fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        if INFO >= self.level:
+            self._emit(INFO, event, fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        if WARNING >= self.level:
+            self._emit(WARNING, event, fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        if ERROR >= self.level:
+            self._emit(ERROR, event, fields)
+
+    def exception(self, event: str, **fields: Any) -> None:
+        """:meth:`error` with the traceback of the exception being handled."""
+        if ERROR >= self.level:
+            fields["error"] = repr(sys.exc_info()[1])
+            fields["traceback"] = traceback.format_exc()
+            self._emit(ERROR, event, fields)
+
+    def _emit(self, level: int, event: str, fields: Dict[str, Any]) -> None:
+        rate = self.sample_rates.get(event)
+        if rate is not None and rate < 1.0:
+            if random.random() >= rate:
+                self.sampled_out += 1
+                return
+            fields["sample_rate"] = rate
+        if self.queue_max and len(self._queue) >= self.queue_max:
+            self.overflowed += 1
+            return
+        self._queue.append((time.time(), level, event, fields))
+        if self._thread is None:
+            self.start()
+
+    # -------------------- Configuration -------------------- #
+
+    def configure(self, level: Optional[int] = None, sample_rates: Optional[Dict[str, float]] = None) -> None:
+        if level is not None:
+            self.level = level
+        if sample_rates is not None:
+            for event, rate in sample_rates.items():
+                self.sample_rates[event] = max(0.0, min(1.0, rate))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "level": level_name(self.level),
+            "path": os.path.abspath(self.path) if self.path else "stderr",
+            "sample_rates": dict(self.sample_rates),
+            "queued": len(self._queue),
+            "sampled_out": self.sampled_out,
+            "dropped": self.overflowed,
+        }
+
+    # -------------------- Writer thread -------------------- #
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name="avalon-log-writer", daemon=True)
+            self._thread.start()
+            if not self._atexit:
+                self._atexit = True
+                atexit.register(self.close)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out everything still queued and stop the writer."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._closing = True
+        if thread is not None:
+            self._wake.set()
+            thread.join(timeout)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def flush(self) -> None:
+        """Ask the writer to drain now instead of at its next interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+            if self._closing:
+                self._drain()
+                return
+
+    def _drain(self) -> None:
+        queue = self._queue
+        while queue:
+            batch: List[str] = []
+            counts: Dict[int, int] = {}
+            try:
+                for _ in range(self.batch_size):
+                    record = queue.popleft()
+                    batch.append(_format(record))
+                    counts[record[1]] = counts.get(record[1], 0) + 1
+            except IndexError:
+                pass
+            try:
+                self._write("".join(batch))
+            except (OSError, ValueError):
+                self.write_errors += len(batch)
+                continue
+            written = self.written
+            for level, n in counts.items():
+                written[level] += n
+
+    def _write(self, text: str) -> None:
+        if not self.path:
+            sys.stderr.write(text)
+            sys.stderr.flush()
+            return
+        data = text.encode("utf-8")
+        if self._file is None:
+            self._open()
+        elif self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _rotate(self) -> None:
+        """``path`` -> ``path.1`` -> … -> ``path.<backups>`` (the oldest is overwritten)."""
+        self._file.close()
+        self._file = None
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{i}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+def _format(record: Record) -> str:
+    ts, level, event, fields = record
+    entry: Dict[str, Any] = {
+        "ts": datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds"),
+        "level": _LEVEL_NAMES[level],
+        "event": event,
+    }
+    entry.update(fields)
+    return json.dumps(entry, default=str, separators=(",", ":")) + "\n"
+
+
+def _configured_level() -> int:
+    try:
+        return parse_level(settings.LOG_LEVEL)
+    except ValueError:
+        return INFO
+
+
+LOG = StructuredLogger(
+    level=_configured_level(),
+    path=settings.LOG_PATH,
+    max_bytes=settings.LOG_MAX_BYTES,
+    backups=settings.LOG_BACKUPS,
+    sample_rates=settings.LOG_SAMPLE_RATES,
+    flush_interval=settings.LOG_FLUSH_SECONDS,
+    batch_size=settings.LOG_BATCH_SIZE,
+    queue_max=settings.LOG_QUEUE_MAX,
+)
+
+
+# -----------------------------
+# HTTP access log
+# -----------------------------
+
+
+class AccessLogMiddleware:
+    """Pure ASGI middleware logging each HTTP request as an ``http_request`` record."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not LOG.enabled(INFO):
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            LOG.info(
+                "http_request",
+                method=scope.get("method"),
+                path=scope.get("path"),
+                status=status,
+                duration_ms=round((time.perf_counter() - start) * 1000.0, 3),
+            )
+
+
+__all__ = [
+    "DEBUG",
+    "INFO",
+    "WARNING",
+    "ERROR",
+    "LEVELS",
+    "parse_level",
+    "level_name",
+    "StructuredLogger",
+    "LOG",
+    "AccessLogMiddleware",
+]
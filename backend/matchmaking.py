@@ -0,0 +1,309 @@
+"""Matchmaking queue: players queue up and the server seats them in new rooms.
+
+A queued player holds a :class:`Ticket` in a *pool*: the table size and role
+options they asked for (see :func:`pool_key`). Only tickets of the same pool
+can be matched. Inside a pool, tickets are kept in rating buckets
+``MATCH_BUCKET_WIDTH`` wide. Each bucket is an insertion-ordered dict, so it
+is FIFO: its first ticket is its longest waiting one, and leaving the queue
+is O(1).
+
+A background matcher runs every ``MATCH_INTERVAL_SECONDS`` while anyone is
+queued. For each bucket it looks at the oldest ticket's wait and widens the
+search by one neighbouring bucket per ``MATCH_WIDEN_SECONDS`` (up to
+``MATCH_MAX_SPREAD_BUCKETS``). The nearest ratings are tried first: the
+bucket itself, then one step up and down, and so on. When the window holds
+a full table, a :class:`backend.room.Room` is created with those players
+already ready, the oldest ticket as host. Every queued player then gets
+``{"type": "match_found", "room_id": ...}`` on their lobby feeds. A tick
+only touches bucket counts and the tickets it seats. Its cost grows with
+the number of buckets, not the number of queued players.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import governor, metrics, settings
+from .engine import GameConfig, role_options
+from .logs import LOG
+from .room import Room, RoomPlayer, dumps
+from .scheduler import SCHEDULER
+from .state import lobby_connections, rooms
+
+# (players, morgana, percival, oberon, lady_enabled)
+PoolKey = Tuple[int, bool, bool, bool, bool]
+
+_KEY = ("matchmaking", "tick")
+
+
+class Ticket:
+    """One queued player."""
+
+    __slots__ = ("user_id", "name", "wins", "rating", "pool", "bucket", "since")
+
+    def __init__(self, user_id: str, name: str, wins: int, rating: float, pool: PoolKey, since: float) -> None:
+        self.user_id = user_id
+        self.name = name
+        self.wins = wins
+        self.rating = rating
+        self.pool = pool
+        self.bucket = int(rating // settings.MATCH_BUCKET_WIDTH)
+        self.since = since
+
+
+_tickets: Dict[str, Ticket] = {}
+# pool -> rating bucket -> user_id -> ticket (oldest first)
+_pools: Dict[PoolKey, Dict[int, Dict[str, Ticket]]] = {}
+_pool_sizes: Dict[PoolKey, int] = {}
+# Buckets that gained tickets since the last pass, and when a pool's search next widens.
+_dirty: Dict[PoolKey, Set[int]] = {}
+_recheck_at: Dict[PoolKey, float] = {}
+# user_id -> (room_id, when): recent matches, for clients that poll instead of listening.
+_matched: Dict[str, Tuple[str, float]] = {}
+# Seconds a match result stays available to :func:`status`.
+_RESULT_TTL = 120.0
+
+
+def pool_key(players: int, morgana: bool, percival: bool, oberon: bool, lady_enabled: bool) -> PoolKey:
+    """Pool of a ticket, with the role options made legal as ``set_config`` would.
+
+    Equivalent preferences share a pool, and a matched room never gets a
+    configuration its own lobby would have refused.
+    """
+    morgana, percival, oberon = role_options(players, morgana, percival, oberon)
+    return (players, morgana, percival, oberon, lady_enabled)
+
+
+def queued() -> int:
+    return len(_tickets)
+
+
+# -----------------------------
+# Queue
+# -----------------------------
+
+
+def enqueue(user_id: str, name: str, rating: float, pool: PoolKey, wins: int = 0) -> Ticket:
+    """Queue *user_id* in *pool* (replacing an earlier ticket) and make sure the matcher runs."""
+    dequeue(user_id)
+    _matched.pop(user_id, None)
+    ticket = _tickets[user_id] = Ticket(user_id, name, wins, rating, pool, time.monotonic())
+    _pools.setdefault(pool, {}).setdefault(ticket.bucket, {})[user_id] = ticket
+    _pool_sizes[pool] = _pool_sizes.get(pool, 0) + 1
+    _dirty.setdefault(pool, set()).add(ticket.bucket)
+    ensure_started()
+    return ticket
+
+
+def dequeue(user_id: str) -> bool:
+    ticket = _tickets.pop(user_id, None)
+    if ticket is None:
+        return False
+    pool = _pools[ticket.pool]
+    bucket = pool[ticket.bucket]
+    del bucket[user_id]
+    if not bucket:
+        del pool[ticket.bucket]
+    left = _pool_sizes[ticket.pool] - 1
+    if left:
+        _pool_sizes[ticket.pool] = left
+    else:
+        del _pool_sizes[ticket.pool]
+        del _pools[ticket.pool]
+        _dirty.pop(ticket.pool, None)
+        _recheck_at.pop(ticket.pool, None)
+    return True
+
+
+def status(user_id: str) -> Dict[str, object]:
+    """Queue position of *user_id*: ``queued``, ``matched`` (with ``room_id``) or ``idle``."""
+    ticket = _tickets.get(user_id)
+    if ticket is not None:
+        return {
+            "status": "queued",
+            "players": ticket.pool[0],
+            "waited_seconds": round(time.monotonic() - ticket.since, 1),
+            "pool_size": _pool_sizes.get(ticket.pool, 0),
+        }
+    match = _matched.get(user_id)
+    if match is not None and match[0] in rooms:
+        return {"status": "matched", "room_id": match[0]}
+    return {"status": "idle"}
+
+
+# -----------------------------
+# Matcher
+# -----------------------------
+
+
+def ensure_started() -> None:
+    if SCHEDULER.get(_KEY) is None:
+        SCHEDULER.call_later(settings.MATCH_INTERVAL_SECONDS, _tick, key=_KEY, kind="matchmaking")
+
+
+def _window(center: int, spread: int) -> List[int]:
+    """Buckets nearest first: center, +1, -1, +2, -2, ..."""
+    order = [center]
+    for step in range(1, spread + 1):
+        order.append(center + step)
+        order.append(center - step)
+    return order
+
+
+def match_once(now: Optional[float] = None) -> List[Tuple[str, List[str]]]:
+    """Form every table the queue allows right now; return ``(room_id, user_ids)`` per room.
+
+    Only windows that can have changed since the last pass are searched:
+    those around buckets that gained tickets, and whole pools once one of
+    their buckets is due to widen.
+    """
+    now = time.monotonic() if now is None else now
+    spread_max = settings.MATCH_MAX_SPREAD_BUCKETS
+    formed: List[Tuple[str, List[str]]] = []
+    for key in list(_pools):
+        dirty = _dirty.pop(key, None)
+        pool = _pools[key]
+        due = _recheck_at.get(key)
+        if due is not None and now >= due:
+            centers = sorted(pool)
+            _recheck_at.pop(key)
+        elif dirty:
+            centers = sorted({c for b in dirty for c in range(b - spread_max, b + spread_max + 1) if c in pool})
+        else:
+            continue
+        if not _match_pool(key, centers, now, formed):
+            _recheck_at[key] = now  # refused by the governor: search everything next time
+            break
+    return formed
+
+
+def _spread(ticket: Ticket, now: float) -> int:
+    widen = settings.MATCH_WIDEN_SECONDS
+    if widen <= 0:
+        return settings.MATCH_MAX_SPREAD_BUCKETS
+    return min(settings.MATCH_MAX_SPREAD_BUCKETS, int((now - ticket.since) / widen))
+
+
+def _match_pool(key: PoolKey, centers: List[int], now: float, formed: List[Tuple[str, List[str]]]) -> bool:
+    """Seat tables around *centers* of *key*'s pool; *False* if the governor refused a room."""
+    size = key[0]
+    widen = settings.MATCH_WIDEN_SECONDS
+    for center in centers:
+        while _pool_sizes.get(key, 0) >= size:
+            pool = _pools[key]
+            bucket = pool.get(center)
+            if not bucket:
+                break
+            oldest = next(iter(bucket.values()))
+            spread = _spread(oldest, now)
+            window = [b for b in _window(center, spread) if b in pool]
+            if sum(len(pool[b]) for b in window) < size:
+                if widen > 0 and spread < settings.MATCH_MAX_SPREAD_BUCKETS:
+                    # Look again once this window has grown.
+                    wake = oldest.since + widen * (spread + 1)
+                    if wake < _recheck_at.get(key, float("inf")):
+                        _recheck_at[key] = wake
+                break
+            if not governor.can_open_room():
+                return False
+            seated: List[Ticket] = []
+            for b in window:
+                for ticket in pool[b].values():
+                    seated.append(ticket)
+                    if len(seated) == size:
+                        break
+                if len(seated) == size:
+                    break
+            for ticket in seated:
+                dequeue(ticket.user_id)
+            formed.append((_open_room(key, seated, now), [t.user_id for t in seated]))
+    return True
+
+
+def _open_room(key: PoolKey, seated: List[Ticket], now: float) -> str:
+    from .game_logic import schedule_room_timers
+
+    _, morgana, percival, oberon, lady_enabled = key
+    host = min(seated, key=lambda t: t.since)
+    room_id = str(uuid.uuid4())
+    room = Room(room_id, RoomPlayer(host.user_id, host.name, wins=host.wins, ready=True))
+    for ticket in seated:
+        if ticket is not host:
+            room.add_player(RoomPlayer(ticket.user_id, ticket.name, wins=ticket.wins, ready=True))
+    room.config = GameConfig(morgana=morgana, percival=percival, oberon=oberon, lady_enabled=lady_enabled)
+    rooms[room_id] = room
+    # Dropped again if nobody connects.
+    schedule_room_timers(room)
+    for ticket in seated:
+        _matched[ticket.user_id] = (room_id, now)
+        metrics.MATCHMAKING_WAIT_SECONDS.observe(now - ticket.since)
+    metrics.MATCHES_FORMED.inc(str(key[0]))
+    LOG.info("match_formed", room_id=room_id, user_id=host.user_id, players=[t.user_id for t in seated],
+             waited_seconds=round(now - host.since, 1))
+    return room_id
+
+
+def _expire(now: float) -> List[str]:
+    """Drop tickets past ``MATCH_MAX_WAIT_SECONDS`` (only bucket heads need checking)."""
+    expired: List[str] = []
+    limit = settings.MATCH_MAX_WAIT_SECONDS
+    if limit > 0:
+        for pool in list(_pools.values()):
+            for bucket in list(pool.values()):
+                while bucket:
+                    ticket = next(iter(bucket.values()))
+                    if now - ticket.since < limit:
+                        break
+                    dequeue(ticket.user_id)
+                    expired.append(ticket.user_id)
+    while _matched:
+        user_id, (_, when) = next(iter(_matched.items()))
+        if now - when < _RESULT_TTL:
+            break
+        del _matched[user_id]
+    return expired
+
+
+async def _tick() -> None:
+    from .lobby import broadcast_lobbies
+
+    try:
+        start = metrics.now()
+        now = time.monotonic()
+        expired = _expire(now)
+        formed = match_once(now)
+        metrics.MATCHER_TICK_SECONDS.observe(metrics.now() - start)
+        if expired:
+            metrics.MATCHMAKING_EXPIRED.inc(amount=len(expired))
+        notices: Dict[str, str] = {uid: dumps({"type": "matchmaking_expired"}) for uid in expired}
+        for room_id, user_ids in formed:
+            text = dumps({"type": "match_found", "room_id": room_id})
+            for uid in user_ids:
+                notices[uid] = text
+        if notices:
+            for ws, uid in list(lobby_connections.items()):
+                text = notices.get(uid) if uid is not None else None
+                if text is not None:
+                    try:
+                        await ws.send_text(text)
+                    except Exception:
+                        pass
+        if formed:
+            await broadcast_lobbies()
+    finally:
+        if _tickets:
+            ensure_started()
+
+
+__all__ = [
+    "PoolKey",
+    "Ticket",
+    "pool_key",
+    "queued",
+    "enqueue",
+    "dequeue",
+    "status",
+    "ensure_started",
+    "match_once",
+]
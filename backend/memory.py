@@ -0,0 +1,305 @@
+"""Live memory introspection for ``/admin/memory``.
+
+Three views, each answering "what is holding the memory" at a different
+cost:
+
+* :func:`report` counts what the server state holds: rooms by phase, lobby
+  feeds, room connections, spectators. It estimates every room's own
+  footprint by walking the objects it references. Websockets, tasks,
+  classes and modules are not counted. Shared objects such as interned
+  strings are counted once per room, so the figure is an upper bound. It
+  also lists *suspects*: rooms that nothing will ever remove. Examples are
+  a finished game without an eviction timer, or an empty room without an
+  expiry timer. The walk costs up to ~100 µs per room. It runs in chunks
+  that yield to the event loop, but it is meant for on-demand admin calls,
+  not for scraping.
+* :func:`object_counts` groups everything the garbage collector tracks by
+  type. This shows, say, pydantic models or websockets piling up.
+* :mod:`tracemalloc` snapshots (:func:`start_tracing`,
+  :func:`take_snapshot`, :func:`diff`) attribute allocations to source
+  lines. Take one snapshot, let the server run, take another and diff
+  them: the sites that keep growing are the leak. Tracing slows
+  allocation-heavy code down noticeably. It is off unless
+  ``AVALON_TRACEMALLOC_FRAMES`` is set or it is started through the
+  endpoint.
+"""
+from __future__ import annotations
+
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import types
+from collections import Counter as Tally, deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from starlette.websockets import WebSocket
+
+from . import settings
+from .scheduler import SCHEDULER
+from .state import lobby_connections, mux_connections, rooms
+
+# Referenced by rooms but not owned by them (or not measurable).
+_OPAQUE = (WebSocket, asyncio.Future, type, types.ModuleType, types.FunctionType, types.MethodType,
+           types.BuiltinFunctionType)
+_LEAVES = (str, bytes, int, float, complex)
+# Rooms walked between yields to the event loop in :func:`report`.
+_CHUNK = 100
+
+
+# -----------------------------
+# Process and state
+# -----------------------------
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux only; ``None`` elsewhere)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# type -> None (not followed), "dict", "items" or the slot names to follow.
+_walks: Dict[type, Any] = {}
+
+
+def _walk_of(cls: type) -> Any:
+    if issubclass(cls, _OPAQUE):
+        return False
+    if issubclass(cls, _LEAVES):
+        return None
+    if issubclass(cls, dict):
+        return "dict"
+    if issubclass(cls, (list, tuple, set, frozenset, deque)):
+        return "items"
+    names = [name for klass in cls.__mro__ for name in klass.__dict__.get("__slots__", ())]
+    if hasattr(cls, "__dict__") and "__dict__" not in names:
+        names.append("__dict__")
+    return tuple(names)
+
+
+def footprint(root: Any) -> int:
+    """Estimated bytes of everything reachable from *root* (see the module docstring)."""
+    seen: Set[int] = set()
+    stack = [root]
+    total = 0
+    walks = _walks
+    sizeof = sys.getsizeof
+    while stack:
+        obj = stack.pop()
+        if obj is None or obj is True or obj is False or id(obj) in seen:
+            continue
+        cls = type(obj)
+        walk = walks.get(cls, ...)
+        if walk is ...:
+            walk = walks[cls] = _walk_of(cls)
+        if walk is False:
+            continue
+        seen.add(id(obj))
+        total += sizeof(obj)
+        if walk is None:
+            continue
+        if walk == "dict":
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif walk == "items":
+            stack.extend(obj)
+        else:
+            for name in walk:
+                stack.append(getattr(obj, name, None))
+    return total
+
+
+def _room_row(room: Any) -> Dict[str, Any]:
+    feed = room.spectators
+    return {
+        "room_id": room.room_id,
+        "phase": room.phase,
+        "players": len(room.players),
+        "connections": len(room.connections),
+        "disconnected": len(room.disconnected_players),
+        "spectators": len(feed.sockets) if feed is not None else 0,
+        "backlog": len(room.backlog) if room.backlog is not None else 0,
+        "bytes": footprint(room),
+    }
+
+
+def _suspects() -> Dict[str, List[str]]:
+    """Rooms that no timer will ever remove, and connections nobody owns."""
+    finished: List[str] = []
+    abandoned: List[str] = []
+    strangers: List[str] = []
+    for rid, room in rooms.items():
+        if room.phase == "finished" and settings.FINISHED_ROOM_TTL_SECONDS > 0 and SCHEDULER.get((rid, "finished")) is None:
+            finished.append(rid)
+        if not room.connections and SCHEDULER.get((rid, "expire")) is None:
+            abandoned.append(rid)
+        if any(uid not in room.players for uid in room.connections):
+            strangers.append(rid)
+    return {
+        "finished_without_eviction": finished,
+        "empty_without_expiry": abandoned,
+        "connections_of_non_players": strangers,
+    }
+
+
+async def report(top: int = 20) -> Dict[str, Any]:
+    """Sizes of the server state, per-room estimates (largest *top* listed) and leak suspects."""
+    phases: Dict[str, Dict[str, int]] = {}
+    snapshot = list(rooms.values())
+    rows: List[Dict[str, Any]] = []
+    for start in range(0, len(snapshot), _CHUNK):
+        if start:
+            await asyncio.sleep(0)
+        rows.extend(_room_row(room) for room in snapshot[start:start + _CHUNK])
+    for row in rows:
+        entry = phases.setdefault(row["phase"], {"rooms": 0, "bytes": 0})
+        entry["rooms"] += 1
+        entry["bytes"] += row["bytes"]
+    rows.sort(key=lambda row: row["bytes"], reverse=True)
+    total = sum(row["bytes"] for row in rows)
+    return {
+        "process": {
+            "rss_bytes": rss_bytes(),
+            "gc_counts": list(gc.get_count()),
+            "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        },
+        "state": {
+            "rooms": len(rows),
+            "lobby_connections": len(lobby_connections),
+            "lobby_connections_anonymous": sum(1 for uid in lobby_connections.values() if uid is None),
+            "mux_connections": len(mux_connections),
+            "room_connections": sum(row["connections"] for row in rows),
+            "disconnected_players": sum(row["disconnected"] for row in rows),
+            "spectators": sum(row["spectators"] for row in rows),
+            "backlog_events": sum(row["backlog"] for row in rows),
+            "pending_timers": len(SCHEDULER),
+        },
+        "rooms": {
+            "estimated_bytes": total,
+            "mean_bytes": total // len(rows) if rows else 0,
+            "by_phase": phases,
+            "largest": rows[:max(0, top)],
+        },
+        "suspects": _suspects(),
+    }
+
+
+def object_counts(top: int = 30) -> List[Dict[str, Any]]:
+    """Objects tracked by the garbage collector, grouped by type (most numerous first)."""
+    counts: Tally = Tally()
+    sizes: Tally = Tally()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        name = f"{cls.__module__}.{cls.__qualname__}"
+        counts[name] += 1
+        sizes[name] += sys.getsizeof(obj)
+    return [{"type": name, "count": n, "bytes": sizes[name]} for name, n in counts.most_common(max(0, top))]
+
+
+# -----------------------------
+# tracemalloc snapshots
+# -----------------------------
+
+# id -> (unix time, snapshot); oldest dropped beyond MEMORY_SNAPSHOTS_MAX.
+_snapshots: Dict[int, Tuple[float, tracemalloc.Snapshot]] = {}
+_next_id = 1
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def start_tracing(frames: int = 1) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, frames))
+
+
+def stop_tracing() -> None:
+    """Stop tracing and forget every snapshot."""
+    tracemalloc.stop()
+    _snapshots.clear()
+
+
+def tracing_status() -> Dict[str, Any]:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {
+        "tracing": tracing,
+        "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "snapshots": sorted(_snapshots),
+    }
+
+
+def _site(stat: Any) -> Dict[str, Any]:
+    return {
+        "where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size": stat.size,
+        "count": stat.count,
+        "size_diff": getattr(stat, "size_diff", None),
+        "count_diff": getattr(stat, "count_diff", None),
+    }
+
+
+def take_snapshot(top: int = 20, key: str = "lineno") -> Dict[str, Any]:
+    """Store a new snapshot and return its id with the *top* allocation sites.
+
+    Raises :class:`RuntimeError` when tracing is off.
+    """
+    global _next_id
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing")
+    snap = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    snap_id, _next_id = _next_id, _next_id + 1
+    _snapshots[snap_id] = (time.time(), snap)
+    while len(_snapshots) > settings.MEMORY_SNAPSHOTS_MAX:
+        del _snapshots[min(_snapshots)]
+    stats = snap.statistics(key)
+    return {
+        "id": snap_id,
+        "taken_at": _snapshots[snap_id][0],
+        "traced_bytes": sum(stat.size for stat in stats),
+        "top": [_site(stat) for stat in stats[:max(0, top)]],
+    }
+
+
+def diff(base: int, against: Optional[int] = None, top: int = 20, key: str = "lineno") -> Dict[str, Any]:
+    """Allocation sites that grew most from snapshot *base* to *against* (default: the newest).
+
+    Raises :class:`KeyError` for an unknown snapshot id.
+    """
+    if against is None:
+        if not _snapshots:
+            raise KeyError(base)
+        against = max(_snapshots)
+    old_at, old = _snapshots[base]
+    new_at, new = _snapshots[against]
+    stats = new.compare_to(old, key)
+    return {
+        "base": base,
+        "against": against,
+        "seconds": round(new_at - old_at, 3),
+        "size_diff": sum(stat.size_diff for stat in stats),
+        "top": [_site(stat) for stat in stats[:max(0, top)]],
+    }
+
+
+__all__ = [
+    "rss_bytes",
+    "footprint",
+    "report",
+    "object_counts",
+    "start_tracing",
+    "stop_tracing",
+    "tracing_status",
+    "take_snapshot",
+    "diff",
+]
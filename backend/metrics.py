@@ -0,0 +1,490 @@
+"""Low-overhead in-process metrics with a Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects updated inline on
+the hot paths (a dict lookup and a couple of additions per observation).
+Nothing is exported until ``GET /metrics`` renders the registry, so there
+is no background work and no external service involved.
+"""
+from __future__ import annotations
+
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds – from 50µs (dict updates) to 2.5s (slow DB).
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+# Payload size buckets in bytes.
+SIZE_BUCKETS: Tuple[float, ...] = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576,
+)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.register(self)
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, str, float]]:
+        """Yield ``(suffix, label values, extra label, value)`` tuples."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            labels = _format_labels(self.labelnames, values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set, either incremented or computed by a callback at scrape time."""
+
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ) -> None:
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        if self._callback is not None:
+            return self._callback().get(labels, 0.0)
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        values = self._callback() if self._callback is not None else self._values
+        for labels, value in sorted(values.items()):
+            yield "_total", labels, "", value
+
+
+class Gauge(_Metric):
+    """Point-in-time value, either set directly or computed by a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ) -> None:
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def value(self, *labels: str) -> float:
+        if self._callback is not None:
+            return self._callback().get(labels, 0.0)
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        values = self._callback() if self._callback is not None else self._values
+        for labels, value in sorted(values.items()):
+            yield "", labels, "", value
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed distribution per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._data: Dict[LabelValues, List[float]] = {}
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, *labels: str) -> None:
+        data = self._data.get(labels)
+        if data is None:
+            data = self._data[labels] = [0.0] * (len(self.buckets) + 2)
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def count(self, *labels: str) -> int:
+        data = self._data.get(labels)
+        return int(sum(data[:-1])) if data else 0
+
+    def sum(self, *labels: str) -> float:
+        data = self._data.get(labels)
+        return data[-1] if data else 0.0
+
+    def samples(self):
+        for labels, data in sorted(self._data.items()):
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (math.inf,), data[:-1]):
+                cumulative += n
+                yield "_bucket", labels, f'le="{_format_value(bound)}"', cumulative
+            yield "_sum", labels, "", data[-1]
+            yield "_count", labels, "", cumulative
+
+
+class Registry:
+    """Ordered collection of metrics rendered by ``/metrics``."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name!r}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+now = time.perf_counter
+
+# -----------------------------
+# Application metrics
+# -----------------------------
+
+# Message types understood by ``handle_ws_message``; anything else is
+# reported as "unknown" so clients cannot blow up label cardinality.
+KNOWN_WS_MESSAGE_TYPES = frozenset({
+    "toggle_ready", "kick", "start_game", "propose_team", "vote_team",
+    "submit_card", "assassin_guess", "assassination_vote", "set_config",
+    "restart_game", "reset_lobby", "lady_choose",
+})
+
+
+def ws_message_label(msg_type: object) -> str:
+    return msg_type if msg_type in KNOWN_WS_MESSAGE_TYPES else "unknown"  # type: ignore[return-value]
+
+
+WS_MESSAGES = Counter(
+    "avalon_ws_messages", "Room websocket messages handled, by type.", ["type"]
+)
+WS_MESSAGE_SECONDS = Histogram(
+    "avalon_ws_message_seconds", "Time spent in handle_ws_message, by message type.", ["type"]
+)
+WS_ERRORS = Counter(
+    "avalon_ws_errors", "Unexpected exceptions in websocket receive loops.", ["endpoint"]
+)
+BROADCAST_SECONDS = Histogram(
+    "avalon_broadcast_seconds", "Wall time of a full fan-out, by kind.", ["kind"]
+)
+BROADCAST_BYTES = Histogram(
+    "avalon_broadcast_bytes", "Total bytes sent by one fan-out, by kind.", ["kind"], buckets=SIZE_BUCKETS
+)
+BROADCAST_RECIPIENTS = Counter(
+    "avalon_broadcast_recipients", "Messages sent by fan-outs, by kind.", ["kind"]
+)
+BCRYPT_VERIFY_SECONDS = Histogram(
+    "avalon_bcrypt_verify_seconds", "Time spent verifying bcrypt password hashes.",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5),
+)
+DB_QUERY_SECONDS = Histogram(
+    "avalon_db_query_seconds", "SQLite query latency, by connection and statement kind.", ["connection", "op"]
+)
+BOT_MOVES = Counter(
+    "avalon_bot_moves", "Moves played by server-side bots, by decision kind.", ["kind"]
+)
+BOT_THINK_SECONDS = Histogram(
+    "avalon_bot_think_seconds", "Wall time from starting a bot search to its result, by decision kind.", ["kind"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+BOT_ITERATIONS = Histogram(
+    "avalon_bot_search_iterations", "ISMCTS iterations completed per bot decision, by decision kind.", ["kind"],
+    buckets=(0, 32, 100, 250, 500, 1000, 2500, 5000, 10000, 20000),
+)
+BOT_ERRORS = Counter(
+    "avalon_bot_errors", "Bot decisions that raised instead of producing a move.", ["kind"]
+)
+TIMERS_FIRED = Counter(
+    "avalon_timers_fired", "Scheduler timers that reached their deadline, by kind.", ["kind"]
+)
+TIMER_ERRORS = Counter(
+    "avalon_timer_errors", "Scheduler callbacks that raised, by kind.", ["kind"]
+)
+TIMER_LAG_SECONDS = Histogram(
+    "avalon_timer_lag_seconds", "Delay between a timer's deadline and its callback running, by kind.", ["kind"]
+)
+PHASE_TIMEOUTS = Counter(
+    "avalon_phase_timeouts", "Turn timers that ran out and played default moves, by decision.", ["phase"]
+)
+HEARTBEAT_PINGS = Counter(
+    "avalon_heartbeat_pings", "Heartbeat pings sent to websocket clients."
+)
+HEARTBEAT_RTT_SECONDS = Histogram(
+    "avalon_heartbeat_rtt_seconds", "Ping to pong round trip reported by websocket clients."
+)
+HEARTBEAT_REAPED = Counter(
+    "avalon_heartbeat_reaped", "Websocket connections closed for missing heartbeats, by endpoint.", ["endpoint"]
+)
+HEARTBEAT_DETECTION_SECONDS = Histogram(
+    "avalon_heartbeat_detection_seconds", "Time from the first unanswered ping to reaping the connection, by endpoint.",
+    ["endpoint"], buckets=(1, 5, 10, 15, 20, 30, 45, 60, 90, 120),
+)
+RECONNECTS = Counter(
+    "avalon_room_reconnects", "Room websocket (re)connections, by catch-up mode (replay / snapshot).", ["mode"]
+)
+REPLAYED_EVENTS = Counter(
+    "avalon_replayed_events", "Backlogged room events re-sent to reconnecting clients."
+)
+MUX_SUBSCRIPTIONS = Counter(
+    "avalon_mux_subscriptions", "Channels opened on multiplexed /mux connections, by kind.", ["channel"]
+)
+WS_THROTTLED = Counter(
+    "avalon_ws_throttled", "Websocket messages dropped by a rate limit, by endpoint and message type.",
+    ["endpoint", "type"],
+)
+WS_DEFERRED = Counter(
+    "avalon_ws_deferred", "Websocket game actions held back by a rate limit, by endpoint and message type.",
+    ["endpoint", "type"],
+)
+WS_OVERSIZE_FRAMES = Counter(
+    "avalon_ws_oversize_frames", "Connections closed for sending a frame above AVALON_WS_MAX_FRAME_BYTES.", ["endpoint"]
+)
+WS_FLOOD_CLOSED = Counter(
+    "avalon_ws_flood_closed", "Connections closed for flooding past AVALON_WS_FLOOD_CLOSE_AFTER.", ["endpoint"]
+)
+GOVERNOR_REJECTIONS = Counter(
+    "avalon_governor_rejections", "Rooms, games and connections refused by the resource governor, by limit.", ["limit"]
+)
+LOOP_LAG_SECONDS = Histogram(
+    "avalon_loop_lag_seconds", "How late the event loop ran the periodic lag probe.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SPECTATORS_REJECTED = Counter(
+    "avalon_spectators_rejected", "Spectators turned away by a viewer limit, by limit.", ["limit"]
+)
+SPECTATOR_FRAMES_SKIPPED = Counter(
+    "avalon_spectator_frames_skipped", "Stale spectator snapshots dropped because a newer one was queued."
+)
+MATCHES_FORMED = Counter(
+    "avalon_matches_formed", "Rooms opened by the matchmaking queue, by table size.", ["players"]
+)
+MATCHMAKING_EXPIRED = Counter(
+    "avalon_matchmaking_expired", "Matchmaking tickets dropped after AVALON_MATCH_MAX_WAIT_SECONDS."
+)
+MATCHMAKING_WAIT_SECONDS = Histogram(
+    "avalon_matchmaking_wait_seconds", "Time from queueing to being seated by the matcher.",
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+MATCHER_TICK_SECONDS = Histogram(
+    "avalon_matcher_tick_seconds", "Duration of one matchmaking pass.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1),
+)
+
+
+def _rooms_by_phase() -> Dict[LabelValues, float]:
+    from .state import rooms
+
+    counts: Dict[LabelValues, float] = {(p,): 0.0 for p in ("lobby", "in_game", "assassination", "finished")}
+    for room in rooms.values():
+        counts[(room.phase,)] = counts.get((room.phase,), 0.0) + 1
+    return counts
+
+
+def _room_connections() -> Dict[LabelValues, float]:
+    from .state import rooms
+
+    return {(): float(sum(len(room.connections) for room in rooms.values()))}
+
+
+def _lobby_connections() -> Dict[LabelValues, float]:
+    from .state import lobby_connections
+
+    return {(): float(len(lobby_connections))}
+
+
+def _mux_connections() -> Dict[LabelValues, float]:
+    from .state import mux_connections
+
+    return {(): float(len(mux_connections))}
+
+
+def _spectators() -> Dict[LabelValues, float]:
+    from .spectators import total
+
+    return {(): float(total())}
+
+
+def _loop_lag() -> Dict[LabelValues, float]:
+    from .governor import loop_lag
+
+    return {(): loop_lag()}
+
+
+def _matchmaking_queued() -> Dict[LabelValues, float]:
+    from .matchmaking import queued
+
+    return {(): float(queued())}
+
+
+def _pending_timers() -> Dict[LabelValues, float]:
+    from .scheduler import SCHEDULER
+
+    return {(): float(len(SCHEDULER))}
+
+
+def _resident_bytes() -> Dict[LabelValues, float]:
+    from .memory import rss_bytes
+
+    rss = rss_bytes()
+    return {(): float(rss)} if rss is not None else {}
+
+
+def _log_records() -> Dict[LabelValues, float]:
+    from .logs import LOG, level_name
+
+    return {(level_name(level),): float(n) for level, n in list(LOG.written.items())}
+
+
+def _log_dropped() -> Dict[LabelValues, float]:
+    from .logs import LOG
+
+    return {
+        ("sampled",): float(LOG.sampled_out),
+        ("queue_full",): float(LOG.overflowed),
+        ("write_error",): float(LOG.write_errors),
+    }
+
+
+ROOMS = Gauge("avalon_rooms", "Rooms currently held in memory, by phase.", ["phase"], callback=_rooms_by_phase)
+ROOM_CONNECTIONS = Gauge("avalon_room_connections", "Open room connections (/ws/{room_id} and /mux room channels).", callback=_room_connections)
+LOBBY_CONNECTIONS = Gauge("avalon_lobby_connections", "Open lobby feeds (/lobbies_ws and /mux lobby channels).", callback=_lobby_connections)
+MUX_CONNECTIONS = Gauge("avalon_mux_connections", "Open /mux connections.", callback=_mux_connections)
+SPECTATORS = Gauge("avalon_spectators", "Open spectator connections across all rooms.", callback=_spectators)
+LOOP_LAG = Gauge("avalon_loop_lag_estimate_seconds", "Smoothed event-loop lag the governor sheds load on.", callback=_loop_lag)
+MATCHMAKING_QUEUED = Gauge("avalon_matchmaking_queued", "Players waiting in the matchmaking queue.", callback=_matchmaking_queued)
+PENDING_TIMERS = Gauge("avalon_pending_timers", "Timers waiting in the scheduler heap.", callback=_pending_timers)
+PROCESS_RESIDENT_BYTES = Gauge("avalon_process_resident_bytes", "Resident memory of the server process.", callback=_resident_bytes)
+# The log writer thread keeps its own tallies; these read them at scrape time.
+LOG_RECORDS = Counter("avalon_log_records", "Structured log records written, by level.", ["level"], callback=_log_records)
+LOG_DROPPED = Counter(
+    "avalon_log_records_dropped", "Structured log records not written, by reason (sampled, queue_full, write_error).",
+    ["reason"], callback=_log_dropped,
+)
+
+
+def render() -> str:
+    """Return the Prometheus text exposition of every registered metric."""
+    return REGISTRY.render()
+
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "REGISTRY",
+    "CONTENT_TYPE",
+    "LATENCY_BUCKETS",
+    "SIZE_BUCKETS",
+    "now",
+    "ws_message_label",
+    "WS_MESSAGES",
+    "WS_MESSAGE_SECONDS",
+    "WS_ERRORS",
+    "BROADCAST_SECONDS",
+    "BROADCAST_BYTES",
+    "BROADCAST_RECIPIENTS",
+    "BCRYPT_VERIFY_SECONDS",
+    "DB_QUERY_SECONDS",
+    "BOT_MOVES",
+    "BOT_THINK_SECONDS",
+    "BOT_ITERATIONS",
+    "BOT_ERRORS",
+    "TIMERS_FIRED",
+    "TIMER_ERRORS",
+    "TIMER_LAG_SECONDS",
+    "PHASE_TIMEOUTS",
+    "HEARTBEAT_PINGS",
+    "HEARTBEAT_RTT_SECONDS",
+    "HEARTBEAT_REAPED",
+    "HEARTBEAT_DETECTION_SECONDS",
+    "RECONNECTS",
+    "REPLAYED_EVENTS",
+    "MUX_SUBSCRIPTIONS",
+    "WS_THROTTLED",
+    "WS_DEFERRED",
+    "WS_OVERSIZE_FRAMES",
+    "WS_FLOOD_CLOSED",
+    "GOVERNOR_REJECTIONS",
+    "LOOP_LAG_SECONDS",
+    "SPECTATORS_REJECTED",
+    "SPECTATOR_FRAMES_SKIPPED",
+    "MATCHES_FORMED",
+    "MATCHMAKING_EXPIRED",
+    "MATCHMAKING_WAIT_SECONDS",
+    "MATCHER_TICK_SECONDS",
+    "LOG_RECORDS",
+    "LOG_DROPPED",
+    "ROOMS",
+    "ROOM_CONNECTIONS",
+    "LOBBY_CONNECTIONS",
+    "MUX_CONNECTIONS",
+    "SPECTATORS",
+    "LOOP_LAG",
+    "MATCHMAKING_QUEUED",
+    "PENDING_TIMERS",
+    "PROCESS_RESIDENT_BYTES",
+    "render",
+]
@@ -2,6 +2,8 @@ from tortoise import fields
 from tortoise.models import Model
 import uuid
 
+from . import settings
+
 class User(Model):
     """User account stored in SQLite database."""
 
@@ -17,6 +19,22 @@ class User(Model):
     evil_losses = fields.IntField(default=0)
     # Mapping role name -> {"wins": int, "losses": int}
     role_stats = fields.JSONField(default=dict)
+    # --- Skill rating (see ``backend.ratings``); indexed for the leaderboard --- #
+    rating = fields.FloatField(default=settings.RATING_INITIAL, index=True)
+    rated_games = fields.IntField(default=0)
+
+    class Meta:
+        table = "users"
+
+
+class Match(Model):
+    """A finished game, kept so ratings can be recomputed from history."""
+
+    id = fields.IntField(pk=True)
+    finished_at = fields.DatetimeField(auto_now_add=True)
+    winner = fields.CharField(max_length=4)  # "good" | "evil"
+    # Human seats only: [{"user_id": str, "role": str, "team": "good" | "evil"}, ...]
+    players = fields.JSONField(default=list)
 
     class Meta:
-        table = "users" 
\ No newline at end of file
+        table = "matches" 
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""Opt-in sampling profiler for websocket messages and HTTP requests.
+
+A configurable fraction of ``handle_ws_message`` calls and HTTP requests
+is run under :mod:`cProfile`; each sample is written as a ``.prof`` file
+(load it with ``python -m pstats``, snakeviz or flameprof) into a rotating
+directory. When the sample rate is 0 the only cost on the hot path is one
+float comparison.
+
+Because the event loop is single-threaded, a sample also captures any
+other coroutine that ran while the sampled call was awaiting. Only one
+sample is taken at a time so the profiles do not overlap.
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import os
+import pstats
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from . import settings
+
+T = TypeVar("T")
+
+_SAFE_LABEL = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class SamplingProfiler:
+    """Holds the runtime-toggleable sampling configuration and writes samples."""
+
+    def __init__(self, rate: float, directory: str, max_files: int) -> None:
+        self.rate = max(0.0, min(1.0, rate))
+        self.directory = directory
+        self.max_files = max_files
+        self.samples_taken = 0
+        self._active = False
+
+    # -------------------- Configuration -------------------- #
+
+    def configure(self, rate: Optional[float] = None, max_files: Optional[int] = None) -> None:
+        if rate is not None:
+            self.rate = max(0.0, min(1.0, rate))
+        if max_files is not None:
+            self.max_files = max(1, max_files)
+
+    def should_sample(self) -> bool:
+        return self.rate > 0.0 and not self._active and random.random() < self.rate
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "directory": os.path.abspath(self.directory),
+            "max_files": self.max_files,
+            "samples_taken": self.samples_taken,
+            "files": self.list_files(),
+        }
+
+    def list_files(self) -> List[str]:
+        try:
+            return sorted(f for f in os.listdir(self.directory) if f.endswith(".prof"))
+        except FileNotFoundError:
+            return []
+
+    # -------------------- Sampling -------------------- #
+
+    async def run(self, kind: str, label: str, fn: Callable[..., Awaitable[T]], *args: Any) -> T:
+        """Await ``fn(*args)`` under cProfile and persist the result."""
+        self._active = True
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return await fn(*args)
+        finally:
+            profile.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._active = False
+            self.samples_taken += 1
+            stats = pstats.Stats(profile)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.samples_taken:06d}-{kind}-{_SAFE_LABEL.sub('_', label)[:60]}-{elapsed_ms:.1f}ms.prof"
+            # Keep disk I/O off the event loop.
+            asyncio.get_running_loop().run_in_executor(None, self._write, stats, name)
+
+    def _write(self, stats: pstats.Stats, name: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stats.dump_stats(os.path.join(self.directory, name))
+        files = self.list_files()
+        for stale in files[: max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, stale))
+            except FileNotFoundError:
+                pass
+
+
+PROFILER = SamplingProfiler(settings.PROFILE_SAMPLE_RATE, settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that samples HTTP requests into :data:`PROFILER`."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not PROFILER.should_sample():
+            await self.app(scope, receive, send)
+            return
+        label = f"{scope.get('method', '')}{scope.get('path', '')}"
+        await PROFILER.run("http", label, self.app, scope, receive, send)
+
+
+__all__ = ["SamplingProfiler", "PROFILER", "ProfilingMiddleware"]
@@ -0,0 +1,170 @@
+"""Per-connection flood protection for the websocket receive loops.
+
+Every message a client sends can end in a full ``broadcast_state`` to the
+room, so one tab spamming ``toggle_ready`` costs everybody. Each
+connection therefore carries a :class:`ConnectionLimiter`: one token bucket
+for all its messages plus one per message type (``settings.WS_TYPE_RATES``).
+A message is only handled if both buckets hold a token. Game actions
+(:data:`DEFERRED_TYPES`) are never lost: the connection's receive loop
+waits for the next token and then handles them, which slows only that
+client down. Any other message is dropped, and the client gets a single
+``{"type": "throttled", ...}`` notice per burst. A connection that keeps
+flooding (``WS_FLOOD_CLOSE_AFTER`` throttled or deferred messages within
+ten seconds) is closed with 1008. Frames above ``WS_MAX_FRAME_BYTES``
+are never parsed and close the connection with 1009.
+
+Buckets are keyed by the metrics label of the message type, so a client
+inventing types cannot grow the per-connection state.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from . import heartbeat, metrics, settings
+from .logs import LOG
+
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TOO_BIG = 1009
+
+# Window over which throttled messages count towards ``WS_FLOOD_CLOSE_AFTER``.
+FLOOD_WINDOW_SECONDS = 10.0
+
+# Turn actions a client sends once and never repeats: held back, not dropped.
+DEFERRED_TYPES = frozenset({"propose_team", "vote_team", "submit_card", "lady_choose", "assassination_vote"})
+
+# Operations of the multiplexed endpoint, limited under their own names.
+_MUX_OPS = frozenset({"subscribe", "unsubscribe"})
+
+
+class TokenBucket:
+    """Classic token bucket refilled lazily from a monotonic clock."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def refill(self, now: float) -> float:
+        if now > self.stamp:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+        return self.tokens
+
+    def wait(self) -> float:
+        """Seconds until the next token (after :meth:`refill`)."""
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+def message_label(data: Any) -> str:
+    if isinstance(data, dict):
+        op = data.get("op")
+        if op in _MUX_OPS:
+            return op
+        return metrics.ws_message_label(data.get("type"))
+    return "unknown"
+
+
+class ConnectionLimiter:
+    """Rate limits of one websocket connection."""
+
+    __slots__ = ("endpoint", "total", "by_type", "strikes", "window_start", "notified")
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        now = time.monotonic()
+        self.total: Optional[TokenBucket] = (
+            TokenBucket(settings.WS_RATE_PER_SECOND, settings.WS_RATE_BURST, now)
+            if settings.WS_RATE_PER_SECOND > 0 else None
+        )
+        self.by_type: Dict[str, TokenBucket] = {}
+        # Throttled messages in the current flood window.
+        self.strikes = 0
+        self.window_start = now
+        # Whether the current burst was already answered with a notice.
+        self.notified = False
+
+    def allow(self, label: str) -> float:
+        """Take a token for a *label* message; return 0, or the seconds to wait."""
+        now = time.monotonic()
+        bucket = self.by_type.get(label)
+        if bucket is None:
+            limit = settings.WS_TYPE_RATES.get(label)
+            if limit is not None and limit[0] > 0:
+                bucket = self.by_type[label] = TokenBucket(limit[0], limit[1], now)
+        wait = 0.0
+        for b in (self.total, bucket):
+            if b is not None and b.refill(now) < 1.0:
+                wait = max(wait, b.wait())
+        if wait:
+            return wait
+        for b in (self.total, bucket):
+            if b is not None:
+                b.tokens -= 1.0
+        return 0.0
+
+    async def admit(self, ws: WebSocket, text: str) -> Optional[Any]:
+        """Parse *text* if it passes the limits; ``None`` means skip it.
+
+        Pongs bypass the buckets. Oversized frames and sustained floods
+        close *ws* and raise :class:`WebSocketDisconnect`.
+        """
+        if len(text) > settings.WS_MAX_FRAME_BYTES:
+            metrics.WS_OVERSIZE_FRAMES.inc(self.endpoint)
+            await _close(ws, CLOSE_TOO_BIG)
+        data = json.loads(text)
+        if heartbeat.is_pong(data):
+            return None
+        label = message_label(data)
+        wait = self.allow(label)
+        if not wait:
+            self.notified = False
+            return data
+        now = time.monotonic()
+        if now - self.window_start > FLOOD_WINDOW_SECONDS:
+            self.window_start = now
+            self.strikes = 0
+        self.strikes += 1
+        if settings.WS_FLOOD_CLOSE_AFTER and self.strikes >= settings.WS_FLOOD_CLOSE_AFTER:
+            metrics.WS_FLOOD_CLOSED.inc(self.endpoint)
+            LOG.warning("ws_flood_closed", endpoint=self.endpoint, type=label)
+            await _close(ws, CLOSE_POLICY_VIOLATION)
+        if label in DEFERRED_TYPES:
+            metrics.WS_DEFERRED.inc(self.endpoint, label)
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self.allow(label)
+            return data
+        metrics.WS_THROTTLED.inc(self.endpoint, label)
+        if not self.notified:
+            self.notified = True
+            notice = {"type": "throttled", "message_type": label, "retry_after": round(wait, 3)}
+            if isinstance(data, dict) and isinstance(data.get("channel"), str):
+                notice = {"channel": data["channel"], **notice}
+            await ws.send_json(notice)
+        return None
+
+
+async def _close(ws: WebSocket, code: int) -> None:
+    try:
+        await ws.close(code=code)
+    except Exception:
+        pass
+    raise WebSocketDisconnect(code=code)
+
+
+__all__ = [
+    "CLOSE_POLICY_VIOLATION",
+    "CLOSE_TOO_BIG",
+    "DEFERRED_TYPES",
+    "TokenBucket",
+    "ConnectionLimiter",
+    "message_label",
+]
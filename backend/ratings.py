@@ -0,0 +1,255 @@
+"""Skill ratings: team Elo updated at game end, recomputable from history.
+
+Avalon is a team game with hidden roles, so a player's result is modelled
+as their team's result. The good side's chance of winning is the Elo
+expectation between the mean ratings of both teams (the evil side can be
+handicapped by ``RATING_EVIL_ADVANTAGE``). Every human player then moves by
+``K * (score - expected)``. ``K`` is larger for the first
+``RATING_PROVISIONAL_GAMES`` so newcomers settle quickly. Bots are not
+rated and do not count towards a team's mean. A team of bots only plays at
+``RATING_INITIAL``.
+
+:func:`update` is the incremental step ``record_game_stats`` applies to
+each finished game. Every finished game is also stored as a
+:class:`backend.models.Match`. When the formula or its constants change,
+``python -m backend.ratings`` replays that history from scratch. The replay
+is vectorised with numpy when it is installed. Matches are packed into
+waves in which nobody plays twice, and each wave is a handful of array
+operations. The replay keeps every player's own game order, so its result
+equals playing the games one by one.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from . import settings
+
+try:  # optional dependency – the replay falls back to plain Python without it
+    import numpy as np  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - depends on environment
+    np = None
+
+Rating = Tuple[float, int]  # (rating, rated games)
+# One game of history: (winner, [(user_id, team), ...]) with teams "good" / "evil".
+MatchRecord = Tuple[str, Sequence[Tuple[str, str]]]
+
+
+def k_factor(games: int) -> float:
+    if games < settings.RATING_PROVISIONAL_GAMES:
+        return settings.RATING_K_PROVISIONAL
+    return settings.RATING_K
+
+
+def expected_good(good: float, evil: float) -> float:
+    """Probability that a good team of mean rating *good* beats evil of mean *evil*."""
+    return 1.0 / (1.0 + 10.0 ** ((evil + settings.RATING_EVIL_ADVANTAGE - good) / 400.0))
+
+
+def update(current: Mapping[str, Rating], teams: Mapping[str, str], winner: str) -> Dict[str, Rating]:
+    """New ``(rating, games)`` of everyone in *teams* (user_id -> team) after a win of *winner*.
+
+    Players missing from *current* start at ``RATING_INITIAL``.
+    """
+    fresh = (settings.RATING_INITIAL, 0)
+    totals = {"good": [0.0, 0], "evil": [0.0, 0]}
+    for uid, team in teams.items():
+        entry = totals[team]
+        entry[0] += current.get(uid, fresh)[0]
+        entry[1] += 1
+    means = {team: total / n if n else settings.RATING_INITIAL for team, (total, n) in totals.items()}
+    e_good = expected_good(means["good"], means["evil"])
+    result: Dict[str, Rating] = {}
+    for uid, team in teams.items():
+        rating, games = current.get(uid, fresh)
+        expected = e_good if team == "good" else 1.0 - e_good
+        score = 1.0 if team == winner else 0.0
+        result[uid] = (rating + k_factor(games) * (score - expected), games + 1)
+    return result
+
+
+# -----------------------------
+# Batch recomputation
+# -----------------------------
+
+
+class Replay:
+    """Ratings rebuilt from scratch by feeding match history oldest first."""
+
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+        self.ratings: List[float] = []
+        self.games: List[int] = []
+        self.matches = 0
+
+    def _slot(self, uid: str) -> int:
+        slot = self.index.get(uid)
+        if slot is None:
+            slot = self.index[uid] = len(self.ratings)
+            self.ratings.append(settings.RATING_INITIAL)
+            self.games.append(0)
+        return slot
+
+    def feed(self, batch: Sequence[MatchRecord]) -> None:
+        """Apply the next *batch* of matches (in the order they were played)."""
+        if np is None:
+            self._feed_sequential(batch)
+        else:
+            self._feed_vectorised(batch)
+        self.matches += len(batch)
+
+    def _feed_sequential(self, batch: Sequence[MatchRecord]) -> None:
+        for winner, seats in batch:
+            slots = {uid: self._slot(uid) for uid, _ in seats}
+            current = {uid: (self.ratings[s], self.games[s]) for uid, s in slots.items()}
+            for uid, (rating, games) in update(current, dict(seats), winner).items():
+                self.ratings[slots[uid]] = rating
+                self.games[slots[uid]] = games
+
+    def _feed_vectorised(self, batch: Sequence[MatchRecord]) -> None:
+        # Flatten to one row per seat and give every match the first wave after
+        # the last wave of any of its players (plain loops: this is the hot part).
+        index, slot = self.index, self._slot
+        last: Dict[int, int] = {}
+        last_wave = last.get
+        players: List[int] = []
+        good: List[bool] = []
+        sizes: List[int] = []
+        waves: List[int] = []
+        for _, seats in batch:
+            slots = [index[uid] if uid in index else slot(uid) for uid, _ in seats]
+            wave = 1 + max([last_wave(s, -1) for s in slots])
+            for s in slots:
+                last[s] = wave
+            players.extend(slots)
+            good.extend([team == "good" for _, team in seats])
+            sizes.append(len(slots))
+            waves.append(wave)
+        if not players:
+            return
+        match = np.repeat(np.arange(len(batch), dtype=np.int64), sizes)
+        good_won = np.fromiter((winner == "good" for winner, _ in batch), dtype=bool, count=len(batch))
+        ratings = np.asarray(self.ratings, dtype=np.float64)
+        games = np.asarray(self.games, dtype=np.int64)
+        player = np.asarray(players, dtype=np.int64)
+        is_good = np.asarray(good, dtype=bool)
+        match_wave = np.asarray(waves, dtype=np.int64)
+        # Matches and seats grouped by wave; ``local`` numbers the matches within their wave.
+        edges = np.arange(int(match_wave.max()) + 2)
+        match_order = np.argsort(match_wave, kind="stable")
+        match_bounds = np.searchsorted(match_wave[match_order], edges)
+        local = np.empty(len(batch), dtype=np.int64)
+        local[match_order] = np.arange(len(batch)) - match_bounds[match_wave[match_order]]
+        seat_wave = match_wave[match]
+        seat_order = np.argsort(seat_wave, kind="stable")
+        seat_bounds = np.searchsorted(seat_wave[seat_order], edges)
+        k, k_new = settings.RATING_K, settings.RATING_K_PROVISIONAL
+        for wave in range(len(edges) - 1):
+            rows = seat_order[seat_bounds[wave]:seat_bounds[wave + 1]]
+            if not len(rows):
+                continue
+            in_wave = match_order[match_bounds[wave]:match_bounds[wave + 1]]
+            who = player[rows]
+            side = is_good[rows]
+            mine = local[match[rows]]
+            # Team means per (match, side): bucket = 2 * match + good.
+            size = 2 * len(in_wave)
+            bucket = mine * 2 + side
+            totals = np.bincount(bucket, weights=ratings[who], minlength=size)
+            counts = np.bincount(bucket, minlength=size)
+            means = np.where(counts > 0, totals / np.maximum(counts, 1), settings.RATING_INITIAL)
+            e_good = 1.0 / (1.0 + 10.0 ** ((means[0::2] + settings.RATING_EVIL_ADVANTAGE - means[1::2]) / 400.0))
+            expected = np.where(side, e_good[mine], 1.0 - e_good[mine])
+            score = (side == good_won[in_wave][mine]).astype(np.float64)
+            factor = np.where(games[who] < settings.RATING_PROVISIONAL_GAMES, k_new, k)
+            ratings[who] += factor * (score - expected)
+            games[who] += 1
+        self.ratings = ratings.tolist()
+        self.games = games.tolist()
+
+    def result(self) -> Dict[str, Rating]:
+        return {uid: (self.ratings[s], self.games[s]) for uid, s in self.index.items()}
+
+
+def recompute(matches: Iterable[MatchRecord], batch_size: int = 10000) -> Dict[str, Rating]:
+    """Ratings after replaying *matches* (oldest first) from scratch."""
+    replay = Replay()
+    batch: List[MatchRecord] = []
+    for record in matches:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            replay.feed(batch)
+            batch = []
+    if batch:
+        replay.feed(batch)
+    return replay.result()
+
+
+async def recompute_all(batch_size: int = 10000) -> Tuple[int, int]:
+    """Rewrite every user's rating from the stored matches; return (matches, players).
+
+    Meant for an offline run: games that finish while it runs are overwritten.
+    """
+    from tortoise import Tortoise
+
+    from .db import WRITER
+    from .models import Match
+
+    replay = Replay()
+    last_id = 0
+    while True:
+        rows: List[Any] = await (
+            Match.filter(id__gt=last_id).order_by("id").limit(batch_size).values_list("id", "winner", "players")
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        replay.feed([(winner, [(p["user_id"], p["team"]) for p in seats]) for _, winner, seats in rows])
+    conn = Tortoise.get_connection(WRITER)
+    await conn.execute_query("UPDATE users SET rating = ?, rated_games = 0", [settings.RATING_INITIAL])
+    result = replay.result()
+    await conn.execute_many(
+        "UPDATE users SET rating = ?, rated_games = ? WHERE id = ?",
+        [[rating, games, uid] for uid, (rating, games) in result.items()],
+    )
+    return replay.matches, len(result)
+
+
+__all__ = [
+    "Rating",
+    "MatchRecord",
+    "k_factor",
+    "expected_good",
+    "update",
+    "Replay",
+    "recompute",
+    "recompute_all",
+]
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Recompute all skill ratings from match history.")
+    parser.add_argument("--db", default=settings.DB_PATH, help="SQLite database file")
+    parser.add_argument("--batch", type=int, default=10000, help="matches replayed per batch")
+    args = parser.parse_args()
+
+    async def main() -> None:
+        from tortoise import Tortoise
+
+        from .db import build_tortoise_config, upgrade_schema
+
+        upgrade_schema(args.db)
+        await Tortoise.init(config=build_tortoise_config(args.db, readers=0))
+        await Tortoise.generate_schemas()
+        try:
+            start = time.perf_counter()
+            matches, players = await recompute_all(args.batch)
+            print(f"replayed {matches} matches for {players} players in {time.perf_counter() - start:.2f}s"
+                  f" ({'numpy' if np is not None else 'pure Python'})")
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(main())
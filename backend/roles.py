@@ -0,0 +1,112 @@
+"""Role definitions and the per-game visibility matrix.
+
+Roles are data. Each role's team and its night knowledge are read once from
+``frontend/game-details.json``, the same file the web client builds its role
+cards from. A role's ``knows`` maps an info key to a selector. The info key
+is the field name in the ``info`` message. A selector is either
+``{"roles": [...]}`` or ``{"team": "Evil", "except": [...]}``. Adding a role
+therefore only needs a new entry in that file (plus a place in the deck).
+
+When roles are dealt, :func:`compile_visibility` turns those rules into one
+bitmask per (seat, info key) over the seating order. "What does this player
+know" is asked on every reconnect, and answering it is then a dictionary
+lookup plus decoding at most ten bits. It no longer needs a scan of the
+table per rule.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
+
+DETAILS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "game-details.json"
+)
+
+
+class Role:
+    """One role: its team and what it sees at night (info key -> role names)."""
+
+    __slots__ = ("name", "team", "knows")
+
+    def __init__(self, name: str, team: str, knows: Dict[str, FrozenSet[str]]) -> None:
+        self.name = name
+        self.team = team
+        self.knows = knows
+
+
+def load_roles(path: str = DETAILS_PATH) -> Dict[str, Role]:
+    """Parse the role table of *path*, resolving every ``knows`` selector to role names."""
+    with open(path, encoding="utf-8") as fh:
+        specs = json.load(fh)["roles"]
+    teams = {name: spec["team"] for name, spec in specs.items()}
+    roles: Dict[str, Role] = {}
+    for name, spec in specs.items():
+        knows: Dict[str, FrozenSet[str]] = {}
+        for key, selector in spec.get("knows", {}).items():
+            if "roles" in selector:
+                seen = set(selector["roles"])
+            else:
+                seen = {role for role, team in teams.items() if team == selector["team"]}
+            seen -= set(selector.get("except", ()))
+            unknown = seen - teams.keys()
+            if unknown:
+                raise ValueError(f"{path}: {name!r} knows unknown roles {sorted(unknown)}")
+            knows[key] = frozenset(seen)
+        roles[name] = Role(name, spec["team"], knows)
+    return roles
+
+
+ROLES: Dict[str, Role] = load_roles()
+
+
+def team_roles(team: str) -> FrozenSet[str]:
+    return frozenset(name for name, role in ROLES.items() if role.team == team)
+
+
+# -----------------------------
+# Visibility matrix
+# -----------------------------
+
+
+class Visibility:
+    """Night knowledge of one dealt table as bitmasks over the seating order."""
+
+    __slots__ = ("names", "masks")
+
+    def __init__(self, names: Tuple[str, ...], masks: Dict[str, Tuple[Tuple[str, int], ...]]) -> None:
+        self.names = names
+        # user_id -> ((info key, mask of seats seen), ...); players who learn nothing are absent.
+        self.masks = masks
+
+    def info(self, user_id: str) -> Dict[str, List[str]]:
+        """Names *user_id* learnt at night, per info key (empty if nothing)."""
+        names = self.names
+        return {
+            key: [name for i, name in enumerate(names) if mask >> i & 1]
+            for key, mask in self.masks.get(user_id, ())
+        }
+
+
+def compile_visibility(players: Iterable[Any]) -> Visibility:
+    """Build the matrix for *players* (``user_id``/``name``/``role``) in seating order."""
+    seats = list(players)
+    by_role: Dict[str, int] = {}
+    for i, p in enumerate(seats):
+        by_role[p.role] = by_role.get(p.role, 0) | 1 << i
+    masks: Dict[str, Tuple[Tuple[str, int], ...]] = {}
+    for p in seats:
+        role = ROLES.get(p.role)
+        if role is None or not role.knows:
+            continue
+        rows = []
+        for key, seen in role.knows.items():
+            mask = 0
+            for name in seen:
+                mask |= by_role.get(name, 0)
+            rows.append((key, mask))
+        masks[p.user_id] = tuple(rows)
+    return Visibility(tuple(p.name for p in seats), masks)
+
+
+__all__ = ["DETAILS_PATH", "Role", "ROLES", "load_roles", "team_roles", "Visibility", "compile_visibility"]
@@ -1,58 +1,94 @@
 from __future__ import annotations
 
-import asyncio
-from typing import Dict, List, Optional, Set
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
 
 from fastapi import HTTPException, WebSocket
 
+from . import metrics, settings
 from .constants import EVIL_ROLES
+from .engine import GameConfig, GameState, Seat, remove_seat
 from .schemas import Player, RoomConfig, RoomState
+from .spectators import SpectatorFeed
 
 # NOTE: ``Room`` deliberately lives in its own module to avoid circular
 # imports between game logic, routers, and utility helpers.
 
 
-class Room:
-    """Encapsulates runtime state and active websocket connections for a lobby / game."""
+def dumps(payload: dict) -> str:
+    """Serialise *payload* the way ``WebSocket.send_json`` does.
 
-    def __init__(self, room_id: str, host_player: Player, password: Optional[str] = None):
+    ASCII-only output means ``len()`` of the result is its size in bytes,
+    which keeps the broadcast byte metrics free.
+    """
+    return json.dumps(payload, separators=(",", ":"))
+
+
+class RoomPlayer(Seat):
+    """Runtime record of one seat at a live table.
+
+    Slotted like the rest of the in-memory state; the pydantic
+    :class:`backend.schemas.Player` is only built when a snapshot is
+    serialised for clients.
+    """
+
+    __slots__ = ("wins", "alive", "bot")
+
+    def __init__(self, user_id: str, name: str, wins: int = 0, ready: bool = False, bot: bool = False) -> None:
+        super().__init__(user_id, name, None, ready)
+        # Aggregate wins across all games (good + evil)
+        self.wins = wins
+        self.alive = True  # placeholder for potential future mechanics
+        # Server-side bot seat (see ``backend.bots``); never has a websocket.
+        self.bot = bot
+
+    def to_schema(self, show_role: bool) -> Player:
+        return Player(
+            user_id=self.user_id,
+            name=self.name,
+            ready=self.ready,
+            role=self.role if show_role else None,
+            wins=self.wins,
+            alive=self.alive,
+            bot=self.bot,
+        )
+
+
+class Room(GameState):
+    """Encapsulates runtime state and active websocket connections for a lobby / game.
+
+    The rule state (players, phase, votes, ...) comes from
+    :class:`backend.engine.GameState`; this class adds everything that only
+    matters to the networked server. Both are slotted so thousands of idle
+    rooms stay cheap; pydantic models are only built in :meth:`broadcast_state`.
+    """
+
+    __slots__ = ("room_id", "connections", "stats_recorded", "password", "disconnected_players", "seq", "backlog",
+                 "spectators")
+
+    def __init__(self, room_id: str, host_player: RoomPlayer, password: Optional[str] = None):
+        super().__init__(host_player.user_id, {host_player.user_id: host_player}, GameConfig())
         self.room_id = room_id
-        self.host_id = host_player.user_id
-        self.players: Dict[str, Player] = {host_player.user_id: host_player}
-        self.config = RoomConfig()  # default config
-        self.phase = "lobby"
-        self.quest_history: List[dict] = []
-        self.current_leader: Optional[str] = None
-        self.consecutive_rejections: int = 0
         # active websocket connections: user_id -> websocket
         self.connections: Dict[str, WebSocket] = {}
-        # Game progression fields
-        self.round_number: int = 0
-        self.good_wins: int = 0
-        self.evil_wins: int = 0
-        self.subphase: Optional[str] = None
-        self.current_team: List[str] = []
-        self.votes: Dict[str, bool] = {}
-        self.winner: Optional[str] = None
-        self.submissions: Dict[str, str] = {}
-        self.proposal_leader: Optional[str] = None
-        # Assassination phase voting data
-        self.assassin_candidates: List[str] = []
-        self.assassin_votes: Dict[str, str] = {}
         # Flag to ensure we only write stats once per finished game
         self.stats_recorded: bool = False
         # Optional lobby password (plain-text for now; could be hashed in future)
         self.password: Optional[str] = password
 
-        # --- Lady of the Lake runtime state --- #
-        self.lady_holder: Optional[str] = None  # user_id of the player currently holding the token
-        self.lady_history: List[str] = []  # track all previous holders to enforce uniqueness
-
         # Track temporarily disconnected players (only relevant once game has started)
         self.disconnected_players: Set[str] = set()
 
-        # Task created when the room becomes empty; used to prune after a delay
-        self.cleanup_task: Optional[asyncio.Task] = None
+        # Outbound events, numbered, so reconnecting clients can catch up
+        # (see :meth:`record` / :meth:`replay`).
+        # The deque is created on first use so idle lobbies stay small.
+        self.seq = 0
+        self.backlog: Optional[Deque[Tuple[int, Optional[str], str]]] = None
+
+        # Viewers of the shared public view (see ``backend.spectators``);
+        # ``None`` while nobody is watching.
+        self.spectators: Optional[SpectatorFeed] = None
 
     # ---------------------------------------------------------------------
     # Helper utilities
@@ -68,21 +104,14 @@ class Room:
 
     # -------------------- Player management -------------------- #
 
-    def add_player(self, player: Player) -> None:
+    def add_player(self, player: RoomPlayer) -> None:
         if self.phase != "lobby":
             raise HTTPException(status_code=400, detail="Game already started")
         self.players[player.user_id] = player
 
     def remove_player(self, user_id: str) -> None:
-        self.players.pop(user_id, None)
+        remove_seat(self, user_id)
         self.connections.pop(user_id, None)
-        # Transfer host if host leaves
-        if user_id == self.host_id and self.players:
-            self.host_id = next(iter(self.players))
-
-    def all_ready(self) -> bool:
-        """Every player has toggled *ready* and there are at least 5 players."""
-        return all(p.ready for p in self.players.values()) and len(self.players) >= 5
 
     # -------------------- Leader rotation helper -------------------- #
 
@@ -118,8 +147,8 @@ class Room:
 
     # -------------------- Broadcasting helpers -------------------- #
 
-    async def broadcast_state(self) -> None:
-        """Send the *entire* room state snapshot to all connected clients."""
+    def _public_state(self) -> Dict[str, Any]:
+        """Snapshot with every role hidden until the game is over."""
         # Compute visible evil player list for assassination phase (now includes Oberon by name)
         evil_players: List[str] = []
         if self.phase == "assassination":
@@ -127,49 +156,122 @@ class Room:
                 if p.role in EVIL_ROLES:
                     evil_players.append(p.name)
 
-        # Personalise the state so that only the recipient sees their own role until the game is over.
+        return RoomState(
+            room_id=self.room_id,
+            host_id=self.host_id,
+            players=[p.to_schema(show_role=self.phase == "finished") for p in self.players.values()],
+            phase=self.phase,
+            quest_history=self.quest_history,
+            current_leader=self.current_leader,
+            consecutive_rejections=self.consecutive_rejections,
+            config=RoomConfig.model_validate(self.config, from_attributes=True),
+            round_number=self.round_number,
+            good_wins=self.good_wins,
+            evil_wins=self.evil_wins,
+            subphase=self.subphase,
+            current_team=self.current_team,
+            votes=self.votes,
+            winner=self.winner,
+            submissions=dict.fromkeys(self.submissions, True),
+            proposal_leader=self.proposal_leader,
+            round_leaders=self._compute_round_leaders(),
+            assassin_candidates=self.assassin_candidates,
+            evil_players=evil_players,
+            assassin_votes=self.assassin_votes,
+            lady_holder=self.lady_holder,
+            lady_history=self.lady_history,
+            lady_after_rounds=self.config.lady_after_rounds,
+        ).model_dump()
+
+    def _state_text(self, public: Dict[str, Any], seat_index: Dict[str, int], user_id: str) -> str:
+        """Serialise *public* for *user_id*, revealing only their own role."""
+        state_payload = public
+        idx = seat_index.get(user_id)
+        if self.phase != "finished" and idx is not None and self.players[user_id].role is not None:
+            players_view = list(public["players"])
+            players_view[idx] = {**players_view[idx], "role": self.players[user_id].role}
+            state_payload = {**public, "players": players_view}
+        # ``seq`` tells the client which recorded events this snapshot already covers.
+        return dumps({"type": "state", "seq": self.seq, "data": state_payload})
+
+    async def broadcast_state(self) -> None:
+        """Send the *entire* room state snapshot to all connected clients."""
+        start = metrics.now()
+        sent_bytes = 0
+        recipients = 0
+        # Build the public snapshot once; only the recipient's own seat differs.
+        public = self._public_state()
+        seat_index = {uid: i for i, uid in enumerate(self.players)}
+
         for uid, ws in list(self.connections.items()):
-            players_view: List[Player] = []
-            for p in self.players.values():
-                # Deep-copy to avoid mutating the canonical Player objects
-                p_copy: Player = p.copy(deep=True)
-                if self.phase != "finished" and p.user_id != uid:
-                    # Hide everyone else's role while the game is still in progress
-                    p_copy.role = None
-                players_view.append(p_copy)
-
-            state_payload = RoomState(
-                room_id=self.room_id,
-                host_id=self.host_id,
-                players=players_view,
-                phase=self.phase,
-                quest_history=self.quest_history,
-                current_leader=self.current_leader,
-                consecutive_rejections=self.consecutive_rejections,
-                config=self.config,
-                round_number=self.round_number,
-                good_wins=self.good_wins,
-                evil_wins=self.evil_wins,
-                subphase=self.subphase,
-                current_team=self.current_team,
-                votes=self.votes,
-                winner=self.winner,
-                submissions=self.submissions,
-                proposal_leader=self.proposal_leader,
-                round_leaders=self._compute_round_leaders(),
-                assassin_candidates=self.assassin_candidates,
-                evil_players=evil_players,
-                assassin_votes=self.assassin_votes,
-                lady_holder=self.lady_holder,
-                lady_history=self.lady_history,
-                lady_after_rounds=self.config.lady_after_rounds,
-            ).model_dump()
-
-            await ws.send_json({"type": "state", "data": state_payload})
+            text = self._state_text(public, seat_index, uid)
+            sent_bytes += len(text)
+            recipients += 1
+            try:
+                await ws.send_text(text)
+            except Exception:
+                pass  # a dead socket; its own receive loop pauses the seat
+
+        metrics.BROADCAST_SECONDS.observe(metrics.now() - start, "room_state")
+        metrics.BROADCAST_BYTES.observe(sent_bytes, "room_state")
+        metrics.BROADCAST_RECIPIENTS.inc("room_state", amount=recipients)
+
+        # Spectators share one serialisation of the masked view, sent off the players' path.
+        if self.spectators is not None:
+            self.spectators.publish(self._spectator_text(public), state=True)
+
+    def _spectator_text(self, public: Dict[str, Any]) -> str:
+        return dumps({"type": "state", "seq": self.seq, "data": public})
+
+    def spectator_state_text(self) -> str:
+        """Current snapshot as spectators see it: every hidden role stays hidden."""
+        return self._spectator_text(self._public_state())
+
+    async def send_state(self, user_id: str) -> None:
+        """Send the state snapshot to *user_id* only (used on reconnect)."""
+        ws = self.connections.get(user_id)
+        if ws is None:
+            return
+        seat_index = {uid: i for i, uid in enumerate(self.players)}
+        await ws.send_text(self._state_text(self._public_state(), seat_index, user_id))
+
+    # -------------------- Event backlog -------------------- #
+
+    def record(self, payload: dict, to: Optional[str] = None) -> str:
+        """Stamp *payload* with the next sequence number, keep it for replay and return its text.
+
+        *to* limits a private event to one recipient; ``None`` means everyone.
+        """
+        self.seq += 1
+        text = dumps({**payload, "seq": self.seq})
+        if self.backlog is None:
+            self.backlog = deque(maxlen=settings.ROOM_EVENT_BACKLOG)
+        self.backlog.append((self.seq, to, text))
+        return text
+
+    def replay(self, user_id: str, since: int) -> Optional[List[str]]:
+        """Events after *since* visible to *user_id*, or ``None`` if the backlog no longer covers the gap."""
+        if since == self.seq:
+            return []
+        if since > self.seq or not self.backlog or since < self.backlog[0][0] - 1:
+            return None
+        return [text for seq, to, text in self.backlog if seq > since and to in (None, user_id)]
 
     async def broadcast(self, payload: dict) -> None:
         """Broadcast *payload* to every active websocket connection in the room."""
-        for ws in list(self.connections.values()):
-            await ws.send_json(payload)
+        start = metrics.now()
+        text = self.record(payload)
+        targets = list(self.connections.values())
+        for ws in targets:
+            try:
+                await ws.send_text(text)
+            except Exception:
+                pass  # a dead socket; its own receive loop pauses the seat
+        if self.spectators is not None:
+            self.spectators.publish(text)
+        metrics.BROADCAST_SECONDS.observe(metrics.now() - start, "room_event")
+        metrics.BROADCAST_BYTES.observe(len(text) * len(targets), "room_event")
+        metrics.BROADCAST_RECIPIENTS.inc("room_event", amount=len(targets))
+
 
-__all__ = ["Room"] 
\ No newline at end of file
+__all__ = ["Room", "RoomPlayer", "dumps"] 
\ No newline at end of file
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .. import governor, memory
+from ..auth_utils import require_admin
+from ..logs import LOG, parse_level
+from ..profiling import PROFILER
+from ..schemas import (
+    LoggingStatus,
+    LoggingUpdate,
+    MemoryReport,
+    ObjectCount,
+    ProfilingStatus,
+    ProfilingUpdate,
+    ResourceUsage,
+    TracemallocDiff,
+    TracemallocSnapshot,
+    TracemallocStatus,
+)
+
+# How tracemalloc groups allocation sites.
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiling", response_model=ProfilingStatus)
+async def get_profiling():
+    return ProfilingStatus(**PROFILER.status())
+
+
+@router.put("/profiling", response_model=ProfilingStatus)
+async def update_profiling(req: ProfilingUpdate):
+    PROFILER.configure(rate=req.rate, max_files=req.max_files)
+    return ProfilingStatus(**PROFILER.status())
+
+
+@router.get("/logging", response_model=LoggingStatus)
+async def get_logging():
+    return LoggingStatus(**LOG.status())
+
+
+@router.put("/logging", response_model=LoggingStatus)
+async def update_logging(req: LoggingUpdate):
+    LOG.configure(
+        level=parse_level(req.level) if req.level is not None else None,
+        sample_rates=req.sample_rates,
+    )
+    return LoggingStatus(**LOG.status())
+
+
+@router.get("/usage", response_model=ResourceUsage)
+async def get_usage():
+    """Current rooms, games, connections and loop lag against the governor's limits."""
+    return ResourceUsage(**governor.usage())
+
+
+# -----------------------------
+# Memory
+# -----------------------------
+
+
+@router.get("/memory", response_model=MemoryReport)
+async def get_memory(top: int = Query(20, ge=0, le=1000)):
+    """State sizes, estimated bytes per room (largest *top*) and rooms nothing will remove."""
+    return MemoryReport(**await memory.report(top))
+
+
+@router.get("/memory/objects", response_model=List[ObjectCount])
+async def get_object_counts(top: int = Query(30, ge=1, le=1000)):
+    """Objects tracked by the garbage collector by type; walks the whole heap."""
+    return [ObjectCount(**row) for row in memory.object_counts(top)]
+
+
+@router.get("/memory/tracemalloc", response_model=TracemallocStatus)
+async def get_tracemalloc():
+    return TracemallocStatus(**memory.tracing_status())
+
+
+@router.put("/memory/tracemalloc", response_model=TracemallocStatus)
+async def start_tracemalloc(frames: int = Query(1, ge=1, le=50)):
+    memory.start_tracing(frames)
+    return TracemallocStatus(**memory.tracing_status())
+
+
+@router.delete("/memory/tracemalloc", response_model=TracemallocStatus)
+async def stop_tracemalloc():
+    memory.stop_tracing()
+    return TracemallocStatus(**memory.tracing_status())
+
+
+@router.post("/memory/tracemalloc/snapshots", response_model=TracemallocSnapshot)
+async def take_tracemalloc_snapshot(top: int = Query(20, ge=0, le=1000), group_by: GroupBy = "lineno"):
+    try:
+        return TracemallocSnapshot(**memory.take_snapshot(top, group_by))
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="tracemalloc is not running – start it first")
+
+
+@router.get("/memory/tracemalloc/diff", response_model=TracemallocDiff)
+async def diff_tracemalloc_snapshots(
+    base: int,
+    against: Optional[int] = None,
+    top: int = Query(20, ge=0, le=1000),
+    group_by: GroupBy = "lineno",
+):
+    """Allocation sites that grew most between two snapshots (*against* defaults to the newest)."""
+    try:
+        return TracemallocDiff(**memory.diff(base, against, top, group_by))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
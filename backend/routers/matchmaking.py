@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+
+from .. import governor, matchmaking, settings
+from ..auth_utils import get_current_user
+from ..models import User
+from ..schemas import MatchmakingRequest, MatchmakingStatus
+from ..state import rooms
+
+router = APIRouter(prefix="/matchmaking", tags=["matchmaking"])
+
+
+@router.post("", response_model=MatchmakingStatus)
+async def join_queue(
+    req: MatchmakingRequest = Body(default=MatchmakingRequest()),
+    current_user: User = Depends(get_current_user),
+):
+    """Queue for a table with *req*'s preferences (re-queueing replaces the earlier ticket)."""
+    user_id = str(current_user.id)
+    for room in rooms.values():
+        if user_id in room.players and room.phase != "finished":
+            raise HTTPException(status_code=409, detail="You are already seated in a room.")
+    if settings.MATCH_QUEUE_MAX and matchmaking.queued() >= settings.MATCH_QUEUE_MAX:
+        raise HTTPException(status_code=503, detail="The matchmaking queue is full – please try again in a moment.",
+                            headers=governor.retry_headers())
+    matchmaking.enqueue(
+        user_id,
+        current_user.display_name,
+        current_user.rating,
+        matchmaking.pool_key(req.players, req.morgana, req.percival, req.oberon, req.lady_enabled),
+        wins=current_user.good_wins + current_user.evil_wins,
+    )
+    return MatchmakingStatus(**matchmaking.status(user_id))
+
+
+@router.get("", response_model=MatchmakingStatus)
+async def queue_status(current_user: User = Depends(get_current_user)):
+    return MatchmakingStatus(**matchmaking.status(str(current_user.id)))
+
+
+@router.delete("", response_model=MatchmakingStatus)
+async def leave_queue(current_user: User = Depends(get_current_user)):
+    matchmaking.dequeue(str(current_user.id))
+    return MatchmakingStatus(**matchmaking.status(str(current_user.id)))
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+
+from .. import metrics
+from ..auth_utils import require_admin
+
+router = APIRouter(prefix="", tags=["metrics"])
+
+
+@router.get("/metrics", dependencies=[Depends(require_admin)], include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
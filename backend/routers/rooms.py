@@ -6,14 +6,19 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Body, Depends, Header, HTTPException
 
+from .. import governor, matchmaking
 from ..auth_utils import get_current_user
+from ..bots import MAX_PLAYERS, new_bot
+from ..game_logic import schedule_room_timers
 from ..lobby import broadcast_lobbies
-from ..room import Room
+from ..logs import LOG
+from ..room import Room, RoomPlayer
 from ..schemas import (
+    AddBotsRequest,
+    AddBotsResponse,
     CreateRoomRequest,
     JoinRoomRequest,
     LobbySummary,
-    Player,
     RoomResponse,
 )
 from ..state import rooms
@@ -30,15 +35,20 @@ async def create_room(
     for existing in rooms.values():
         if existing.host_id == str(current_user.id) and existing.phase == "lobby":
             raise HTTPException(status_code=400, detail="You already have an active lobby – reconnect to it instead.")
+    governor.check_room_creation(str(current_user.id))
+    matchmaking.dequeue(str(current_user.id))
 
     room_id = str(uuid.uuid4())
-    host_player = Player(
+    host_player = RoomPlayer(
         user_id=str(current_user.id),
         name=current_user.display_name,
         wins=current_user.good_wins + current_user.evil_wins,
     )
     room = Room(room_id, host_player, password=req.password)
     rooms[room_id] = room
+    LOG.info("room_created", room_id=room_id, user_id=host_player.user_id, private=req.password is not None)
+    # Dropped again if the host never connects.
+    schedule_room_timers(room)
     await broadcast_lobbies()
     return RoomResponse(room_id=room_id, user_id=str(current_user.id))
 
@@ -57,16 +67,40 @@ async def join_room(
         return RoomResponse(room_id=room_id, user_id=user_id)
     if user_id != room.host_id and not room.check_password(req.password):
         raise HTTPException(status_code=403, detail="Incorrect or missing room password")
-    player = Player(
+    player = RoomPlayer(
         user_id=user_id,
         name=current_user.display_name,
         wins=current_user.good_wins + current_user.evil_wins,
     )
     room.add_player(player)
+    matchmaking.dequeue(user_id)
+    LOG.info("player_joined", room_id=room_id, user_id=user_id, players=len(room.players))
     await room.broadcast_state()
     return RoomResponse(room_id=room_id, user_id=user_id)
 
 
+@router.post("/rooms/{room_id}/bots", response_model=AddBotsResponse)
+async def add_bots(
+    room_id: str,
+    req: AddBotsRequest = Body(default=AddBotsRequest()),
+    current_user: User = Depends(get_current_user),
+):
+    room = rooms.get(room_id)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.host_id != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Only the host can add bots")
+    if len(room.players) + req.count > MAX_PLAYERS:
+        raise HTTPException(status_code=400, detail=f"A table holds at most {MAX_PLAYERS} players")
+    bot_ids: List[str] = []
+    for _ in range(req.count):
+        bot = new_bot(room)
+        room.add_player(bot)
+        bot_ids.append(bot.user_id)
+    await room.broadcast_state()
+    return AddBotsResponse(bot_ids=bot_ids)
+
+
 # ---------------------------------------------------------------------------
 # Lobby listing
 # ---------------------------------------------------------------------------
@@ -88,7 +122,7 @@ def _optional_user(authorization: Optional[str] = Header(default=None)) -> Optio
     except Exception:
         return None
 
-    from ..auth_utils import verify_password  # local import
+    from ..auth_utils import verify_password_async  # local import
 
     # Run DB access in a blocking portal so we remain sync
     async def _lookup() -> Optional[User]:
@@ -98,7 +132,7 @@ def _optional_user(authorization: Optional[str] = Header(default=None)) -> Optio
     # Wrapping it with "asyncio.run" causes a nested event loop and raises
     # "RuntimeError: asyncio.run() cannot be called from a running event loop".
     user = anyio.from_thread.run(_lookup)  # type: ignore[arg-type]
-    if not user or not verify_password(password, user.password_hash):
+    if not user or not anyio.from_thread.run(verify_password_async, password, user.password_hash):
         return None
     return user
 
@@ -4,7 +4,7 @@ from typing import Dict, List, cast
 
 from fastapi import APIRouter, HTTPException, status, Depends
 
-from ..auth_utils import hash_password, verify_password, get_current_user
+from ..auth_utils import hash_password_async, verify_password_async, get_current_user
 from ..models import User
 from ..schemas import (
     AuthResponse,
@@ -26,7 +26,7 @@ async def signup(req: SignupRequest):
         raise HTTPException(status_code=400, detail="Username already taken")
     user = await User.create(
         username=req.username,
-        password_hash=hash_password(req.password),
+        password_hash=await hash_password_async(req.password),
         display_name=req.display_name,
     )
     return AuthResponse(user_id=str(user.id), display_name=user.display_name)
@@ -35,7 +35,7 @@ async def signup(req: SignupRequest):
 @router.post("/login", response_model=AuthResponse)
 async def login(req: LoginRequest):
     user = await User.filter(username=req.username).first()
-    if not user or not verify_password(req.password, user.password_hash):
+    if not user or not await verify_password_async(req.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     return AuthResponse(user_id=str(user.id), display_name=user.display_name)
 
@@ -52,6 +52,8 @@ async def get_profile(current_user: User = Depends(get_current_user)):
         evil_wins=current_user.evil_wins,
         evil_losses=current_user.evil_losses,
         role_stats=cast(Dict[str, Dict[str, int]], current_user.role_stats or {}),
+        rating=round(current_user.rating, 1),
+        rated_games=current_user.rated_games,
     )
 
 
@@ -82,6 +84,8 @@ async def update_profile(req: UpdateProfileRequest, current_user: User = Depends
         evil_wins=current_user.evil_wins,
         evil_losses=current_user.evil_losses,
         role_stats=cast(Dict[str, Dict[str, int]], current_user.role_stats or {}),
+        rating=round(current_user.rating, 1),
+        rated_games=current_user.rated_games,
     )
 
 
@@ -100,13 +104,16 @@ async def get_profile_by_username(username: str, current_user: User = Depends(ge
         evil_wins=user.evil_wins,
         evil_losses=user.evil_losses,
         role_stats=cast(Dict[str, Dict[str, int]], user.role_stats or {}),
+        rating=round(user.rating, 1),
+        rated_games=user.rated_games,
     )
 
 
 @router.get("/leaderboard", response_model=List[LeaderboardEntry])
 async def get_leaderboard(limit: int = 20, current_user: User = Depends(get_current_user)):
-    users = await User.all()
-    entries = [
+    # Served by the index on ``users.rating``; no full-table sort.
+    users = await User.all().order_by("-rating").limit(max(1, min(limit, 100)))
+    return [
         LeaderboardEntry(
             user_id=str(u.id),
             username=u.username,
@@ -115,8 +122,7 @@ async def get_leaderboard(limit: int = 20, current_user: User = Depends(get_curr
             total_games=u.total_games,
             good_wins=u.good_wins,
             evil_wins=u.evil_wins,
+            rating=round(u.rating, 1),
         )
         for u in users
-    ]
-    entries.sort(key=lambda e: e.wins, reverse=True)
-    return entries[:limit] 
\ No newline at end of file
+    ] 
\ No newline at end of file
@@ -1,69 +1,87 @@
 from __future__ import annotations
 
-import asyncio
 import base64
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 
-from ..auth_utils import verify_password
-from ..game_logic import handle_ws_message, send_private_info
+from .. import governor, heartbeat, metrics, spectators
+from ..channels import LOBBIES, SPECTATE_PREFIX, ChannelSocket, room_id_of
+from ..profiling import PROFILER
+from ..ratelimit import ConnectionLimiter
+from ..auth_utils import verify_password_async
+from ..game_logic import handle_ws_message, schedule_room_timers, send_private_info
 from ..lobby import broadcast_lobbies
+from ..logs import INFO, LOG
 from ..models import User
 from ..room import Room
-from ..state import lobby_connections, rooms
+from ..state import lobby_connections, mux_connections, rooms
 
 router = APIRouter(prefix="", tags=["ws"])
 
-
-@router.websocket("/lobbies_ws")
-async def lobbies_ws_endpoint(ws: WebSocket, auth: Optional[str] = Query(default=None)):
-    await ws.accept()
-    user_id: Optional[str] = None
-    if auth:
-        try:
-            decoded = base64.b64decode(auth).decode()
-            username, password = decoded.split(":", 1)
-            user = await User.filter(username=username).first()
-            if user and verify_password(password, user.password_hash):
-                user_id = str(user.id)
-        except Exception:
-            user_id = None
-    lobby_connections[ws] = user_id
-    await broadcast_lobbies()
-    try:
-        while True:
-            await ws.receive_text()
-    except WebSocketDisconnect:
-        lobby_connections.pop(ws, None)
-    except Exception:
-        lobby_connections.pop(ws, None)
+# -----------------------------
+# Authentication
+# -----------------------------
 
 
-@router.websocket("/ws/{room_id}")
-async def websocket_endpoint(ws: WebSocket, room_id: str, auth: Optional[str] = Query(None)):
-    await ws.accept()
+def _decode_auth(auth: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Split a ``base64(username:password)`` token, or return ``None`` if malformed."""
     if not auth:
-        await ws.close(code=4000)
-        return
+        return None
     try:
-        decoded = base64.b64decode(auth).decode()
-        username, password = decoded.split(":", 1)
+        username, password = base64.b64decode(auth).decode().split(":", 1)
     except Exception:
-        await ws.close(code=4000)
-        return
+        return None
+    return username, password
+
 
+async def _verify(credentials: Tuple[str, str]) -> Optional[str]:
+    """Return the user id for valid *credentials*, else ``None``."""
+    username, password = credentials
     user = await User.filter(username=username).first()
-    if not user or not verify_password(password, user.password_hash):
-        await ws.close(code=4001)
-        return
+    if not user or not await verify_password_async(password, user.password_hash):
+        return None
+    return str(user.id)
 
-    user_id = str(user.id)
-    room: Optional[Room] = rooms.get(room_id)
-    if not room or user_id not in room.players:
-        await ws.close(code=4002)
-        return
 
+# -----------------------------
+# Lobby & room sessions
+# -----------------------------
+# Shared by the single-purpose endpoints and the multiplexed one; *ws* is
+# either a real websocket or a ``ChannelSocket``.
+
+
+async def open_lobby_session(ws: Any, user_id: Optional[str]) -> None:
+    lobby_connections[ws] = user_id
+    heartbeat.ensure_started()
+    await broadcast_lobbies()
+
+
+def close_lobby_session(ws: Any) -> None:
+    lobby_connections.pop(ws, None)
+
+
+async def _replay_missed(room: Room, user_id: str, ws: Any, since: Optional[int]) -> bool:
+    """Send *user_id* the room events after sequence number *since*.
+
+    Returns *False* when the client has no position or the backlog no longer
+    covers it; the caller then falls back to a full snapshot.
+    """
+    if since is None:
+        return False
+    while since < room.seq:
+        missed = room.replay(user_id, since)
+        if missed is None:
+            return False
+        since = room.seq
+        for text in missed:
+            await ws.send_text(text)
+        metrics.REPLAYED_EVENTS.inc(amount=len(missed))
+    return since == room.seq
+
+
+async def open_room_session(room: Room, user_id: str, ws: Any, since: Optional[int]) -> None:
+    """Attach *ws* as *user_id*'s connection to *room* and bring the client up to date."""
     # Kick previous connection of same user
     prev = room.connections.get(user_id)
     if prev is not None:
@@ -73,7 +91,13 @@ async def websocket_endpoint(ws: WebSocket, room_id: str, auth: Optional[str] =
         except Exception:
             pass
 
+    # Catch up on missed events before going live so nothing arrives out of order.
+    replayed = await _replay_missed(room, user_id, ws, since)
+    metrics.RECONNECTS.inc("replay" if replayed else "snapshot")
+    LOG.info("player_connected", room_id=room.room_id, user_id=user_id, phase=room.phase,
+             since=since, replayed=replayed)
     room.connections[user_id] = ws
+    heartbeat.ensure_started()
 
     if user_id in room.disconnected_players:
         room.disconnected_players.discard(user_id)
@@ -82,45 +106,321 @@ async def websocket_endpoint(ws: WebSocket, room_id: str, auth: Optional[str] =
             "players": [room.players[pid].name for pid in room.disconnected_players],
         })
 
+    # Nothing about the game changed for the others; only this client needs the snapshot.
+    await room.send_state(user_id)
+    if not replayed:
+        await send_private_info(room, user_id)
+
+    # Someone is back: the room no longer counts as abandoned.
+    schedule_room_timers(room)
+
+
+async def close_room_session(room: Room, user_id: str, ws: Any) -> None:
+    """Detach *ws* after its client went away, pausing the game if it is running."""
+    if room.connections.get(user_id) is not ws:
+        return  # superseded by a newer connection, kicked, or the room closed
+    room.connections.pop(user_id, None)
+    LOG.info("player_disconnected", room_id=room.room_id, user_id=user_id, phase=room.phase)
+    player = room.players.get(user_id)
+    if player and room.phase == "lobby":
+        player.ready = False
+    if room.phase != "lobby":
+        room.disconnected_players.add(user_id)
+        await room.broadcast({
+            "type": "pause",
+            "players": [room.players[pid].name for pid in room.disconnected_players],
+        })
     await room.broadcast_state()
-    await send_private_info(room, user_id)
+    # Empty rooms expire through the scheduler unless someone reconnects.
+    schedule_room_timers(room)
+
+
+async def open_spectator_session(room_id: str, password: Optional[str], ws: Any) -> Optional[Room]:
+    """Attach viewer *ws* to the shared public view of *room_id*; ``None`` if refused."""
+    room = rooms.get(room_id)
+    if room is None or not room.check_password(password):
+        await ws.close(code=4002)
+        return None
+    if not await spectators.watch(room, ws):
+        return None
+    heartbeat.ensure_started()
+    return room
+
+
+async def room_message(room: Room, user_id: str, data: Any) -> None:
+    label = metrics.ws_message_label(data.get("type") if isinstance(data, dict) else None)
+    start = metrics.now()
+    if PROFILER.should_sample():
+        await PROFILER.run("ws", label, handle_ws_message, room, user_id, data)
+    else:
+        await handle_ws_message(room, user_id, data)
+    elapsed = metrics.now() - start
+    metrics.WS_MESSAGE_SECONDS.observe(elapsed, label)
+    metrics.WS_MESSAGES.inc(label)
+    if LOG.enabled(INFO):  # the hottest call site: skip building the fields when disabled
+        LOG.info("ws_message", room_id=room.room_id, user_id=user_id, type=label,
+                 duration_ms=round(elapsed * 1000.0, 3))
+
+
+# -----------------------------
+# Single-purpose endpoints (kept for older clients)
+# -----------------------------
+
+
+@router.websocket("/lobbies_ws")
+async def lobbies_ws_endpoint(ws: WebSocket, auth: Optional[str] = Query(default=None)):
+    await ws.accept()
+    if not await governor.smooth_accept(ws):
+        return
+    credentials = _decode_auth(auth)
+    user_id = await _verify(credentials) if credentials else None
+    if not await governor.admit_socket(ws, user_id):
+        return
+    await open_lobby_session(ws, user_id)
+    limiter = ConnectionLimiter("lobbies")
+    try:
+        while True:
+            # Only pongs are expected here; reading keeps the heartbeat timeout fresh.
+            text = await heartbeat.receive_text(ws, "lobbies")
+            try:
+                await limiter.admit(ws, text)
+            except ValueError:
+                pass
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        metrics.WS_ERRORS.inc("lobbies")
+    finally:
+        close_lobby_session(ws)
+        governor.release_connection(user_id)
+
 
-    if getattr(room, "cleanup_task", None) and not room.cleanup_task.done():
-        room.cleanup_task.cancel()
-        room.cleanup_task = None
+@router.websocket("/ws/{room_id}")
+async def websocket_endpoint(
+    ws: WebSocket,
+    room_id: str,
+    auth: Optional[str] = Query(None),
+    since: Optional[int] = Query(None),
+):
+    await ws.accept()
+    if not await governor.smooth_accept(ws):
+        return
+    credentials = _decode_auth(auth)
+    if credentials is None:
+        await ws.close(code=4000)
+        return
+    user_id = await _verify(credentials)
+    if user_id is None:
+        await ws.close(code=4001)
+        return
+    room: Optional[Room] = rooms.get(room_id)
+    if not room or user_id not in room.players:
+        await ws.close(code=4002)
+        return
+    # Seated players are not shed on load, only held to the hard caps.
+    if not await governor.admit_socket(ws, user_id, shed=False):
+        return
 
     try:
+        await open_room_session(room, user_id, ws, since)
+        limiter = ConnectionLimiter("room")
         while True:
-            data = await ws.receive_json()
-            await handle_ws_message(room, user_id, data)
+            data = await limiter.admit(ws, await heartbeat.receive_text(ws, "room"))
+            if data is None:
+                continue
+            await room_message(room, user_id, data)
     except WebSocketDisconnect:
-        room.connections.pop(user_id, None)
-        player = room.players.get(user_id)
-        if player and room.phase == "lobby":
-            player.ready = False
-        if room.phase != "lobby":
-            room.disconnected_players.add(user_id)
-            await room.broadcast({
-                "type": "pause",
-                "players": [room.players[pid].name for pid in room.disconnected_players],
-            })
-        await room.broadcast_state()
-        if not room.connections:
-            if room.phase == "lobby":
-                rooms.pop(room.room_id, None)
-                await broadcast_lobbies()
+        await close_room_session(room, user_id, ws)
+    except Exception:
+        metrics.WS_ERRORS.inc("room")
+        LOG.exception("ws_error", endpoint="room", room_id=room_id, user_id=user_id)
+        await close_room_session(room, user_id, ws)
+    finally:
+        governor.release_connection(user_id)
+
+
+@router.websocket("/spectate/{room_id}")
+async def spectate_endpoint(ws: WebSocket, room_id: str, password: Optional[str] = Query(None)):
+    """Read-only public view of a room; no account needed (see ``backend.spectators``)."""
+    await ws.accept()
+    if not await governor.smooth_accept(ws):
+        return
+    if not await governor.admit_socket(ws, None):
+        return
+    room = await open_spectator_session(room_id, password, ws)
+    if room is None:
+        governor.release_connection(None)
+        return
+    limiter = ConnectionLimiter("spectate")
+    try:
+        while True:
+            # Viewers only answer pings; anything else is ignored.
+            text = await heartbeat.receive_text(ws, "spectate")
+            try:
+                await limiter.admit(ws, text)
+            except ValueError:
+                pass
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        metrics.WS_ERRORS.inc("spectate")
+    finally:
+        spectators.unwatch(room, ws)
+        governor.release_connection(None)
+
+
+# -----------------------------
+# Multiplexed endpoint
+# -----------------------------
+
+
+class _MuxSession:
+    """Channels open on one ``/mux`` connection and the credentials seen on it."""
+
+    def __init__(self, ws: WebSocket, user_id: Optional[str]) -> None:
+        self.ws = ws
+        self.user_id = user_id
+        self.channels: Dict[str, ChannelSocket] = {}
+        # Room channel -> user id it was opened for.
+        self.members: Dict[str, str] = {}
+        # Spectate channel -> room being watched.
+        self.watching: Dict[str, Room] = {}
+        # Verified tokens, so resubscribing does not pay for bcrypt again.
+        self.verified: Dict[str, Optional[str]] = {}
+
+    async def user_for(self, auth: Any) -> Optional[str]:
+        if not isinstance(auth, str) or not auth:
+            return self.user_id
+        if auth not in self.verified:
+            credentials = _decode_auth(auth)
+            self.verified[auth] = await _verify(credentials) if credentials else None
+        return self.verified[auth]
+
+    async def subscribe(self, name: Any, data: Dict[str, Any]) -> None:
+        current = self.channels.get(name)
+        if current is not None and not current.closed:
+            return
+        if name == LOBBIES or room_id_of(name, SPECTATE_PREFIX) is not None:
+            # Optional feeds are shed under load; room channels never are.
+            if governor.shed():
+                await ChannelSocket(self.ws, name).close(
+                    code=governor.CLOSE_OVERLOADED, reason=governor.close_reason(),
+                )
                 return
-            if room.cleanup_task is None or room.cleanup_task.done():
-                async def _prune_after_delay(rid: str, delay: int = 300):
-                    try:
-                        await asyncio.sleep(delay)
-                        room_ref = rooms.get(rid)
-                        if room_ref and not room_ref.connections:
-                            rooms.pop(rid, None)
-                            await broadcast_lobbies()
-                    except asyncio.CancelledError:
-                        pass
-                room.cleanup_task = asyncio.create_task(_prune_after_delay(room.room_id))
-    except Exception as e:
-        print("WebSocket error", e)
-        room.connections.pop(user_id, None) 
\ No newline at end of file
+        if name == LOBBIES:
+            chan = self.channels[name] = ChannelSocket(self.ws, name)
+            metrics.MUX_SUBSCRIPTIONS.inc("lobbies")
+            await open_lobby_session(chan, await self.user_for(data.get("auth")))
+            return
+        watched = room_id_of(name, SPECTATE_PREFIX)
+        if watched is not None:
+            chan = ChannelSocket(self.ws, name)
+            password = data.get("password")
+            room = await open_spectator_session(watched, password if isinstance(password, str) else None, chan)
+            if room is not None:
+                self.channels[name] = chan
+                self.watching[name] = room
+                metrics.MUX_SUBSCRIPTIONS.inc("spectate")
+            return
+        room_id = room_id_of(name)
+        if room_id is None:
+            return
+        chan = ChannelSocket(self.ws, name)
+        user_id = await self.user_for(data.get("auth"))
+        if user_id is None:
+            await chan.close(code=4001)
+            return
+        room = rooms.get(room_id)
+        if room is None or user_id not in room.players:
+            await chan.close(code=4002)
+            return
+        since = data.get("since")
+        self.channels[name] = chan
+        self.members[name] = user_id
+        metrics.MUX_SUBSCRIPTIONS.inc("room")
+        await open_room_session(room, user_id, chan, since if isinstance(since, int) else None)
+
+    def _room_member(self, name: Any) -> Tuple[Optional[Room], Optional[str]]:
+        """Room and user behind room channel *name*, if it is still the live connection."""
+        chan = self.channels.get(name)
+        room = rooms.get(room_id_of(name) or "")
+        user_id = self.members.get(name)
+        if chan is None or room is None or user_id is None or room.connections.get(user_id) is not chan:
+            return None, None
+        return room, user_id
+
+    async def unsubscribe(self, name: Any) -> None:
+        if name == LOBBIES:
+            chan = self.channels.pop(name, None)
+            if chan is not None:
+                close_lobby_session(chan)
+                chan.closed = True
+            return
+        if name in self.watching:
+            room = self.watching.pop(name)
+            chan = self.channels.pop(name, None)
+            if chan is not None:
+                spectators.unwatch(room, chan)
+                chan.closed = True
+            return
+        room, user_id = self._room_member(name)
+        chan = self.channels.pop(name, None)
+        self.members.pop(name, None)
+        if room is not None and user_id is not None:
+            await close_room_session(room, user_id, chan)
+        if chan is not None:
+            chan.closed = True
+
+    async def dispatch(self, data: Dict[str, Any]) -> None:
+        room, user_id = self._room_member(data.get("channel"))
+        if room is not None and user_id is not None:
+            await room_message(room, user_id, data)
+
+    async def close_all(self) -> None:
+        for name in list(self.channels):
+            await self.unsubscribe(name)
+
+
+@router.websocket("/mux")
+async def mux_endpoint(ws: WebSocket, auth: Optional[str] = Query(default=None)):
+    """One connection for the lobby feed and any number of rooms (see ``backend.channels``)."""
+    await ws.accept()
+    if not await governor.smooth_accept(ws):
+        return
+    user_id: Optional[str] = None
+    if auth:
+        credentials = _decode_auth(auth)
+        user_id = await _verify(credentials) if credentials else None
+        if user_id is None:
+            await ws.close(code=4001)
+            return
+    # Carries room channels too, so only the hard caps apply here.
+    if not await governor.admit_socket(ws, user_id, shed=False):
+        return
+    session = _MuxSession(ws, user_id)
+    if auth:
+        session.verified[auth] = user_id
+    mux_connections.add(ws)
+    heartbeat.ensure_started()
+    limiter = ConnectionLimiter("mux")
+    try:
+        while True:
+            data = await limiter.admit(ws, await heartbeat.receive_text(ws, "mux"))
+            if not isinstance(data, dict):
+                continue
+            op = data.get("op")
+            if op == "subscribe":
+                await session.subscribe(data.get("channel"), data)
+            elif op == "unsubscribe":
+                await session.unsubscribe(data.get("channel"))
+            else:
+                await session.dispatch(data)
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        metrics.WS_ERRORS.inc("mux")
+        LOG.exception("ws_error", endpoint="mux", user_id=user_id)
+    finally:
+        mux_connections.discard(ws)
+        await session.close_all()
+        governor.release_connection(user_id)
@@ -0,0 +1,173 @@
+"""Single-task timer scheduler for room lifecycles and turn timeouts.
+
+Instead of one sleeping task per timer, every deadline is pushed onto one
+binary heap and a single driver task sleeps until the earliest one is due.
+Scheduling is ``O(log n)``; cancelling only flags the entry (``O(1)``) and
+the dead entries are skipped when they reach the top, or swept in bulk once
+they make up most of the heap. Timers may carry a *key*: scheduling a key
+again replaces (cancels) the previous timer with that key, which is how
+rooms keep at most one expiry / eviction / phase timer each.
+
+Callbacks run on the event loop. Coroutine callbacks are started as tasks
+so a slow one never holds up the timers behind it.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+from . import metrics
+from .logs import LOG
+
+# Sweep cancelled entries once they outnumber live ones (and the heap is not tiny).
+_COMPACT_MIN = 1024
+
+
+class Timer:
+    """Handle of one scheduled callback; ordered by deadline then insertion."""
+
+    __slots__ = ("when", "seq", "key", "kind", "callback", "args", "cancelled", "_scheduler")
+
+    def __init__(self, when: float, seq: int, key: Optional[Hashable], kind: str,
+                 callback: Callable[..., Any], args: tuple, scheduler: "Scheduler") -> None:
+        self.when = when
+        self.seq = seq
+        self.key = key
+        self.kind = kind
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def __lt__(self, other: "Timer") -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self) -> None:
+        if not self.cancelled:
+            self._scheduler._discard(self)
+
+
+class Scheduler:
+    """Heap of :class:`Timer` objects driven by one background task."""
+
+    def __init__(self) -> None:
+        self._heap: List[Timer] = []
+        self._keyed: Dict[Hashable, Timer] = {}
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    # -------------------- Public API -------------------- #
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any,
+                   key: Optional[Hashable] = None, kind: str = "timer") -> Timer:
+        """Run ``callback(*args)`` after *delay* seconds; replaces any timer with the same *key*."""
+        loop = self._ensure_running()
+        if key is not None:
+            self.cancel(key)
+        timer = Timer(loop.time() + max(0.0, delay), next(self._seq), key, kind, callback, args, self)
+        heapq.heappush(self._heap, timer)
+        if key is not None:
+            self._keyed[key] = timer
+        if self._heap[0] is timer:
+            self._wake.set()
+        return timer
+
+    def get(self, key: Hashable) -> Optional[Timer]:
+        return self._keyed.get(key)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the pending timer registered under *key*; return whether there was one."""
+        timer = self._keyed.get(key)
+        if timer is None:
+            return False
+        timer.cancel()
+        return True
+
+    def shutdown(self) -> None:
+        """Drop every pending timer and stop the driver task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        self._heap.clear()
+        self._keyed.clear()
+        self._cancelled = 0
+
+    # -------------------- Internals -------------------- #
+
+    def _ensure_running(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            # (Re)start on the current loop; benchmarks spin up several loops per process.
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        return loop
+
+    def _discard(self, timer: Timer) -> None:
+        timer.cancelled = True
+        self._cancelled += 1
+        if timer.key is not None and self._keyed.get(timer.key) is timer:
+            del self._keyed[timer.key]
+        if self._cancelled > _COMPACT_MIN and self._cancelled * 2 > len(self._heap):
+            self._heap = [t for t in self._heap if not t.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        wake = self._wake
+        while True:
+            heap = self._heap
+            while heap and heap[0].cancelled:
+                heapq.heappop(heap)
+                self._cancelled -= 1
+            wake.clear()
+            if not heap:
+                await wake.wait()
+                continue
+            delay = heap[0].when - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            timer = heapq.heappop(heap)
+            timer.cancelled = True  # fired: a late cancel() must not touch the counters
+            if timer.key is not None and self._keyed.get(timer.key) is timer:
+                del self._keyed[timer.key]
+            metrics.TIMER_LAG_SECONDS.observe(-delay, timer.kind)
+            self._fire(timer)
+
+    def _fire(self, timer: Timer) -> None:
+        metrics.TIMERS_FIRED.inc(timer.kind)
+        try:
+            result = timer.callback(*timer.args)
+        except Exception:
+            metrics.TIMER_ERRORS.inc(timer.kind)
+            LOG.exception("timer_error", kind=timer.kind)
+            return
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self._running.add(task)
+            task.add_done_callback(lambda t, kind=timer.kind: self._finished(t, kind))
+
+    def _finished(self, task: asyncio.Task, kind: str) -> None:
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            metrics.TIMER_ERRORS.inc(kind)
+            LOG.error("timer_error", kind=kind, error=repr(task.exception()))
+
+
+SCHEDULER = Scheduler()
+
+__all__ = ["Timer", "Scheduler", "SCHEDULER"]
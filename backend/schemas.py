@@ -6,7 +6,7 @@ multiple files.
 """
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 # -----------------------------
@@ -27,6 +27,9 @@ class Player(BaseModel):
     # Fields only used once the game has begun
     alive: bool = True  # placeholder for potential future mechanics
 
+    # Server-side bot seat (see ``backend.bots``); never has a websocket.
+    bot: bool = False
+
 
 class RoomConfig(BaseModel):
     """Lobby configuration toggles selected by the host."""
@@ -72,7 +75,7 @@ class RoomState(BaseModel):
     current_team: List[str] = []
     votes: Dict[str, bool] = {}
     winner: Optional[str] = None  # "good" | "evil"
-    submissions: Dict[str, str] = {}
+    submissions: Dict[str, bool] = {}  # who has played a quest card, never which card
     proposal_leader: Optional[str] = None
     round_leaders: List[Optional[str]] = []
     assassin_candidates: List[str] = []
@@ -119,6 +122,8 @@ class ProfileResponse(BaseModel):
     evil_wins: int
     evil_losses: int
     role_stats: Dict[str, Dict[str, int]]
+    rating: float = 1500.0
+    rated_games: int = 0
 
 
 class UpdateProfileRequest(BaseModel):
@@ -136,6 +141,7 @@ class LeaderboardEntry(BaseModel):
     total_games: int
     good_wins: int
     evil_wins: int
+    rating: float = 1500.0
 
 
 # ------ Lobby helpers ------ #
@@ -148,6 +154,36 @@ class JoinRoomRequest(BaseModel):
     password: Optional[str] = None
 
 
+class AddBotsRequest(BaseModel):
+    count: int = Field(default=1, ge=1, le=9)
+
+
+class AddBotsResponse(BaseModel):
+    bot_ids: List[str]
+
+
+class MatchmakingRequest(BaseModel):
+    """Preferences of a matchmaking ticket; only equivalent preferences are matched.
+
+    Role options are made legal as in the lobby (no Oberon below 7 players,
+    Morgana and Percival together) before tickets are pooled.
+    """
+
+    players: int = Field(default=7, ge=5, le=10)
+    morgana: bool = True
+    percival: bool = True
+    oberon: bool = False
+    lady_enabled: bool = True
+
+
+class MatchmakingStatus(BaseModel):
+    status: str  # queued | matched | idle
+    players: Optional[int] = None
+    waited_seconds: Optional[float] = None
+    pool_size: Optional[int] = None  # players queued with the same preferences
+    room_id: Optional[str] = None
+
+
 class LobbySummary(BaseModel):
     room_id: str
     host_id: str
@@ -158,6 +194,108 @@ class LobbySummary(BaseModel):
     phase: str = "lobby"
 
 
+# ------ Admin / operations ------ #
+
+class ProfilingUpdate(BaseModel):
+    rate: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    max_files: Optional[int] = Field(default=None, ge=1)
+
+
+class ProfilingStatus(BaseModel):
+    rate: float
+    directory: str
+    max_files: int
+    samples_taken: int
+    files: List[str]
+
+
+class LoggingUpdate(BaseModel):
+    level: Optional[Literal["debug", "info", "warning", "error", "off"]] = None
+    sample_rates: Optional[Dict[str, float]] = None
+
+
+class LoggingStatus(BaseModel):
+    level: str
+    path: str
+    sample_rates: Dict[str, float]
+    queued: int
+    sampled_out: int
+    dropped: int
+
+
+class ResourceLimit(BaseModel):
+    current: float
+    limit: Optional[float] = None  # None = unlimited
+
+
+class ResourceUsage(BaseModel):
+    resources: Dict[str, ResourceLimit]
+    overloaded: bool
+    rejected: Dict[str, int]
+
+
+class RoomMemory(BaseModel):
+    room_id: str
+    phase: str
+    players: int
+    connections: int
+    disconnected: int
+    spectators: int
+    backlog: int
+    bytes: int  # estimate, see ``backend.memory.footprint``
+
+
+class RoomsMemory(BaseModel):
+    estimated_bytes: int
+    mean_bytes: int
+    by_phase: Dict[str, Dict[str, int]]
+    largest: List[RoomMemory]
+
+
+class MemoryReport(BaseModel):
+    process: Dict[str, Any]
+    state: Dict[str, int]
+    rooms: RoomsMemory
+    suspects: Dict[str, List[str]]
+
+
+class ObjectCount(BaseModel):
+    type: str
+    count: int
+    bytes: int
+
+
+class AllocationSite(BaseModel):
+    where: List[str]
+    size: int
+    count: int
+    size_diff: Optional[int] = None
+    count_diff: Optional[int] = None
+
+
+class TracemallocStatus(BaseModel):
+    tracing: bool
+    frames: int
+    traced_bytes: int
+    peak_bytes: int
+    snapshots: List[int]
+
+
+class TracemallocSnapshot(BaseModel):
+    id: int
+    taken_at: float
+    traced_bytes: int
+    top: List[AllocationSite]
+
+
+class TracemallocDiff(BaseModel):
+    base: int
+    against: int
+    seconds: float
+    size_diff: int
+    top: List[AllocationSite]
+
+
 __all__ = [
     # runtime
     "Player",
@@ -175,5 +313,24 @@ __all__ = [
     "LeaderboardEntry",
     "CreateRoomRequest",
     "JoinRoomRequest",
+    "AddBotsRequest",
+    "AddBotsResponse",
+    "MatchmakingRequest",
+    "MatchmakingStatus",
     "LobbySummary",
+    # admin
+    "ProfilingUpdate",
+    "ProfilingStatus",
+    "LoggingUpdate",
+    "LoggingStatus",
+    "RoomMemory",
+    "RoomsMemory",
+    "MemoryReport",
+    "ObjectCount",
+    "AllocationSite",
+    "TracemallocStatus",
+    "TracemallocSnapshot",
+    "TracemallocDiff",
+    "ResourceLimit",
+    "ResourceUsage",
 ] 
\ No newline at end of file
@@ -0,0 +1,345 @@
+"""Runtime configuration read from ``AVALON_*`` environment variables.
+
+Every tunable knob of the server lives here so that deployments can adjust
+behaviour without code changes. Values are resolved once at import time.
+"""
+from __future__ import annotations
+
+import os
+
+# -----------------------------
+# Environment helpers
+# -----------------------------
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default)
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _env_int_list(name: str, default: list[int]) -> list[int]:
+    raw = os.environ.get(name)
+    if not raw:
+        return list(default)
+    try:
+        return [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        return list(default)
+
+
+def _env_rates(name: str, default: dict[str, tuple[float, float]]) -> dict[str, tuple[float, float]]:
+    """Parse ``"type=rate/burst,..."`` on top of *default*; malformed entries are skipped."""
+    rates = dict(default)
+    for part in os.environ.get(name, "").split(","):
+        key, _, value = part.partition("=")
+        rate, _, burst = value.partition("/")
+        try:
+            rates[key.strip()] = (float(rate), float(burst or rate))
+        except ValueError:
+            continue
+    return rates
+
+
+def _env_float_map(name: str, default: dict[str, float]) -> dict[str, float]:
+    """Parse ``"key=value,..."`` on top of *default*; malformed entries are skipped."""
+    values = dict(default)
+    for part in os.environ.get(name, "").split(","):
+        key, _, value = part.partition("=")
+        try:
+            values[key.strip()] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+# -----------------------------
+# Database (SQLite)
+# -----------------------------
+
+# Path of the SQLite database file.
+DB_PATH: str = _env_str("AVALON_DB_PATH", "database.db")
+# Number of read-only connections queries are spread across (0 = single connection).
+DB_READERS: int = max(0, _env_int("AVALON_DB_READERS", 4))
+# PRAGMA synchronous level; NORMAL is durable enough under WAL.
+DB_SYNCHRONOUS: str = _env_str("AVALON_DB_SYNCHRONOUS", "NORMAL")
+# Milliseconds a connection waits on a locked database before failing.
+DB_BUSY_TIMEOUT_MS: int = _env_int("AVALON_DB_BUSY_TIMEOUT_MS", 5000)
+# Page cache per connection in KiB (applied as a negative ``cache_size``).
+DB_CACHE_KB: int = _env_int("AVALON_DB_CACHE_KB", 16384)
+# Memory-mapped I/O window in bytes.
+DB_MMAP_BYTES: int = _env_int("AVALON_DB_MMAP_BYTES", 64 * 1024 * 1024)
+
+# -----------------------------
+# Images
+# -----------------------------
+
+# Widths (px) rendered for every role portrait.
+IMAGE_WIDTHS: list[int] = _env_int_list("AVALON_IMAGE_WIDTHS", [160, 320, 640, 1024])
+# WebP encoder quality (0-100).
+IMAGE_WEBP_QUALITY: int = _env_int("AVALON_IMAGE_WEBP_QUALITY", 80)
+# Sub-directory of ``images/`` that holds the generated variants.
+IMAGE_VARIANTS_SUBDIR: str = _env_str("AVALON_IMAGE_VARIANTS_SUBDIR", "_variants")
+
+# -----------------------------
+# Admin / observability
+# -----------------------------
+
+# Bearer token for admin endpoints (/metrics, /admin/*). When unset those
+# endpoints only answer requests from the loopback interface.
+ADMIN_TOKEN: str = _env_str("AVALON_ADMIN_TOKEN", "")
+
+# Fraction (0..1) of websocket messages and HTTP requests run under cProfile.
+# 0 disables profiling; it can also be changed at runtime via /admin/profiling.
+PROFILE_SAMPLE_RATE: float = _env_float("AVALON_PROFILE_SAMPLE_RATE", 0.0)
+# Directory that receives ``.prof`` files.
+PROFILE_DIR: str = _env_str("AVALON_PROFILE_DIR", "profiles")
+# Oldest profiles are deleted beyond this many files.
+PROFILE_MAX_FILES: int = _env_int("AVALON_PROFILE_MAX_FILES", 200)
+
+# Lowest level written to the structured log: debug, info, warning, error or off.
+LOG_LEVEL: str = _env_str("AVALON_LOG_LEVEL", "info")
+# JSON-lines log file; empty writes to stderr (no rotation).
+LOG_PATH: str = _env_str("AVALON_LOG_PATH", "")
+# The log file is rotated before a batch would grow it past this size (0 = never).
+LOG_MAX_BYTES: int = max(0, _env_int("AVALON_LOG_MAX_BYTES", 50 * 1024 * 1024))
+# Rotated files kept next to the live one (``avalon.log.1`` is the newest).
+LOG_BACKUPS: int = max(0, _env_int("AVALON_LOG_BACKUPS", 5))
+# Fraction of records kept per high-volume event, e.g.
+# ``AVALON_LOG_SAMPLE_RATES="ws_message=0.1,http_request=1"``.
+LOG_SAMPLE_RATES: dict[str, float] = _env_float_map("AVALON_LOG_SAMPLE_RATES", {
+    "ws_message": 0.01,
+    "http_request": 0.1,
+})
+# How often the writer thread drains the queue.
+LOG_FLUSH_SECONDS: float = max(0.01, _env_float("AVALON_LOG_FLUSH_SECONDS", 0.5))
+# Records formatted and written per write call.
+LOG_BATCH_SIZE: int = max(1, _env_int("AVALON_LOG_BATCH_SIZE", 512))
+# Records waiting for the writer before new ones are dropped (0 = unbounded).
+LOG_QUEUE_MAX: int = max(0, _env_int("AVALON_LOG_QUEUE_MAX", 100000))
+
+# Start tracemalloc at startup with this many frames per allocation (0 = off;
+# it can also be started later through /admin/memory/tracemalloc).
+TRACEMALLOC_FRAMES: int = max(0, _env_int("AVALON_TRACEMALLOC_FRAMES", 0))
+# tracemalloc snapshots kept for diffing; the oldest is dropped first.
+MEMORY_SNAPSHOTS_MAX: int = max(2, _env_int("AVALON_MEMORY_SNAPSHOTS_MAX", 5))
+
+# -----------------------------
+# Bot players
+# -----------------------------
+
+# Worker processes running bot searches (kept off the event loop).
+BOT_WORKERS: int = max(1, _env_int("AVALON_BOT_WORKERS", 2))
+# Wall-clock search budget per bot decision in milliseconds.
+BOT_MOVE_BUDGET_MS: int = max(10, _env_int("AVALON_BOT_MOVE_BUDGET_MS", 1000))
+# Hard cap on search iterations per decision, whatever the budget.
+BOT_MAX_ITERATIONS: int = max(1, _env_int("AVALON_BOT_MAX_ITERATIONS", 20000))
+
+# -----------------------------
+# Room lifecycle & turn timers
+# -----------------------------
+
+# Seconds an in-game room survives with nobody connected before it is dropped.
+ROOM_EMPTY_TTL_SECONDS: float = _env_float("AVALON_ROOM_EMPTY_TTL_SECONDS", 300.0)
+# Seconds an empty lobby (including one nobody ever joined) is kept for reconnects.
+LOBBY_EMPTY_TTL_SECONDS: float = _env_float("AVALON_LOBBY_EMPTY_TTL_SECONDS", 30.0)
+# Seconds a finished game stays open for the rematch button (0 = forever).
+FINISHED_ROOM_TTL_SECONDS: float = _env_float("AVALON_FINISHED_ROOM_TTL_SECONDS", 1800.0)
+# Per-phase turn limits in seconds; when one runs out the missing players get
+# a default move (see ``backend.engine.timeout_moves``). 0 disables the timer.
+PHASE_TIMEOUTS: dict[str, float] = {
+    phase: _env_float(f"AVALON_TIMEOUT_{phase.upper()}", 0.0)
+    for phase in ("proposal", "voting", "quest", "lady", "assassination")
+}
+
+# Outbound events each room keeps for replay to reconnecting clients.
+ROOM_EVENT_BACKLOG: int = max(1, _env_int("AVALON_ROOM_EVENT_BACKLOG", 256))
+
+# -----------------------------
+# Websocket heartbeats
+# -----------------------------
+
+# Seconds between server pings on every open websocket.
+HEARTBEAT_INTERVAL_SECONDS: float = max(1.0, _env_float("AVALON_HEARTBEAT_INTERVAL_SECONDS", 20.0))
+# A connection silent for this long (no pong or other frame) is closed (0 disables).
+HEARTBEAT_TIMEOUT_SECONDS: float = _env_float("AVALON_HEARTBEAT_TIMEOUT_SECONDS", 45.0)
+
+# -----------------------------
+# Websocket flood protection
+# -----------------------------
+
+# Token bucket shared by every message on one connection: sustained
+# messages per second and burst size (rate 0 disables the limit).
+WS_RATE_PER_SECOND: float = max(0.0, _env_float("AVALON_WS_RATE_PER_SECOND", 10.0))
+WS_RATE_BURST: float = max(1.0, _env_float("AVALON_WS_RATE_BURST", 20.0))
+# Extra per-type buckets, ``rate/burst``; override with
+# ``AVALON_WS_TYPE_RATES="toggle_ready=1/3,vote_team=2/4"``. Turn actions
+# over their limit are delayed rather than dropped (``ratelimit.DEFERRED_TYPES``),
+# and their limits sit well above what even scripted players send.
+WS_TYPE_RATES: dict[str, tuple[float, float]] = _env_rates("AVALON_WS_TYPE_RATES", {
+    "toggle_ready": (2.0, 4.0),
+    "set_config": (4.0, 8.0),
+    "kick": (2.0, 4.0),
+    "start_game": (1.0, 3.0),
+    "restart_game": (1.0, 3.0),
+    "reset_lobby": (1.0, 3.0),
+    "propose_team": (5.0, 10.0),
+    "vote_team": (5.0, 10.0),
+    "submit_card": (5.0, 10.0),
+    "lady_choose": (5.0, 10.0),
+    "assassination_vote": (5.0, 10.0),
+    "unknown": (2.0, 4.0),
+    # /mux channel operations
+    "subscribe": (5.0, 10.0),
+    "unsubscribe": (5.0, 10.0),
+})
+# Frames larger than this (in characters) close the connection with 1009.
+WS_MAX_FRAME_BYTES: int = max(256, _env_int("AVALON_WS_MAX_FRAME_BYTES", 4096))
+# Close a connection (code 1008) after this many throttled or deferred messages within 10 s (0 = never).
+WS_FLOOD_CLOSE_AFTER: int = max(0, _env_int("AVALON_WS_FLOOD_CLOSE_AFTER", 200))
+
+# -----------------------------
+# Resource governor
+# -----------------------------
+
+# Hard caps (0 = unlimited). Global caps answer 503 / close 1013, per-user
+# caps 429 / close 4029.
+MAX_ROOMS: int = max(0, _env_int("AVALON_MAX_ROOMS", 5000))
+MAX_ROOMS_IN_GAME: int = max(0, _env_int("AVALON_MAX_ROOMS_IN_GAME", 2000))
+MAX_ROOMS_PER_USER: int = max(0, _env_int("AVALON_MAX_ROOMS_PER_USER", 3))
+MAX_CONNECTIONS: int = max(0, _env_int("AVALON_MAX_CONNECTIONS", 20000))
+MAX_CONNECTIONS_PER_USER: int = max(0, _env_int("AVALON_MAX_CONNECTIONS_PER_USER", 8))
+# Above this event-loop lag new rooms, lobby feeds and spectators are refused (0 = never).
+MAX_LOOP_LAG_MS: float = max(0.0, _env_float("AVALON_MAX_LOOP_LAG_MS", 250.0))
+# Seconds between event-loop lag probes.
+LAG_PROBE_INTERVAL_SECONDS: float = max(0.05, _env_float("AVALON_LAG_PROBE_INTERVAL_SECONDS", 0.5))
+# New websockets accepted per second and burst (0 = unlimited); the rate
+# shrinks as loop lag approaches MAX_LOOP_LAG_MS.
+ACCEPT_RATE_PER_SECOND: float = max(0.0, _env_float("AVALON_ACCEPT_RATE_PER_SECOND", 200.0))
+ACCEPT_BURST: float = max(1.0, _env_float("AVALON_ACCEPT_BURST", 400.0))
+# Base and ceiling of the retry-after hint given to refused clients (seconds).
+RETRY_AFTER_SECONDS: float = max(0.5, _env_float("AVALON_RETRY_AFTER_SECONDS", 2.0))
+RETRY_AFTER_MAX_SECONDS: int = max(1, _env_int("AVALON_RETRY_AFTER_MAX_SECONDS", 60))
+
+# -----------------------------
+# Spectators
+# -----------------------------
+
+# Viewers allowed per room (0 disables spectating) and across the process.
+SPECTATORS_PER_ROOM: int = max(0, _env_int("AVALON_SPECTATORS_PER_ROOM", 1000))
+SPECTATORS_MAX: int = max(0, _env_int("AVALON_SPECTATORS_MAX", 10000))
+# Seconds every spectator frame is held back (stream delay; 0 = live).
+SPECTATOR_DELAY_SECONDS: float = max(0.0, _env_float("AVALON_SPECTATOR_DELAY_SECONDS", 0.0))
+
+# -----------------------------
+# Skill ratings
+# -----------------------------
+
+# Rating of a player without rated games.
+RATING_INITIAL: float = _env_float("AVALON_RATING_INITIAL", 1500.0)
+# Elo K-factor, and the larger one used while a player is still provisional.
+RATING_K: float = max(0.0, _env_float("AVALON_RATING_K", 24.0))
+RATING_K_PROVISIONAL: float = max(0.0, _env_float("AVALON_RATING_K_PROVISIONAL", 48.0))
+RATING_PROVISIONAL_GAMES: int = max(0, _env_int("AVALON_RATING_PROVISIONAL_GAMES", 10))
+# Rating points credited to the evil team when predicting a game (side imbalance).
+RATING_EVIL_ADVANTAGE: float = _env_float("AVALON_RATING_EVIL_ADVANTAGE", 0.0)
+
+# -----------------------------
+# Matchmaking
+# -----------------------------
+
+# Seconds between matcher runs while anyone is queued.
+MATCH_INTERVAL_SECONDS: float = max(0.05, _env_float("AVALON_MATCH_INTERVAL_SECONDS", 1.0))
+# Width of a rating bucket; only nearby buckets are matched together.
+MATCH_BUCKET_WIDTH: float = max(1.0, _env_float("AVALON_MATCH_BUCKET_WIDTH", 100.0))
+# The search widens by one bucket on each side per this many seconds of waiting (0 = at once).
+MATCH_WIDEN_SECONDS: float = max(0.0, _env_float("AVALON_MATCH_WIDEN_SECONDS", 15.0))
+MATCH_MAX_SPREAD_BUCKETS: int = max(0, _env_int("AVALON_MATCH_MAX_SPREAD_BUCKETS", 4))
+# Tickets are dropped after this long in the queue (0 = never).
+MATCH_MAX_WAIT_SECONDS: float = max(0.0, _env_float("AVALON_MATCH_MAX_WAIT_SECONDS", 600.0))
+# Players queued at once (0 = unlimited).
+MATCH_QUEUE_MAX: int = max(0, _env_int("AVALON_MATCH_QUEUE_MAX", 20000))
+
+__all__ = [
+    "DB_PATH",
+    "DB_READERS",
+    "DB_SYNCHRONOUS",
+    "DB_BUSY_TIMEOUT_MS",
+    "DB_CACHE_KB",
+    "DB_MMAP_BYTES",
+    "IMAGE_WIDTHS",
+    "IMAGE_WEBP_QUALITY",
+    "IMAGE_VARIANTS_SUBDIR",
+    "ADMIN_TOKEN",
+    "PROFILE_SAMPLE_RATE",
+    "PROFILE_DIR",
+    "PROFILE_MAX_FILES",
+    "LOG_LEVEL",
+    "LOG_PATH",
+    "LOG_MAX_BYTES",
+    "LOG_BACKUPS",
+    "LOG_SAMPLE_RATES",
+    "LOG_FLUSH_SECONDS",
+    "LOG_BATCH_SIZE",
+    "LOG_QUEUE_MAX",
+    "TRACEMALLOC_FRAMES",
+    "MEMORY_SNAPSHOTS_MAX",
+    "BOT_WORKERS",
+    "BOT_MOVE_BUDGET_MS",
+    "BOT_MAX_ITERATIONS",
+    "ROOM_EMPTY_TTL_SECONDS",
+    "LOBBY_EMPTY_TTL_SECONDS",
+    "FINISHED_ROOM_TTL_SECONDS",
+    "PHASE_TIMEOUTS",
+    "ROOM_EVENT_BACKLOG",
+    "HEARTBEAT_INTERVAL_SECONDS",
+    "HEARTBEAT_TIMEOUT_SECONDS",
+    "WS_RATE_PER_SECOND",
+    "WS_RATE_BURST",
+    "WS_TYPE_RATES",
+    "WS_MAX_FRAME_BYTES",
+    "WS_FLOOD_CLOSE_AFTER",
+    "MAX_ROOMS",
+    "MAX_ROOMS_IN_GAME",
+    "MAX_ROOMS_PER_USER",
+    "MAX_CONNECTIONS",
+    "MAX_CONNECTIONS_PER_USER",
+    "MAX_LOOP_LAG_MS",
+    "LAG_PROBE_INTERVAL_SECONDS",
+    "ACCEPT_RATE_PER_SECOND",
+    "ACCEPT_BURST",
+    "RETRY_AFTER_SECONDS",
+    "RETRY_AFTER_MAX_SECONDS",
+    "SPECTATORS_PER_ROOM",
+    "SPECTATORS_MAX",
+    "SPECTATOR_DELAY_SECONDS",
+    "RATING_INITIAL",
+    "RATING_K",
+    "RATING_K_PROVISIONAL",
+    "RATING_PROVISIONAL_GAMES",
+    "RATING_EVIL_ADVANTAGE",
+    "MATCH_INTERVAL_SECONDS",
+    "MATCH_BUCKET_WIDTH",
+    "MATCH_WIDEN_SECONDS",
+    "MATCH_MAX_SPREAD_BUCKETS",
+    "MATCH_MAX_WAIT_SECONDS",
+    "MATCH_QUEUE_MAX",
+]
@@ -0,0 +1,171 @@
+"""Spectator feeds: one shared public view of a room for any number of viewers.
+
+Players receive personalised snapshots (their own role patched in), so the
+room pays one serialisation per player. Spectators all see the same
+role-masked view, so a change is serialised once and that one string goes
+to every viewer. The fan-out runs in the feed's own task after the players
+have been served: an audience never adds to the per-player cost of
+:meth:`backend.room.Room.broadcast_state`, and a slow viewer never holds up
+the table. When the feed falls behind, stale snapshots are dropped in
+favour of the newest one instead of queueing up.
+
+``AVALON_SPECTATOR_DELAY_SECONDS`` holds every frame back through the
+scheduler (a stream delay, so viewers cannot feed live information to the
+table). Viewer counts are capped per room and process-wide.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Optional, Set, Tuple
+
+from . import metrics, settings
+from .scheduler import SCHEDULER
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .room import Room
+
+# Close code for viewers turned away by a spectator limit.
+CLOSE_SPECTATOR_LIMIT = 4005
+
+# Spectators across all rooms (checked against ``SPECTATORS_MAX``).
+_total = 0
+
+
+def total() -> int:
+    return _total
+
+
+class SpectatorFeed:
+    """Viewers of one room and the frames queued for them."""
+
+    __slots__ = ("sockets", "latest", "_pending", "_pending_states", "_task")
+
+    def __init__(self) -> None:
+        self.sockets: Set[Any] = set()
+        # Newest snapshot that reached the feed (after the delay), for late joiners.
+        self.latest: Optional[str] = None
+        self._pending: Deque[Tuple[bool, str]] = deque()
+        self._pending_states = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.sockets)
+
+    # -------------------- Membership -------------------- #
+
+    def admit(self, ws: Any) -> Optional[str]:
+        """Add *ws*, or return which limit (``"room"`` / ``"global"``) refused it."""
+        global _total
+        if len(self.sockets) >= settings.SPECTATORS_PER_ROOM:
+            return "room"
+        if _total >= settings.SPECTATORS_MAX:
+            return "global"
+        self.sockets.add(ws)
+        _total += 1
+        return None
+
+    def remove(self, ws: Any) -> None:
+        global _total
+        if ws in self.sockets:
+            self.sockets.discard(ws)
+            _total -= 1
+
+    # -------------------- Publishing -------------------- #
+
+    def publish(self, text: str, state: bool = False) -> None:
+        """Queue serialised *text* for every viewer; *state* marks a full snapshot."""
+        delay = settings.SPECTATOR_DELAY_SECONDS
+        if delay > 0:
+            SCHEDULER.call_later(delay, self._enqueue, text, state, kind="spectator")
+        else:
+            self._enqueue(text, state)
+
+    def _enqueue(self, text: str, state: bool) -> None:
+        if not self.sockets:
+            return
+        if state:
+            self.latest = text
+            self._pending_states += 1
+        self._pending.append((state, text))
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self) -> None:
+        try:
+            while self._pending:
+                state, text = self._pending.popleft()
+                if state:
+                    self._pending_states -= 1
+                    if self._pending_states:
+                        # A newer snapshot is queued behind this one.
+                        metrics.SPECTATOR_FRAMES_SKIPPED.inc()
+                        continue
+                await self._fanout(text)
+        finally:
+            self._task = None
+
+    async def _fanout(self, text: str) -> None:
+        start = metrics.now()
+        targets = list(self.sockets)
+        for ws in targets:
+            try:
+                await ws.send_text(text)
+            except Exception:
+                self.remove(ws)  # the viewer's own receive loop finishes the clean-up
+        metrics.BROADCAST_SECONDS.observe(metrics.now() - start, "spectator")
+        metrics.BROADCAST_BYTES.observe(len(text) * len(targets), "spectator")
+        metrics.BROADCAST_RECIPIENTS.inc("spectator", amount=len(targets))
+
+
+# -----------------------------
+# Room helpers
+# -----------------------------
+
+
+async def watch(room: "Room", ws: Any) -> bool:
+    """Attach viewer *ws* to *room*; closes it and returns *False* if a limit is reached."""
+    feed = room.spectators
+    if feed is None:
+        feed = room.spectators = SpectatorFeed()
+    reason = feed.admit(ws)
+    if reason is not None:
+        if not feed.sockets:
+            room.spectators = None
+        metrics.SPECTATORS_REJECTED.inc(reason)
+        await ws.close(code=CLOSE_SPECTATOR_LIMIT)
+        return False
+    if feed.latest is not None:
+        await ws.send_text(feed.latest)
+    elif len(feed) == 1:
+        # First viewer: start the feed with a snapshot (delayed like everything else).
+        feed.publish(room.spectator_state_text(), state=True)
+    return True
+
+
+def unwatch(room: "Room", ws: Any) -> None:
+    feed = room.spectators
+    if feed is None:
+        return
+    feed.remove(ws)
+    if not feed.sockets:
+        room.spectators = None
+
+
+async def close_all(room: "Room", code: int) -> None:
+    """Flush what is queued, then disconnect every viewer of *room*."""
+    feed = room.spectators
+    if feed is None:
+        return
+    room.spectators = None
+    if feed._task is not None:
+        await feed._task
+    for ws in list(feed.sockets):
+        feed.remove(ws)
+        try:
+            await ws.close(code=code)
+        except Exception:
+            pass
+
+
+__all__ = ["CLOSE_SPECTATOR_LIMIT", "SpectatorFeed", "total", "watch", "unwatch", "close_all"]
@@ -6,7 +6,7 @@ imports.
 """
 from __future__ import annotations
 
-from typing import Dict, Optional
+from typing import Dict, Optional, Set
 
 from fastapi import WebSocket
 
@@ -20,4 +20,7 @@ rooms: Dict[str, "Room"] = {}
 # Mapping active lobby websocket connections → optionally authenticated user_id
 lobby_connections: Dict[WebSocket, Optional[str]] = {}
 
-__all__ = ["rooms", "lobby_connections"] 
\ No newline at end of file
+# Open ``/mux`` connections (their channels also appear in the two maps above)
+mux_connections: Set[WebSocket] = set()
+
+__all__ = ["rooms", "lobby_connections", "mux_connections"] 
\ No newline at end of file
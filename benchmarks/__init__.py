@@ -0,0 +1 @@
+"""Stand-alone performance benchmarks for the Avalon backend."""
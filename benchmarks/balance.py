@@ -0,0 +1,420 @@
+"""Vectorised Monte Carlo balance simulator for role configurations.
+
+Plays many games at once as NumPy arrays – one row per game, one column
+per seat – under the rules of :mod:`backend.engine`: the same role deck
+(:func:`backend.engine.build_role_deck`), ``QUEST_SIZES``, the two-fail
+fourth quest from 7 players, five consecutive rejections, Lady of the
+Lake after ``lady_after_rounds`` and the assassination. Every decision is
+made by a simple parametric policy (see :class:`Policy`), evaluated for
+all games of a batch in one array operation; the only Python loop is over
+proposals (at most 25 per game).
+
+Reports the good win rate with a 95 % Wilson confidence interval and how
+evil won (quests, rejections, assassination) per player count and
+configuration.
+
+Usage::
+
+    python -m benchmarks.balance --games 1000000
+    python -m benchmarks.balance --players 7 8 --oberon both --lady both --workers 8
+    python -m benchmarks.balance --set evil_fail_rate=0.7 --set merlin_subtlety=0.5
+
+Absolute win rates depend heavily on the policy; compare configurations
+under the same policy (and try a few policies) rather than quoting one
+number. Simplifications: Lady of the Lake results only update the holder's own
+beliefs (claims are not modelled), and the assassination is one joint
+pick by the evil team instead of a vote with tie-breaking rounds.
+
+Requires ``numpy`` (see ``benchmarks/requirements.txt``).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, fields, replace
+from math import sqrt
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend import engine
+from backend.constants import QUEST_SIZES
+
+# Role codes used in the ``roles`` array.
+MERLIN, PERCIVAL, SERVANT, MORDRED, MORGANA, OBERON, MINION = range(7)
+ROLE_CODES = {
+    "Merlin": MERLIN,
+    "Percival": PERCIVAL,
+    "Loyal Servant of Arthur": SERVANT,
+    "Mordred": MORDRED,
+    "Morgana": MORGANA,
+    "Oberon": OBERON,
+    "Minion of Mordred": MINION,
+}
+EVIL_CODES = (MORDRED, MORGANA, OBERON, MINION)
+
+# Index into the per-batch outcome counts.
+OUTCOMES = ("unfinished", "good", "evil_quests", "evil_rejections", "evil_assassination")
+GOOD, EVIL_QUESTS, EVIL_REJECTIONS, EVIL_ASSASSINATION = 1, 2, 3, 4
+
+EPS = 1e-4
+
+# -----------------------------
+# Policy & configurations
+# -----------------------------
+
+
+@dataclass(frozen=True)
+class Policy:
+    """Tunable behaviour of the simulated players (override with ``--set``)."""
+
+    # Good leaders pick the players they trust most, plus Gumbel noise of this scale.
+    good_temperature: float = 0.15
+    # Good players approve when the team's expected number of evil exceeds that of
+    # the best team they could pick themselves by less than this.
+    approve_slack: float = 0.35
+    vote_noise: float = 0.25
+    # Probability a good player approves the fifth proposal of a round.
+    hammer_approve: float = 0.95
+    # Probability Merlin ignores what he knows for one proposal or vote.
+    merlin_subtlety: float = 0.3
+    # Probability an evil leader puts one (known) evil partner on the team.
+    evil_partner_rate: float = 0.5
+    # Probability an evil player approves a team with no evil on it.
+    evil_approve_clean: float = 0.3
+    # Probability an evil player on a quest plays Fail (round 1 / later rounds).
+    evil_fail_rate_round1: float = 0.5
+    evil_fail_rate: float = 0.85
+    # Odds multipliers applied to the members of a quest with / without fails.
+    fail_evidence: float = 2.5
+    success_evidence: float = 0.7
+    # Odds multiplier for everyone who approved a quest that then failed.
+    vote_evidence: float = 1.5
+    # Noise on the Lady holder's target choice (good holders probe the most uncertain player).
+    lady_temperature: float = 0.1
+    # Noise on the assassin's read of who voted like Merlin; larger means more guessing.
+    assassin_temperature: float = 1.0
+
+
+def make_config(oberon: bool, lady: bool, lady_after_rounds: Optional[List[int]] = None) -> engine.GameConfig:
+    return engine.GameConfig(oberon=oberon, lady_enabled=lady, lady_after_rounds=lady_after_rounds)
+
+
+def config_label(config: engine.GameConfig) -> str:
+    parts = ["oberon" if config.oberon else "no-oberon"]
+    if config.lady_enabled:
+        parts.append("lady@" + ",".join(map(str, config.lady_after_rounds)))
+    else:
+        parts.append("no-lady")
+    return " ".join(parts)
+
+
+class _NoShuffle:
+    """``rng`` for :func:`engine.build_role_deck` that leaves the deck ordered."""
+
+    @staticmethod
+    def shuffle(seq: list) -> None:
+        pass
+
+
+def role_deck(n_players: int, config: engine.GameConfig) -> np.ndarray:
+    """Unshuffled role codes for *n_players*, taken from the real rules engine."""
+    return np.array([ROLE_CODES[r] for r in engine.build_role_deck(n_players, config, _NoShuffle())], dtype=np.int8)
+
+
+# -----------------------------
+# Vectorised game
+# -----------------------------
+
+
+def _gumbel(rng: np.random.Generator, shape: Tuple[int, ...]) -> np.ndarray:
+    return rng.gumbel(size=shape).astype(np.float32)
+
+
+def _initial_beliefs(roles: np.ndarray, evil: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(belief, locked)``; ``belief[g, i, j]`` is seat i's P(seat j is evil)."""
+    games, n = roles.shape
+    n_evil = int(evil[0].sum())
+    rows = np.arange(games)
+    belief = np.full((games, n, n), n_evil / (n - 1), dtype=np.float32)
+    locked = np.zeros((games, n, n), dtype=bool)
+    eye = np.eye(n, dtype=bool)
+
+    # Evil players (except Oberon) know their team; Oberon only knows himself.
+    informed_evil = evil & (roles != OBERON)
+    belief = np.where(informed_evil[:, :, None], informed_evil[:, None, :], belief).astype(np.float32)
+    locked |= informed_evil[:, :, None]
+
+    # Merlin sees every evil player except Mordred and Oberon.
+    merlin = (roles == MERLIN).argmax(axis=1)
+    seen = evil & (roles != MORDRED) & (roles != OBERON)
+    hidden = n_evil - seen.sum(axis=1, keepdims=True)
+    unseen_prior = hidden / np.maximum(n - 1 - seen.sum(axis=1, keepdims=True), 1)
+    belief[rows, merlin] = np.where(seen, 1.0, unseen_prior)
+    locked[rows, merlin] = seen
+
+    # Percival sees Merlin and Morgana without knowing which is which.
+    if (roles == PERCIVAL).any():
+        percival = (roles == PERCIVAL).argmax(axis=1)
+        pair = (roles == MERLIN) | (roles == MORGANA)
+        pair_evil = ((roles == MORGANA).sum(axis=1, keepdims=True)) / pair.sum(axis=1, keepdims=True)
+        belief[rows, percival] = np.where(pair, pair_evil, belief[rows, percival])
+        locked[rows, percival] = pair & (pair_evil == 0)
+
+    belief[:, eye] = evil
+    locked[:, eye] = True
+    return belief, locked
+
+
+def _renormalise(belief: np.ndarray, locked: np.ndarray, n_evil: int) -> np.ndarray:
+    """Scale each seat's open beliefs so they add up to the evil players it has not pinned down."""
+    open_mass = np.where(locked, 0.0, belief).sum(axis=2, keepdims=True)
+    remaining = n_evil - np.where(locked, belief, 0.0).sum(axis=2, keepdims=True)
+    scale = np.where(open_mass > 0, np.clip(remaining, 0, None) / np.maximum(open_mass, EPS), 1.0)
+    return np.where(locked, belief, np.clip(belief * scale, 0.0, 1.0)).astype(np.float32)
+
+
+def simulate(n_players: int, config: engine.GameConfig, policy: Policy, games: int,
+             seed: Optional[np.random.SeedSequence] = None) -> np.ndarray:
+    """Play *games* games and return outcome counts indexed like :data:`OUTCOMES`."""
+    rng = np.random.default_rng(seed)
+    n = n_players
+    sizes = np.array(QUEST_SIZES[n], dtype=np.int64)
+    two_fail_round = 4 if n >= 7 else 0
+    lady_rounds = np.array(config.lady_after_rounds if config.lady_enabled else [], dtype=np.int64)
+
+    roles = role_deck(n, config)[rng.random((games, n)).argsort(axis=1)]
+    evil = np.isin(roles, EVIL_CODES)
+    informed_evil = evil & (roles != OBERON)
+    merlin_seen = evil & (roles != MORDRED) & (roles != OBERON)
+    is_merlin = roles == MERLIN
+    belief, locked = _initial_beliefs(roles, evil)
+    n_evil = int(evil[0].sum())
+    prior_expectation = n_evil / (n - 1)
+
+    # Seats are already in random order: seat 0 leads first and the last seat holds the Lady.
+    leader = np.zeros(games, dtype=np.int64)
+    round_no = np.ones(games, dtype=np.int64)
+    rejections = np.zeros(games, dtype=np.int64)
+    good_wins = np.zeros(games, dtype=np.int64)
+    evil_wins = np.zeros(games, dtype=np.int64)
+    outcome = np.zeros(games, dtype=np.int64)
+    # How much each seat's proposals and votes looked like Merlin's, as tracked by the evil team.
+    merlin_tell = np.zeros((games, n), dtype=np.float32)
+    lady_holder = np.full(games, n - 1 if config.lady_enabled else -1, dtype=np.int64)
+    lady_seen = np.zeros((games, n), dtype=bool)
+    if config.lady_enabled:
+        lady_seen[:, n - 1] = True
+
+    seats = np.arange(n)
+    while True:
+        act = np.flatnonzero((outcome == 0) & (good_wins < 3))
+        if act.size == 0:
+            break
+        m = act.size
+        rows = np.arange(m)
+        L = leader[act]
+        rd = round_no[act]
+        k = sizes[rd - 1]
+        ev = evil[act]
+        inf_ev = informed_evil[act]
+        B = belief[act]
+        lead_onehot = seats[None, :] == L[:, None]
+
+        # ---- proposal ----
+        noise = _gumbel(rng, (m, n))
+        bluff = is_merlin[act, L] & (rng.random(m) < policy.merlin_subtlety)
+        good_score = np.where(bluff[:, None], noise, -B[rows, L] + policy.good_temperature * noise)
+        partners = inf_ev & ~lead_onehot
+        pick = np.where(partners, rng.random((m, n)), -1.0).argmax(axis=1)
+        take_partner = partners.any(axis=1) & (rng.random(m) < policy.evil_partner_rate)
+        evil_score = noise - 50.0 * partners
+        evil_score[rows[take_partner], pick[take_partner]] += 100.0
+        score = np.where(inf_ev[rows, L][:, None], evil_score, good_score)
+        score[rows, L] = np.inf
+        order = np.argsort(-score, axis=1)
+        rank = np.empty_like(order)
+        rank[rows[:, None], order] = seats
+        team = rank < k[:, None]
+
+        # ---- vote ----
+        best_evil = np.take_along_axis(np.sort(B, axis=2).cumsum(axis=2), (k - 1)[:, None, None], axis=2)[..., 0]
+        excess = np.einsum("gij,gj->gi", B, team.astype(np.float32)) - best_evil
+        r = roles[act]
+        merlin_bluff = (r == MERLIN) & (rng.random((m, n)) < policy.merlin_subtlety)
+        excess = np.where(merlin_bluff, prior_expectation * ~team, excess)
+        hammer = rejections[act] == 4
+        good_vote = excess + policy.vote_noise * rng.standard_normal((m, n)) < policy.approve_slack
+        good_vote |= hammer[:, None] & (rng.random((m, n)) < policy.hammer_approve)
+        evil_on_team = (team & ev).any(axis=1)
+        evil_vote = evil_on_team[:, None] | (~hammer[:, None] & (rng.random((m, n)) < policy.evil_approve_clean))
+        oberon_vote = team | (rng.random((m, n)) < 0.5)
+        approve = np.where(inf_ev, evil_vote, np.where(r == OBERON, oberon_vote, good_vote))
+        approve[rows, L] = True
+        passed = approve.sum(axis=1) * 2 > n
+
+        dirty = (team & merlin_seen[act]).any(axis=1)
+        tell = np.where(dirty[:, None], np.where(approve, -1.0, 1.0), 0.0)
+        tell[rows, L] += np.where(dirty, -1.0, 0.5)
+        merlin_tell[act] += tell
+
+        # ---- rejected proposals ----
+        rej = ~passed
+        rejections[act[rej]] += 1
+        outcome[act[rej & (rejections[act] >= 5)]] = EVIL_REJECTIONS
+
+        # ---- quests ----
+        rejections[act[passed]] = 0
+        fail_rate = np.where(rd == 1, policy.evil_fail_rate_round1, policy.evil_fail_rate)
+        fails = (team & ev & (rng.random((m, n)) < fail_rate[:, None])).sum(axis=1)
+        required = np.where(rd == two_fail_round, 2, 1)
+        failed = fails >= required
+        good_wins[act[passed & ~failed]] += 1
+        evil_wins[act[passed & failed]] += 1
+
+        factor = np.where(fails > 0, policy.fail_evidence ** fails, policy.success_evidence).astype(np.float32)
+        mult = np.where(team & passed[:, None], factor[:, None], np.float32(1.0))
+        mult *= np.where(approve & (passed & (fails > 0))[:, None], np.float32(policy.vote_evidence), np.float32(1.0))
+        mult = mult[:, None, :]
+        clipped = np.clip(B, EPS, 1 - EPS)
+        odds = clipped / (1 - clipped) * mult
+        B = _renormalise(np.where(locked[act], B, odds / (1 + odds)), locked[act], n_evil)
+
+        outcome[act[passed & (evil_wins[act] >= 3)]] = EVIL_QUESTS
+        cont = passed & (good_wins[act] < 3) & (evil_wins[act] < 3)
+        round_no[act[cont]] += 1
+
+        # ---- Lady of the Lake ----
+        lady_now = cont & np.isin(rd, lady_rounds) & (lady_holder[act] >= 0)
+        if lady_now.any():
+            li = rows[lady_now]
+            h = lady_holder[act[li]]
+            hb = B[li, h]
+            seen = lady_seen[act[li]] | (seats[None, :] == h[:, None])
+            probe = -np.abs(hb - 0.5) + policy.lady_temperature * _gumbel(rng, hb.shape)
+            probe = np.where(informed_evil[act[li], h][:, None], rng.random(hb.shape), probe)
+            target = np.where(seen, -np.inf, probe).argmax(axis=1)
+            B[li, h, target] = ev[li, target]
+            locked[act[li], h, target] = True
+            lady_seen[act[li], target] = True
+            lady_holder[act[li]] = target
+
+        leader[act[(rej | cont) & (outcome[act] == 0)]] = (L[(rej | cont) & (outcome[act] == 0)] + 1) % n
+        belief[act] = B
+
+    # ---- assassination ----
+    assassinate = np.flatnonzero((outcome == 0) & (good_wins >= 3))
+    if assassinate.size:
+        read = merlin_tell[assassinate] + policy.assassin_temperature * _gumbel(rng, (assassinate.size, n))
+        target = np.where(evil[assassinate], -np.inf, read).argmax(axis=1)
+        hit = is_merlin[assassinate, target]
+        outcome[assassinate] = np.where(hit, EVIL_ASSASSINATION, GOOD)
+
+    return np.bincount(outcome, minlength=len(OUTCOMES))
+
+
+# -----------------------------
+# Statistics & reporting
+# -----------------------------
+
+
+def wilson_interval(successes: int, total: int, z: float = 1.96) -> Tuple[float, float]:
+    """Wilson score interval for a binomial proportion."""
+    if total == 0:
+        return 0.0, 1.0
+    p = successes / total
+    denom = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denom
+    half = z * sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denom
+    return centre - half, centre + half
+
+
+def _run_chunk(n_players: int, config_kwargs: Dict, policy: Policy, games: int,
+               seed: np.random.SeedSequence) -> Tuple[int, str, np.ndarray]:
+    config = engine.GameConfig(**config_kwargs)
+    return n_players, config_label(config), simulate(n_players, config, policy, games, seed)
+
+
+def report(results: Dict[Tuple[int, str], np.ndarray]) -> str:
+    lines = [
+        f"{'players':>7} {'config':<22} {'games':>10} {'good %':>7} {'95% CI':>15}"
+        f" {'evil: quests':>12} {'rejections':>10} {'assassin':>9}"
+    ]
+    for (n, label), counts in sorted(results.items()):
+        total = int(counts.sum())
+        good = int(counts[GOOD])
+        lo, hi = wilson_interval(good, total)
+        pct = [100.0 * counts[i] / total for i in (EVIL_QUESTS, EVIL_REJECTIONS, EVIL_ASSASSINATION)]
+        lines.append(
+            f"{n:>7} {label:<22} {total:>10,} {100.0 * good / total:>7.2f} {f'{100 * lo:.2f}–{100 * hi:.2f}':>15}"
+            f" {pct[0]:>12.2f} {pct[1]:>10.2f} {pct[2]:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_overrides(items: List[str]) -> Policy:
+    known = {f.name for f in fields(Policy)}
+    overrides: Dict[str, float] = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep or name not in known:
+            raise SystemExit(f"--set expects NAME=VALUE with NAME one of: {', '.join(sorted(known))}")
+        overrides[name] = float(value)
+    return replace(Policy(), **overrides)
+
+
+def _choices(flag: str) -> List[bool]:
+    return {"off": [False], "on": [True], "both": [False, True]}[flag]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=200_000, help="games per player count and config")
+    parser.add_argument("--players", type=int, nargs="+", default=[7, 8, 9, 10], choices=sorted(QUEST_SIZES))
+    parser.add_argument("--oberon", choices=("off", "on", "both"), default="both")
+    parser.add_argument("--lady", choices=("off", "on", "both"), default="both")
+    parser.add_argument("--lady-after", type=int, nargs="+", default=None, help="lady_after_rounds (default 2 3 4)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a Policy field, e.g. evil_fail_rate=0.7")
+    parser.add_argument("--batch", type=int, default=25_000, help="games per vectorised batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (1 = inline)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    policy = parse_overrides(args.overrides)
+    jobs: List[Tuple[int, Dict, int]] = []
+    for n in args.players:
+        for oberon in _choices(args.oberon):
+            if oberon and n < 7:
+                continue  # set_config refuses Oberon below 7 players
+            for lady in _choices(args.lady):
+                config = make_config(oberon, lady, args.lady_after)
+                kwargs = {"oberon": oberon, "lady_enabled": lady, "lady_after_rounds": config.lady_after_rounds}
+                for start in range(0, args.games, args.batch):
+                    jobs.append((n, kwargs, min(args.batch, args.games - start)))
+
+    seeds = np.random.SeedSequence(args.seed).spawn(len(jobs))
+    results: Dict[Tuple[int, str], np.ndarray] = {}
+    total_games = sum(j[2] for j in jobs)
+    print(f"simulating {total_games:,} games in {len(jobs)} batches on {args.workers} worker(s)")
+    print("policy: " + ", ".join(f"{k}={v:g}" for k, v in asdict(policy).items()))
+    start = time.perf_counter()
+    if args.workers <= 1:
+        done = [_run_chunk(n, kw, policy, g, s) for (n, kw, g), s in zip(jobs, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(_run_chunk, n, kw, policy, g, s) for (n, kw, g), s in zip(jobs, seeds)]
+            done = [f.result() for f in as_completed(futures)]
+    for n, label, counts in done:
+        key = (n, label)
+        results[key] = results[key] + counts if key in results else counts
+    elapsed = time.perf_counter() - start
+
+    print(report(results))
+    print(f"\n{total_games:,} games in {elapsed:.2f}s ({total_games / elapsed:,.0f} games/s)")
+
+
+if __name__ == "__main__":
+    main()
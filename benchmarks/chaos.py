@@ -0,0 +1,615 @@
+"""Network chaos harness: disconnect, pause and resume latency under faults.
+
+Every test client reaches the server through its own fault-injecting TCP
+proxy (:class:`FaultProxy`). The proxy can add latency and jitter to all
+traffic. On demand it also injects one of these faults into the client's
+live connection:
+
+* ``close``     – both sockets are reset. There is no close frame and no FIN.
+* ``half_open`` – the client's socket is reset, but the server's side stays
+  open and silent. Only the server's heartbeat can notice.
+* ``stall``     – bytes are held in both directions for ``--stall-seconds``
+  and then delivered. A stall shorter than the heartbeat timeout should be
+  ridden out without pausing the game.
+
+``--rooms`` tables of ``--players`` start a game, a few tables at a time
+(every join and connect is a bcrypt check on the server's loop). Once the
+server has settled, every table, all at once, takes ``--faults`` faults on
+random seats. The times below are
+measured from the moment a fault is injected:
+
+detect    the server logged ``player_disconnected`` for the seat. This is
+          read from its structured log (``backend.logs``), so it needs
+          ``--spawn`` or ``--server-log`` on the same host.
+pause     another player at the table received the ``pause`` naming the seat.
+resume    time from the seat reconnecting (with its last ``seq``) until it
+          has the same public state as the table and its own role, and the
+          table has seen the pause lifted.
+recovery  time from the fault to resumed.
+
+Usage::
+
+    # spawn uvicorn with a 1 s heartbeat / 3 s timeout and a log to read detect times from
+    python -m benchmarks.chaos --spawn --rooms 50 --faults 3 --latency-ms 20 --jitter-ms 10
+
+    # against a running server (half-open needs its heartbeat timeout below --timeout)
+    python -m benchmarks.chaos --url http://127.0.0.1:8000 --server-log avalon.log --modes close,stall
+
+Requires ``httpx`` and ``websockets`` (see ``benchmarks/requirements.txt``).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import websockets
+
+from benchmarks.loadgen import SyntheticUser, percentile, signup, wait_for_server, ws_url
+
+MODES = ("close", "half_open", "stall")
+CLOSE_OVERLOADED = 1013
+
+# -----------------------------
+# Fault-injecting proxy
+# -----------------------------
+
+
+class Link:
+    """One proxied TCP connection (client side and server side)."""
+
+    def __init__(self, client: asyncio.StreamWriter, server: asyncio.StreamWriter) -> None:
+        self.client = client
+        self.server = server
+        self.flowing = asyncio.Event()
+        self.flowing.set()
+        # Half-open: everything is dropped and the server side is never closed.
+        self.blackhole = False
+
+
+class FaultProxy:
+    """TCP proxy from a local port to the server that injects faults on demand."""
+
+    def __init__(self, target_host: str, target_port: int, latency: float = 0.0, jitter: float = 0.0) -> None:
+        self.target_host = target_host
+        self.target_port = target_port
+        self.latency = latency
+        self.jitter = jitter
+        self.links: Set[Link] = set()
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._accept, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        self.abort()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _accept(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        try:
+            server_reader, server_writer = await asyncio.open_connection(self.target_host, self.target_port)
+        except OSError:
+            client_writer.transport.abort()
+            return
+        link = Link(client_writer, server_writer)
+        self.links.add(link)
+        try:
+            await asyncio.gather(self._pump(link, client_reader, server_writer),
+                                 self._pump(link, server_reader, client_writer))
+        finally:
+            self.links.discard(link)
+
+    async def _pump(self, link: Link, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if self.latency or self.jitter:
+                    await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+                await link.flowing.wait()
+                if link.blackhole:
+                    continue
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            # A half-open link must not pass the client's disappearance on to the server.
+            if not link.blackhole:
+                writer.close()
+
+    # -------------------- Faults -------------------- #
+
+    def abort(self) -> None:
+        """Reset both sockets of every live link."""
+        for link in list(self.links):
+            link.flowing.set()
+            link.client.transport.abort()
+            link.server.transport.abort()
+
+    def half_open(self) -> None:
+        """Reset the client side and leave the server side open and silent."""
+        for link in list(self.links):
+            link.blackhole = True
+            link.flowing.set()
+            link.client.transport.abort()
+
+    def stall(self, seconds: float) -> None:
+        """Hold all traffic of the live links for *seconds*."""
+        loop = asyncio.get_running_loop()
+        for link in list(self.links):
+            link.flowing.clear()
+            loop.call_later(seconds, link.flowing.set)
+
+
+# -----------------------------
+# Test clients
+# -----------------------------
+
+
+def public_view(state: Dict[str, Any]) -> Dict[str, Any]:
+    """*state* without the recipient's own role, for comparing what two players see."""
+    if state.get("phase") == "finished":
+        return state
+    return {**state, "players": [{**p, "role": None} for p in state["players"]]}
+
+
+class ChaosClient:
+    """One seat: keeps the latest state, its role and every ``pause`` it received."""
+
+    def __init__(self, user: SyntheticUser, room_id: str, proxy: FaultProxy, is_host: bool, table_size: int) -> None:
+        self.user = user
+        self.name = user.username[-12:]  # display name given by ``signup``
+        self.room_id = room_id
+        self.proxy = proxy
+        self.is_host = is_host
+        self.table_size = table_size
+        self.ws: Any = None
+        self.seq: Optional[int] = None
+        self.state: Optional[Dict[str, Any]] = None
+        self.state_at = 0.0
+        self.role: Optional[str] = None
+        self.pauses: List[Tuple[float, List[str]]] = []
+        self._sent: Set[str] = set()
+        self._changed = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_until(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not predicate():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return predicate()
+        return True
+
+    async def connect(self, resume: bool = False, timeout: float = 30.0) -> None:
+        """Open the room socket through the proxy, honouring the server's retry-after hints."""
+        since = f"&since={self.seq}" if resume and self.seq is not None else ""
+        url = ws_url(self.proxy.url, f"/ws/{self.room_id}?auth={self.user.token}{since}")
+        deadline = time.monotonic() + timeout
+        while True:
+            ws = await websockets.connect(url, max_size=None, ping_interval=None, open_timeout=timeout)
+            try:
+                first = await asyncio.wait_for(ws.recv(), timeout)
+                break
+            except websockets.ConnectionClosed as exc:
+                reason = exc.rcvd.reason if exc.rcvd else ""
+                if exc.rcvd is None or exc.rcvd.code != CLOSE_OVERLOADED or time.monotonic() > deadline:
+                    raise
+                wait = float(reason.partition("=")[2] or 1)
+                await asyncio.sleep(min(wait, max(0.0, deadline - time.monotonic())))
+        self.ws = ws
+        await self._handle(first)
+        self._reader = asyncio.create_task(self._read(ws))
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def _read(self, ws: Any) -> None:
+        try:
+            async for raw in ws:
+                await self._handle(raw)
+        except (websockets.ConnectionClosed, OSError):
+            pass
+        finally:
+            self._notify()
+
+    async def _handle(self, raw: Any) -> None:
+        msg = json.loads(raw)
+        kind = msg.get("type")
+        if isinstance(msg.get("seq"), int):
+            self.seq = msg["seq"] if kind == "state" or self.seq is None else max(self.seq, msg["seq"])
+        if kind == "ping":
+            await self.ws.send(json.dumps({"type": "pong", "ts": msg.get("ts")}))
+        elif kind == "state":
+            self.state = msg["data"]
+            self.state_at = time.time()
+            mine = next((p for p in self.state["players"] if p["user_id"] == self.user.user_id), None)
+            if mine is not None and mine["role"] is not None:
+                self.role = mine["role"]
+            await self._advance_lobby(mine)
+        elif kind == "pause":
+            self.pauses.append((time.time(), list(msg.get("players", []))))
+        self._notify()
+
+    async def _advance_lobby(self, mine: Optional[Dict[str, Any]]) -> None:
+        """Ready up and (as host) start once the table is full; nobody plays after that."""
+        s = self.state
+        if s is None or s["phase"] != "lobby" or mine is None:
+            return
+        if not mine["ready"] and "ready" not in self._sent:
+            self._sent.add("ready")
+            await self.ws.send(json.dumps({"type": "toggle_ready"}))
+        elif (self.is_host and "start" not in self._sent and len(s["players"]) == self.table_size
+              and all(p["ready"] for p in s["players"])):
+            self._sent.add("start")
+            await self.ws.send(json.dumps({"type": "start_game"}))
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+
+
+@dataclass
+class FaultResult:
+    mode: str
+    room_id: str
+    user_id: str
+    at: float
+    detect: Optional[float] = None
+    pause: Optional[float] = None
+    resume: Optional[float] = None
+    recovery: Optional[float] = None
+    paused: bool = False
+    correct: bool = False
+    error: Optional[str] = None
+
+
+class ServerLog:
+    """``player_disconnected`` times per (room_id, user_id) from a JSON-lines server log."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.disconnects: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+
+    def load(self) -> None:
+        try:
+            fh = open(self.path, encoding="utf-8")
+        except OSError:
+            return
+        with fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("event") == "player_disconnected":
+                    ts = datetime.fromisoformat(record["ts"]).timestamp()
+                    self.disconnects[(record.get("room_id"), record.get("user_id"))].append(ts)
+
+    def detected(self, result: FaultResult) -> Optional[float]:
+        # Log timestamps are truncated to milliseconds.
+        times = [t for t in self.disconnects.get((result.room_id, result.user_id), []) if t >= result.at - 0.001]
+        return max(0.0, min(times) - result.at) if times else None
+
+
+@dataclass
+class Report:
+    results: List[FaultResult] = field(default_factory=list)
+    setup_errors: List[str] = field(default_factory=list)
+
+    def render(self, elapsed: float) -> str:
+        lines = [f"elapsed               {elapsed:10.2f} s",
+                 f"faults injected       {len(self.results):10d}",
+                 ""]
+        lines.append(f"{'mode':<10}{'n':>6}{'paused':>8}{'correct':>9}{'failed':>8}")
+        by_mode: Dict[str, List[FaultResult]] = defaultdict(list)
+        for result in self.results:
+            by_mode[result.mode].append(result)
+        for mode, results in sorted(by_mode.items()):
+            lines.append(f"{mode:<10}{len(results):>6}{sum(r.paused for r in results):>8}"
+                         f"{sum(r.correct for r in results):>9}{sum(r.error is not None for r in results):>8}")
+        lines += ["", f"{'mode / phase':<22}{'n':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for mode, results in sorted(by_mode.items()):
+            for phase in ("detect", "pause", "resume", "recovery"):
+                values = sorted(getattr(r, phase) for r in results if getattr(r, phase) is not None)
+                if not values:
+                    continue
+                lines.append(
+                    f"{mode + ' ' + phase:<22}{len(values):>6}"
+                    f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 90) * 1000:>10.1f}"
+                    f"{percentile(values, 99) * 1000:>10.1f}{values[-1] * 1000:>10.1f}"
+                )
+        errors = [f"{r.mode} room {r.room_id[:8]}: {r.error}" for r in self.results if r.error] + self.setup_errors
+        for err in errors[:10]:
+            lines.append(f"error: {err}")
+        return "\n".join(lines)
+
+
+# -----------------------------
+# One table
+# -----------------------------
+
+
+async def inject(args: argparse.Namespace, table: List[ChaosClient], mode: str) -> FaultResult:
+    victim = random.choice(table)
+    observer = next(c for c in table if c is not victim)
+    result = FaultResult(mode, victim.room_id, victim.user.user_id, time.time())
+    role = victim.role
+    seen = len(observer.pauses)
+
+    def paused() -> bool:
+        return any(victim.name in names for _, names in observer.pauses[seen:])
+
+    if mode == "close":
+        victim.proxy.abort()
+    elif mode == "half_open":
+        victim.proxy.half_open()
+    else:
+        victim.proxy.stall(args.stall_seconds)
+
+    wait = args.stall_seconds + 1.0 if mode == "stall" else args.timeout
+    result.paused = await observer.wait_until(paused, wait)
+    if not result.paused:
+        if mode != "stall":
+            result.error = "no pause"
+            return result
+        # Ridden out: once traffic flows again both players must still agree.
+        agree = await victim.wait_until(
+            lambda: victim.state is not None and observer.state is not None
+            and public_view(victim.state) == public_view(observer.state), args.timeout)
+        result.correct = agree and victim.role == role and victim.ws.state is websockets.protocol.State.OPEN
+        if not result.correct:
+            result.error = "state diverged after stall"
+        return result
+
+    result.pause = next(t for t, names in observer.pauses[seen:] if victim.name in names) - result.at
+    lifted_from = len(observer.pauses)
+    victim.proxy.abort()  # a stalled link is still open on the client side
+    await victim.close()
+    reconnect_at = time.time()
+    victim.state = None
+    try:
+        await victim.connect(resume=True, timeout=args.timeout)
+    except Exception as exc:  # noqa: BLE001 - report, don't crash the run
+        result.error = f"reconnect failed: {exc!r}"
+        return result
+
+    def resumed() -> bool:
+        return (victim.state is not None and observer.state is not None
+                and public_view(victim.state) == public_view(observer.state))
+
+    def lifted() -> bool:
+        return any(victim.name not in names for _, names in observer.pauses[lifted_from:])
+
+    if not await victim.wait_until(resumed, args.timeout):
+        result.error = "state mismatch after reconnect"
+        return result
+    if not await observer.wait_until(lifted, args.timeout):
+        result.error = "pause not lifted"
+        return result
+    lift_at = next(t for t, names in observer.pauses[lifted_from:] if victim.name not in names)
+    done = max(victim.state_at, lift_at)
+    result.resume = done - reconnect_at
+    result.recovery = done - result.at
+    result.correct = victim.role == role
+    if not result.correct:
+        result.error = f"role changed from {role} to {victim.role}"
+    return result
+
+
+async def post(http: httpx.AsyncClient, path: str, user: SyntheticUser, timeout: float) -> Dict[str, Any]:
+    """POST retried while the governor sheds load (the bcrypt work of a signup burst lags the loop).
+
+    The lag clears within seconds, long before the jittered ``Retry-After``
+    hint grows to, so retries are capped at two seconds apart.
+    """
+    deadline = time.monotonic() + 4 * timeout
+    while True:
+        res = await http.post(path, json={}, headers=user.basic)
+        if res.status_code != 503 or time.monotonic() > deadline:
+            res.raise_for_status()
+            return res.json()
+        await asyncio.sleep(min(2.0, float(res.headers.get("Retry-After", 1))))
+
+
+async def settle(http: httpx.AsyncClient, timeout: float) -> None:
+    """Wait until the governor stops shedding (skipped when ``/admin/usage`` is not reachable)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        res = await http.get("/admin/usage")
+        if res.status_code != 200 or not res.json().get("overloaded"):
+            return
+        await asyncio.sleep(0.5)
+
+
+async def open_table(args: argparse.Namespace, http: httpx.AsyncClient, host: Tuple[str, int],
+                     users: List[SyntheticUser], report: Report, setup: asyncio.Semaphore) -> List[ChaosClient]:
+    """Create a room for *users*, connect them through their proxies and start the game.
+
+    Every create, join and connect is a bcrypt check on the server's loop, so
+    tables are opened a few at a time (*setup*). Run all at once they keep
+    the governor shedding and stall the loop past a short heartbeat timeout.
+    Returns no clients if the table could not be opened.
+    """
+    latency, jitter = args.latency_ms / 1000.0, args.jitter_ms / 1000.0
+    table: List[ChaosClient] = []
+    room_id = "-"
+    try:
+        async with setup:
+            room_id = (await post(http, "/rooms", users[0], args.timeout))["room_id"]
+            for u in users[1:]:
+                await post(http, f"/rooms/{room_id}/join", u, args.timeout)
+            for i, user in enumerate(users):
+                proxy = FaultProxy(host[0], host[1], latency, jitter)
+                await proxy.start()
+                table.append(ChaosClient(user, room_id, proxy, i == 0, len(users)))
+            for c in table:
+                await c.connect(timeout=args.timeout)
+        started = await asyncio.gather(*(
+            c.wait_until(lambda c=c: c.state is not None and c.state["phase"] != "lobby" and c.role is not None,
+                         args.timeout)
+            for c in table
+        ))
+        if all(started):
+            return table
+        report.setup_errors.append(f"room {room_id[:8]}: game did not start")
+    except Exception as exc:  # noqa: BLE001 - report, don't crash the run
+        report.setup_errors.append(f"room {room_id[:8]}: {exc!r}")
+    await close_table(table)
+    return []
+
+
+async def run_table(args: argparse.Namespace, table: List[ChaosClient], report: Report) -> None:
+    try:
+        modes = args.modes
+        for n in range(args.faults):
+            await asyncio.sleep(random.uniform(0.0, args.spread))
+            report.results.append(await inject(args, table, modes[n % len(modes)]))
+    except Exception as exc:  # noqa: BLE001 - report, don't crash the run
+        report.setup_errors.append(f"room {table[0].room_id[:8]}: {exc!r}")
+    finally:
+        await close_table(table)
+
+
+async def close_table(table: List[ChaosClient]) -> None:
+    for c in table:
+        await c.close()
+        await c.proxy.close()
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+
+
+async def run(args: argparse.Namespace) -> None:
+    parts = urlsplit(args.url)
+    host = (parts.hostname or "127.0.0.1", parts.port or 80)
+    report = Report()
+    limits = httpx.Limits(max_connections=args.http_concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as http:
+        print(f"signing up {args.rooms * args.players} players ...")
+        sem = asyncio.Semaphore(args.http_concurrency)
+
+        async def _signup() -> SyntheticUser:
+            async with sem:
+                return await signup(http, "cx")
+
+        users = await asyncio.gather(*(_signup() for _ in range(args.rooms * args.players)))
+        tables = [users[i:i + args.players] for i in range(0, len(users), args.players)]
+        await settle(http, args.timeout)
+        print(f"opening {len(tables)} rooms ...")
+        setup = asyncio.Semaphore(2)
+        opened = await asyncio.gather(*(open_table(args, http, host, t, report, setup) for t in tables))
+        opened = [table for table in opened if table]
+        await settle(http, args.timeout)
+        print(f"{len(opened)} rooms x {args.faults} faults ({','.join(args.modes)}), "
+              f"latency {args.latency_ms:g}±{args.jitter_ms:g} ms ...")
+        start = time.perf_counter()
+        await asyncio.gather(*(run_table(args, table, report) for table in opened))
+        elapsed = time.perf_counter() - start
+
+    if args.server_log:
+        await asyncio.sleep(1.0)  # let the server's log writer catch up
+        log = ServerLog(args.server_log)
+        log.load()
+        for result in report.results:
+            if result.paused:
+                result.detect = log.detected(result)
+    print(report.render(elapsed))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--players", type=int, default=5, choices=range(5, 11))
+    parser.add_argument("--faults", type=int, default=3, help="faults injected per room")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated fault modes, used in turn")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every chunk in both directions")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--stall-seconds", type=float, default=1.0)
+    parser.add_argument("--spread", type=float, default=2.0, help="random wait before each fault, in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0, help="limit for every step of a fault")
+    parser.add_argument("--server-log", default=None, help="the server's AVALON_LOG_PATH, for detect times")
+    parser.add_argument("--http-concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn on a temporary database")
+    parser.add_argument("--port", type=int, default=8766, help="port used with --spawn")
+    parser.add_argument("--heartbeat-interval", type=float, default=1.0, help="server ping interval with --spawn")
+    parser.add_argument("--heartbeat-timeout", type=float, default=3.0, help="server reap timeout with --spawn")
+    args = parser.parse_args()
+    args.modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(args.modes) - set(MODES)
+    if unknown or not args.modes:
+        parser.error(f"--modes must be taken from {', '.join(MODES)}")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    proc: Optional[subprocess.Popen] = None
+    tmp: Optional[tempfile.TemporaryDirectory] = None
+    if args.spawn:
+        tmp = tempfile.TemporaryDirectory()
+        args.url = f"http://127.0.0.1:{args.port}"
+        args.server_log = os.path.join(tmp.name, "avalon.log")
+        env = dict(
+            os.environ,
+            AVALON_DB_PATH=os.path.join(tmp.name, "chaos.db"),
+            AVALON_LOG_PATH=args.server_log,
+            AVALON_LOG_FLUSH_SECONDS="0.1",
+            AVALON_HEARTBEAT_INTERVAL_SECONDS=str(args.heartbeat_interval),
+            AVALON_HEARTBEAT_TIMEOUT_SECONDS=str(args.heartbeat_timeout),
+        )
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.app:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+    try:
+        if proc:
+            asyncio.run(wait_for_server(args.url))
+        asyncio.run(run(args))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if tmp:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
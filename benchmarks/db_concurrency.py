@@ -0,0 +1,103 @@
+"""Concurrent read throughput against SQLite while game stats are being written.
+
+Runs the same workload twice – once with a single shared connection (the
+old ``sqlite://database.db`` setup) and once with the WAL + reader-pool
+configuration from :mod:`backend.db` – and prints reads/second for each.
+
+Usage::
+
+    python -m benchmarks.db_concurrency --users 500 --readers 4 --seconds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from tortoise import Tortoise
+
+from backend.db import build_tortoise_config
+from backend.models import User
+
+
+async def _seed(n_users: int) -> List[str]:
+    names = [f"bench_{i}" for i in range(n_users)]
+    await User.bulk_create(
+        [User(username=n, password_hash="x" * 60, display_name=n) for n in names]
+    )
+    return names
+
+
+async def _writer(stop: asyncio.Event, names: List[str], counter: Dict[str, int]) -> None:
+    """Mimic ``record_game_stats``: read-modify-save a handful of users per game."""
+    while not stop.is_set():
+        for name in random.sample(names, 7):
+            user = await User.filter(username=name).first()
+            if user is None:
+                continue
+            user.total_games += 1
+            user.good_wins += 1
+            await user.save()
+        counter["writes"] += 1
+
+
+async def _reader(stop: asyncio.Event, names: List[str], counter: Dict[str, int]) -> None:
+    """Mix of auth lookups and leaderboard scans."""
+    i = 0
+    while not stop.is_set():
+        if i % 20 == 0:
+            await User.all().order_by("-good_wins").limit(20)
+        else:
+            await User.filter(username=random.choice(names)).first()
+        counter["reads"] += 1
+        i += 1
+
+
+async def run_once(db_path: str, readers: int, n_users: int, concurrency: int, seconds: float) -> Dict[str, float]:
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    await Tortoise.init(config=build_tortoise_config(db_path, readers=readers))
+    await Tortoise.generate_schemas()
+    try:
+        names = await _seed(n_users)
+        counter = {"reads": 0, "writes": 0}
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(_writer(stop, names, counter))]
+        tasks += [asyncio.create_task(_reader(stop, names, counter)) for _ in range(concurrency)]
+        start = time.perf_counter()
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    finally:
+        await Tortoise.close_connections()
+    return {
+        "reads_per_s": counter["reads"] / elapsed,
+        "games_written_per_s": counter["writes"] / elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--readers", type=int, default=4, help="size of the reader pool")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent reader tasks")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        for label, readers in (("single connection", 0), (f"WAL + {args.readers} readers", args.readers)):
+            result = await run_once(db_path, readers, args.users, args.concurrency, args.seconds)
+            print(
+                f"{label:<24} reads/s={result['reads_per_s']:>10.1f}  "
+                f"games written/s={result['games_written_per_s']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
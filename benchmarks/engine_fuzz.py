@@ -0,0 +1,110 @@
+"""Headless fuzzing and throughput check for :mod:`backend.engine`.
+
+Plays complete games with random (mostly legal, sometimes junk) actions
+straight against the rules engine – no FastAPI, websockets or database –
+checks rule invariants after every transition and reports games/second.
+
+Usage::
+
+    python -m benchmarks.engine_fuzz --games 20000 --seed 1
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from backend import engine
+from backend.constants import EVIL_ROLES, GOOD_ROLES, QUEST_SIZES
+
+JUNK_ACTIONS: List[Dict[str, Any]] = [
+    {"type": "propose_team", "team": ["nobody"]},
+    {"type": "vote_team"},
+    {"type": "submit_card", "card": "X"},
+    {"type": "lady_choose", "target": None},
+    {"type": "assassination_vote", "target": "nobody"},
+    {"type": "restart_game"},
+    {"type": "unknown"},
+]
+
+
+def legal_action(state: engine.GameState, rng: random.Random) -> tuple[str, Dict[str, Any]]:
+    """Return ``(user_id, message)`` for one plausible move in *state*."""
+    players = list(state.players)
+    if state.phase == "lobby":
+        not_ready = [uid for uid, p in state.players.items() if not p.ready]
+        if not_ready:
+            return rng.choice(not_ready), {"type": "toggle_ready"}
+        return state.host_id, {"type": "start_game"}
+    if state.phase == "assassination":
+        voters = [uid for uid, p in state.players.items()
+                  if p.role in EVIL_ROLES and uid not in state.assassin_votes]
+        return rng.choice(voters), {"type": "assassination_vote", "target": rng.choice(state.assassin_candidates)}
+    sub = state.subphase
+    if sub == "proposal":
+        size = QUEST_SIZES[len(players)][state.round_number - 1]
+        return state.current_leader, {"type": "propose_team", "team": rng.sample(players, size)}
+    if sub == "voting":
+        voter = rng.choice([uid for uid in players if uid not in state.votes])
+        return voter, {"type": "vote_team", "approve": rng.random() < 0.6}
+    if sub == "quest":
+        member = rng.choice([uid for uid in state.current_team if uid not in state.submissions])
+        evil = state.players[member].role in EVIL_ROLES
+        return member, {"type": "submit_card", "card": "F" if evil and rng.random() < 0.5 else "S"}
+    if sub == "lady":
+        targets = [uid for uid in players if uid != state.lady_holder and uid not in state.lady_history]
+        return state.lady_holder, {"type": "lady_choose", "target": rng.choice(targets)}
+    raise AssertionError(f"no legal action in phase={state.phase} subphase={sub}")
+
+
+def check_invariants(state: engine.GameState) -> None:
+    assert state.good_wins + state.evil_wins == len(state.quest_history)
+    assert state.good_wins <= 3 and state.evil_wins <= 3
+    assert state.consecutive_rejections <= 5
+    if state.phase in ("in_game", "assassination"):
+        roles = [p.role for p in state.players.values()]
+        assert all(r in GOOD_ROLES or r in EVIL_ROLES for r in roles)
+        assert roles.count("Merlin") == 1
+    if state.phase == "finished":
+        assert state.winner in ("good", "evil")
+
+
+def play_game(n_players: int, rng: random.Random, junk_rate: float) -> str:
+    config = engine.GameConfig(oberon=n_players >= 7 and rng.random() < 0.5)
+    state = engine.GameState.new([f"Player {i}" for i in range(n_players)], config)
+    for _ in range(10_000):
+        if state.phase == "finished":
+            return state.winner or "?"
+        if rng.random() < junk_rate:
+            uid, msg = rng.choice(players_or_none(state)), rng.choice(JUNK_ACTIONS)
+        else:
+            uid, msg = legal_action(state, rng)
+        engine.apply(state, uid, msg, rng)
+        check_invariants(state)
+    raise AssertionError("game did not terminate")
+
+
+def players_or_none(state: engine.GameState) -> List[str]:
+    return list(state.players) + ["outsider"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--junk-rate", type=float, default=0.05, help="fraction of invalid actions injected")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    winners: Dict[str, int] = {}
+    start = time.perf_counter()
+    for i in range(args.games):
+        winner = play_game(5 + i % 6, rng, args.junk_rate)
+        winners[winner] = winners.get(winner, 0) + 1
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / elapsed:,.0f} games/s) winners={winners}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""End-to-end websocket load generator for a locally running server.
+
+Signs up synthetic users, creates ``--rooms`` tables of ``--players``
+players each and drives complete scripted games through ``/ws/{room_id}``
+(ready, start, propose, vote, submit, lady, assassination) while
+``--watchers`` clients sit on ``/lobbies_ws``. At the end it prints
+per-action latency percentiles (time from sending an action to the next
+state snapshot received by the sender), message throughput and the
+server's CPU / RSS.
+
+Usage::
+
+    # against an already running server (pass its pid for CPU/RSS sampling)
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --server-pid 12345
+
+    # or let the tool start uvicorn on a throwaway database
+    python -m benchmarks.loadgen --spawn --rooms 50 --players 7 --watchers 500
+
+Requires ``httpx`` and ``websockets`` (see ``benchmarks/requirements.txt``).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import websockets
+
+from backend.constants import EVIL_ROLES, QUEST_SIZES
+
+# -----------------------------
+# Statistics helpers
+# -----------------------------
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+@dataclass
+class Stats:
+    """Shared counters for one load-test run."""
+
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    sent: int = 0
+    received: int = 0
+    received_bytes: int = 0
+    lobby_updates: int = 0
+    games_finished: int = 0
+    winners: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    errors: List[str] = field(default_factory=list)
+
+    def report(self, elapsed: float) -> str:
+        lines = [
+            f"elapsed               {elapsed:10.2f} s",
+            f"games finished        {self.games_finished:10d}  ({dict(self.winners)})",
+            f"room msgs sent        {self.sent:10d}  ({self.sent / elapsed:.1f}/s)",
+            f"room msgs received    {self.received:10d}  ({self.received / elapsed:.1f}/s, "
+            f"{self.received_bytes / elapsed / 1024:.1f} KiB/s)",
+            f"lobby updates recv    {self.lobby_updates:10d}  ({self.lobby_updates / elapsed:.1f}/s)",
+            f"errors                {len(self.errors):10d}",
+            "",
+            f"{'action':<20}{'n':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+        ]
+        for action, values in sorted(self.latencies.items()):
+            values.sort()
+            lines.append(
+                f"{action:<20}{len(values):>8}"
+                f"{percentile(values, 50) * 1000:>10.2f}{percentile(values, 90) * 1000:>10.2f}"
+                f"{percentile(values, 99) * 1000:>10.2f}{values[-1] * 1000:>10.2f}"
+            )
+        for err in self.errors[:10]:
+            lines.append(f"error: {err}")
+        return "\n".join(lines)
+
+
+# -----------------------------
+# Server resource sampling
+# -----------------------------
+
+
+class ProcSampler:
+    """Sample CPU time and RSS of a local process from ``/proc`` (Linux)."""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.samples: List[Tuple[float, float, int]] = []  # (wall, cpu seconds, rss bytes)
+        self._task: Optional[asyncio.Task] = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _read(self) -> Optional[Tuple[float, float, int]]:
+        try:
+            with open(f"/proc/{self.pid}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/statm") as fh:
+                rss_pages = int(fh.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        cpu = (int(fields[11]) + int(fields[12])) / self._ticks  # utime + stime
+        return time.perf_counter(), cpu, rss_pages * self._page
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            sample = self._read()
+            if sample:
+                self.samples.append(sample)
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = 0.5) -> None:
+        self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        sample = self._read()
+        if sample:
+            self.samples.append(sample)
+
+    def report(self) -> str:
+        if len(self.samples) < 2:
+            return "server cpu/rss        unavailable"
+        (t0, c0, _), (t1, c1, _) = self.samples[0], self.samples[-1]
+        peak_rss = max(s[2] for s in self.samples)
+        return (
+            f"server cpu            {100 * (c1 - c0) / max(t1 - t0, 1e-9):10.1f} %  (avg of one core)\n"
+            f"server rss            {self.samples[-1][2] / 2**20:10.1f} MiB  (peak {peak_rss / 2**20:.1f} MiB)"
+        )
+
+
+# -----------------------------
+# Synthetic clients
+# -----------------------------
+
+
+@dataclass
+class SyntheticUser:
+    username: str
+    password: str
+    user_id: str = ""
+
+    @property
+    def token(self) -> str:
+        return base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+
+    @property
+    def basic(self) -> Dict[str, str]:
+        return {"Authorization": f"Basic {self.token}"}
+
+
+async def signup(http: httpx.AsyncClient, prefix: str) -> SyntheticUser:
+    user = SyntheticUser(f"{prefix}_{uuid.uuid4().hex[:10]}", uuid.uuid4().hex)
+    res = await http.post("/signup", json={
+        "username": user.username, "password": user.password, "display_name": user.username[-12:],
+    })
+    res.raise_for_status()
+    user.user_id = res.json()["user_id"]
+    return user
+
+
+def ws_url(base_url: str, path: str) -> str:
+    return base_url.replace("http://", "ws://").replace("https://", "wss://").rstrip("/") + path
+
+
+class GameBot:
+    """Scripted player that reacts to ``state`` snapshots for one seat."""
+
+    def __init__(self, user: SyntheticUser, is_host: bool, table_size: int, games: int,
+                 stats: Stats, fail_rate: float = 0.6, approve_rate: float = 0.85) -> None:
+        self.user = user
+        self.is_host = is_host
+        self.table_size = table_size
+        self.games_target = games
+        self.stats = stats
+        self.fail_rate = fail_rate
+        self.approve_rate = approve_rate
+        self.games_done = 0
+        self.done = asyncio.Event()
+        self._sent_keys: set = set()
+        self._pending: Optional[Tuple[str, float]] = None
+        self.ws: Any = None
+
+    async def send(self, action: str, payload: Dict[str, Any], key: Tuple) -> None:
+        if key in self._sent_keys:
+            return
+        self._sent_keys.add(key)
+        self._pending = (action, time.perf_counter())
+        self.stats.sent += 1
+        await self.ws.send(json.dumps({"type": action, **payload}))
+
+    async def on_state(self, s: Dict[str, Any]) -> None:
+        if self._pending is not None:
+            action, t0 = self._pending
+            self.stats.latencies[action].append(time.perf_counter() - t0)
+            self._pending = None
+
+        me = self.user.user_id
+        players = s["players"]
+        my_role = next((p["role"] for p in players if p["user_id"] == me), None)
+        epoch = (self.games_done, s["round_number"], s["consecutive_rejections"], len(s["quest_history"]))
+
+        if s["phase"] == "lobby":
+            mine = next((p for p in players if p["user_id"] == me), None)
+            if mine and not mine["ready"]:
+                await self.send("toggle_ready", {}, ("ready", self.games_done))
+            elif (self.is_host and len(players) == self.table_size
+                  and all(p["ready"] for p in players)):
+                await self.send("start_game", {}, ("start", self.games_done))
+        elif s["phase"] == "in_game":
+            sub = s["subphase"]
+            if sub == "proposal" and s["current_leader"] == me:
+                size = QUEST_SIZES[len(players)][s["round_number"] - 1]
+                others = [p["user_id"] for p in players if p["user_id"] != me]
+                team = [me] + random.sample(others, size - 1)
+                await self.send("propose_team", {"team": team}, ("propose",) + epoch)
+            elif sub == "voting" and me not in s["votes"]:
+                # Force approval on the 5th proposal so games don't all end in rejections.
+                approve = s["consecutive_rejections"] >= 3 or random.random() < self.approve_rate
+                await self.send("vote_team", {"approve": approve}, ("vote",) + epoch)
+            elif sub == "quest" and me in s["current_team"] and me not in s["submissions"]:
+                card = "F" if my_role in EVIL_ROLES and random.random() < self.fail_rate else "S"
+                await self.send("submit_card", {"card": card}, ("card",) + epoch)
+            elif sub == "lady" and s["lady_holder"] == me:
+                choices = [p["user_id"] for p in players
+                           if p["user_id"] != me and p["user_id"] not in s["lady_history"]]
+                if choices:
+                    await self.send("lady_choose", {"target": random.choice(choices)}, ("lady",) + epoch)
+        elif s["phase"] == "assassination":
+            if my_role in EVIL_ROLES and me not in s["assassin_votes"] and s["assassin_candidates"]:
+                target = random.choice(s["assassin_candidates"])
+                key = ("assassinate", tuple(s["assassin_candidates"])) + epoch
+                await self.send("assassination_vote", {"target": target}, key)
+        elif s["phase"] == "finished":
+            if ("finished", self.games_done) not in self._sent_keys:
+                self._sent_keys.add(("finished", self.games_done))
+                self.games_done += 1
+                if self.is_host:
+                    self.stats.games_finished += 1
+                    self.stats.winners[s["winner"] or "?"] += 1
+                if self.games_done >= self.games_target:
+                    self.done.set()
+                elif self.is_host:
+                    await self.send("restart_game", {}, ("restart", self.games_done))
+
+    async def run(self, base_url: str, room_id: str) -> None:
+        url = ws_url(base_url, f"/ws/{room_id}?auth={self.user.token}")
+        async with websockets.connect(url, max_size=None) as ws:
+            self.ws = ws
+            reader = asyncio.create_task(self._reader())
+            done = asyncio.create_task(self.done.wait())
+            await asyncio.wait({reader, done}, return_when=asyncio.FIRST_COMPLETED)
+            reader.cancel()
+            done.cancel()
+        if not self.done.is_set():
+            raise RuntimeError(f"closed by the server ({ws.close_code} {ws.close_reason}) after {self.games_done} games")
+
+    async def _reader(self) -> None:
+        async for raw in self.ws:
+            self.stats.received += 1
+            self.stats.received_bytes += len(raw)
+            msg = json.loads(raw)
+            if msg.get("type") == "state":
+                await self.on_state(msg["data"])
+            elif msg.get("type") == "ping":
+                await self.ws.send(json.dumps({"type": "pong", "ts": msg.get("ts")}))
+
+
+async def lobby_watcher(base_url: str, user: Optional[SyntheticUser], stats: Stats, stop: asyncio.Event) -> None:
+    path = "/lobbies_ws" + (f"?auth={user.token}" if user else "")
+    try:
+        async with websockets.connect(ws_url(base_url, path), max_size=None) as ws:
+            while not stop.is_set():
+                try:
+                    msg = json.loads(await asyncio.wait_for(ws.recv(), timeout=0.5))
+                    if msg.get("type") == "ping":
+                        await ws.send(json.dumps({"type": "pong", "ts": msg.get("ts")}))
+                        continue
+                    stats.lobby_updates += 1
+                except asyncio.TimeoutError:
+                    continue
+    except Exception as exc:  # noqa: BLE001 - report, don't crash the run
+        stats.errors.append(f"lobby watcher: {exc!r}")
+
+
+async def post_as(http: httpx.AsyncClient, path: str, user: SyntheticUser, timeout: float = 60.0) -> Dict[str, Any]:
+    """POST ``{}`` as *user*, waiting out 503 refusals for as long as ``Retry-After`` asks."""
+    deadline = time.monotonic() + timeout
+    while True:
+        res = await http.post(path, json={}, headers=user.basic)
+        if res.status_code != 503 or time.monotonic() > deadline:
+            res.raise_for_status()
+            return res.json()
+        await asyncio.sleep(float(res.headers.get("Retry-After", 1)))
+
+
+async def play_table(http: httpx.AsyncClient, base_url: str, users: List[SyntheticUser],
+                     games: int, stats: Stats) -> None:
+    room_id = (await post_as(http, "/rooms", users[0]))["room_id"]
+    for u in users[1:]:
+        await post_as(http, f"/rooms/{room_id}/join", u)
+    bots = [GameBot(u, i == 0, len(users), games, stats) for i, u in enumerate(users)]
+    results = await asyncio.gather(*(b.run(base_url, room_id) for b in bots), return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            stats.errors.append(f"room {room_id[:8]}: {r!r}")
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+
+
+async def wait_for_server(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        while time.monotonic() < deadline:
+            try:
+                await http.get("/rooms")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not come up")
+
+
+async def run(args: argparse.Namespace, server_pid: Optional[int]) -> None:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.http_concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as http:
+        print(f"signing up {args.rooms * args.players} players + {args.watchers} watchers ...")
+        sem = asyncio.Semaphore(args.http_concurrency)
+
+        async def _signup(prefix: str) -> SyntheticUser:
+            async with sem:
+                return await signup(http, prefix)
+
+        players = await asyncio.gather(*(_signup("lg") for _ in range(args.rooms * args.players)))
+        watchers_users = await asyncio.gather(*(_signup("lw") for _ in range(args.authed_watchers)))
+
+        sampler = ProcSampler(server_pid) if server_pid else None
+        if sampler:
+            sampler.start()
+
+        stop = asyncio.Event()
+        watcher_tasks = [
+            asyncio.create_task(lobby_watcher(
+                args.url, watchers_users[i] if i < len(watchers_users) else None, stats, stop))
+            for i in range(args.watchers)
+        ]
+        start = time.perf_counter()
+        tables = [players[i:i + args.players] for i in range(0, len(players), args.players)]
+        await asyncio.gather(*(play_table(http, args.url, t, args.games, stats) for t in tables))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*watcher_tasks)
+        if sampler:
+            await sampler.stop()
+
+    print(stats.report(elapsed))
+    if sampler:
+        print(sampler.report())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--players", type=int, default=7, choices=sorted(QUEST_SIZES))
+    parser.add_argument("--games", type=int, default=1, help="games played per room")
+    parser.add_argument("--watchers", type=int, default=100, help="/lobbies_ws connections")
+    parser.add_argument("--authed-watchers", type=int, default=0, help="how many watchers authenticate")
+    parser.add_argument("--http-concurrency", type=int, default=32)
+    parser.add_argument("--server-pid", type=int, default=None)
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn on a temporary database")
+    parser.add_argument("--port", type=int, default=8765, help="port used with --spawn")
+    args = parser.parse_args()
+
+    proc: Optional[subprocess.Popen] = None
+    tmp: Optional[tempfile.TemporaryDirectory] = None
+    server_pid = args.server_pid
+    if args.spawn:
+        tmp = tempfile.TemporaryDirectory()
+        args.url = f"http://127.0.0.1:{args.port}"
+        env = dict(os.environ, AVALON_DB_PATH=os.path.join(tmp.name, "loadgen.db"))
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.app:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+        server_pid = proc.pid
+    try:
+        if proc:
+            asyncio.run(wait_for_server(args.url))
+        asyncio.run(run(args, server_pid))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if tmp:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+"""Micro-benchmarks for the server's hot paths with regression thresholds.
+
+Each case is timed in-process with fake websockets (no network, no
+uvicorn). Results are compared against a baseline JSON file; any case
+whose median is slower than ``baseline * --threshold`` fails the run with
+a non-zero exit status, so the suite can gate performance work.
+
+Usage::
+
+    python -m benchmarks.micro                    # compare (records a baseline on first run)
+    python -m benchmarks.micro --save-baseline    # overwrite the measured cases in the baseline
+    python -m benchmarks.micro -k broadcast       # only cases whose name contains "broadcast"
+
+Baselines are machine specific and therefore not committed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend import game_logic, lobby, state
+from backend.logs import LOG, parse_level
+from backend.constants import EVIL_ROLES, GOOD_ROLES, QUEST_SIZES
+from backend.engine import GameConfig
+from backend.game_logic import build_role_deck, handle_ws_message, start_game
+from backend.room import Room, RoomPlayer
+from backend.spectators import SpectatorFeed
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# -----------------------------
+# Fakes & fixtures
+# -----------------------------
+
+
+class FakeWebSocket:
+    """Stands in for ``starlette.websockets.WebSocket``; counts what is sent."""
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.bytes = 0
+
+    async def send_text(self, data: str) -> None:
+        self.messages += 1
+        self.bytes += len(data)
+
+    async def send_json(self, data: Any, mode: str = "text") -> None:
+        await self.send_text(json.dumps(data, separators=(",", ":")))
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None) -> None:
+        pass
+
+
+def make_room(n_players: int, connected: bool = True, room_id: str = "bench", prefix: str = "u") -> Room:
+    host = RoomPlayer(f"{prefix}0", "Player 0", wins=3)
+    room = Room(room_id, host)
+    for i in range(1, n_players):
+        room.add_player(RoomPlayer(f"{prefix}{i}", f"Player {i}", wins=i))
+    if connected:
+        for uid in room.players:
+            room.connections[uid] = FakeWebSocket()
+    return room
+
+
+def make_started_room(n_players: int) -> Room:
+    room = make_room(n_players)
+    for p in room.players.values():
+        p.ready = True
+    asyncio.get_event_loop().run_until_complete(start_game(room))
+    return room
+
+
+# A case returns (setup, run): setup() builds fresh state outside the timer,
+# run(ctx) is the awaited code under measurement.
+Case = Tuple[Callable[[], Any], Callable[[Any], Awaitable[Any]]]
+CASES: Dict[str, Callable[[argparse.Namespace], Case]] = {}
+
+
+def case(name: str):
+    def deco(factory: Callable[[argparse.Namespace], Case]):
+        CASES[name] = factory
+        return factory
+    return deco
+
+
+# -----------------------------
+# Room broadcasting
+# -----------------------------
+
+for _n in (5, 7, 10):
+    def _broadcast_factory(args: argparse.Namespace, n: int = _n) -> Case:
+        room = make_started_room(n)
+        return (lambda: room), (lambda r: r.broadcast_state())
+
+    case(f"broadcast_state[{_n}p]")(_broadcast_factory)
+
+
+@case("broadcast_state[10p+1000 spectators]")
+def _spectated(args: argparse.Namespace) -> Case:
+    room = make_started_room(10)
+    room.spectators = SpectatorFeed()
+    for _ in range(1000):
+        room.spectators.admit(FakeWebSocket())
+
+    async def run(r: Room) -> None:
+        await r.broadcast_state()
+        if r.spectators._task is not None:  # include the shared fan-out
+            await r.spectators._task
+
+    return (lambda: room), run
+
+
+@case("broadcast_lobbies[rooms x watchers]")
+def _lobbies(args: argparse.Namespace) -> Case:
+    def setup() -> None:
+        if len(state.rooms) != args.lobby_rooms:
+            state.rooms.clear()
+            # One in ten rooms is mid-game, so only its members see it.
+            for i in range(args.lobby_rooms):
+                room = make_room(5, connected=False, room_id=f"r{i}", prefix=f"r{i}u")
+                if i % 10 == 0:
+                    room.phase = "in_game"
+                state.rooms[room.room_id] = room
+            state.lobby_connections.clear()
+            for i in range(args.lobby_watchers):
+                uid = f"r{i % args.lobby_rooms}u{i % 5}" if i % 2 else None
+                state.lobby_connections[FakeWebSocket()] = uid  # type: ignore[index]
+
+    async def run(_ctx: Any) -> None:
+        await lobby.broadcast_lobbies()
+
+    return setup, run
+
+
+# -----------------------------
+# Pure game helpers
+# -----------------------------
+
+@case("build_role_deck[10p]")
+def _deck(args: argparse.Namespace) -> Case:
+    config = GameConfig(oberon=True)
+
+    async def run(_ctx: Any) -> None:
+        for _ in range(100):
+            build_role_deck(10, config)
+
+    return (lambda: None), run
+
+
+@case("compute_round_leaders[10p]")
+def _leaders(args: argparse.Namespace) -> Case:
+    room = make_started_room(10)
+    room.quest_history = [{"round": 1, "leader": "Player 1"}, {"round": 2, "leader": "Player 2"}]
+    room.round_number = 3
+
+    async def run(r: Room) -> None:
+        for _ in range(100):
+            r._compute_round_leaders()
+
+    return (lambda: room), run
+
+
+# -----------------------------
+# handle_ws_message dispatch (one case per message type)
+# -----------------------------
+
+
+def _dispatch(setup_room: Callable[[], Tuple[Room, str, dict]]) -> Callable[[argparse.Namespace], Case]:
+    def factory(args: argparse.Namespace) -> Case:
+        async def run(ctx: Tuple[Room, str, dict]) -> None:
+            room, uid, msg = ctx
+            await handle_ws_message(room, uid, msg)
+
+        return setup_room, run
+
+    return factory
+
+
+def _lobby_ctx() -> Room:
+    state.lobby_connections.clear()
+    return make_room(7)
+
+
+def _game_ctx(subphase: str) -> Room:
+    state.lobby_connections.clear()
+    room = make_started_room(7)
+    room.subphase = subphase
+    room.stats_recorded = True  # keep the database out of dispatch timings
+    return room
+
+
+def _setup_toggle_ready():
+    return _lobby_ctx(), "u1", {"type": "toggle_ready"}
+
+
+def _setup_kick():
+    return _lobby_ctx(), "u0", {"type": "kick", "target": "u3"}
+
+
+def _setup_start_game():
+    room = _lobby_ctx()
+    for p in room.players.values():
+        p.ready = True
+    return room, "u0", {"type": "start_game"}
+
+
+def _setup_set_config():
+    return _lobby_ctx(), "u0", {"type": "set_config", "morgana": True, "percival": True, "lady_enabled": True}
+
+
+def _setup_propose_team():
+    room = _game_ctx("proposal")
+    team = list(room.players)[:QUEST_SIZES[7][0]]
+    return room, room.current_leader, {"type": "propose_team", "team": team}
+
+
+def _setup_vote_team():
+    room = _game_ctx("voting")
+    room.current_team = list(room.players)[:2]
+    ids = list(room.players)
+    room.votes = {pid: True for pid in ids[:-1]}
+    return room, ids[-1], {"type": "vote_team", "approve": True}
+
+
+def _setup_submit_card():
+    room = _game_ctx("quest")
+    ids = list(room.players)
+    room.current_team = ids[:2]
+    room.votes = {pid: True for pid in ids}
+    room.proposal_leader = room.current_leader
+    good = next(pid for pid, p in room.players.items() if p.role in GOOD_ROLES)
+    room.current_team = [good, next(pid for pid in ids if pid != good)]
+    room.submissions = {room.current_team[1]: "S"}
+    return room, good, {"type": "submit_card", "card": "S"}
+
+
+def _setup_lady_choose():
+    room = _game_ctx("lady")
+    target = next(pid for pid in room.players if pid not in room.lady_history)
+    return room, room.lady_holder, {"type": "lady_choose", "target": target}
+
+
+def _setup_assassination_vote():
+    room = _game_ctx("assassination")
+    room.phase = "assassination"
+    evil = [pid for pid, p in room.players.items() if p.role in EVIL_ROLES]
+    room.assassin_candidates = [pid for pid, p in room.players.items() if p.role in GOOD_ROLES]
+    room.assassin_votes = {pid: room.assassin_candidates[0] for pid in evil[:-1]}
+    return room, evil[-1], {"type": "assassination_vote", "target": room.assassin_candidates[0]}
+
+
+def _setup_restart_game():
+    room = _game_ctx("proposal")
+    room.phase = "finished"
+    room.winner = "good"
+    return room, room.host_id, {"type": "restart_game"}
+
+
+def _setup_reset_lobby():
+    room = _game_ctx("proposal")
+    return room, room.host_id, {"type": "reset_lobby"}
+
+
+for _name, _setup in (
+    ("toggle_ready", _setup_toggle_ready),
+    ("kick", _setup_kick),
+    ("start_game", _setup_start_game),
+    ("set_config", _setup_set_config),
+    ("propose_team", _setup_propose_team),
+    ("vote_team", _setup_vote_team),
+    ("submit_card", _setup_submit_card),
+    ("lady_choose", _setup_lady_choose),
+    ("assassination_vote", _setup_assassination_vote),
+    ("restart_game", _setup_restart_game),
+    ("reset_lobby", _setup_reset_lobby),
+):
+    case(f"handle_ws_message[{_name}]")(_dispatch(_setup))
+
+
+# -----------------------------
+# Matchmaking
+# -----------------------------
+
+@case("matchmaking_tick[5000 queued]")
+def _matchmaking(args: argparse.Namespace) -> Case:
+    from backend import matchmaking
+
+    # 5000 waiting players spread so that no bucket holds a full table, plus
+    # one table's worth that the measured pass has to find and seat.
+    # (enqueueing arms the matcher timer, hence the event loop).
+    loop = asyncio.get_event_loop()
+    pools = [matchmaking.pool_key(n, True, True, oberon, True) for n in range(5, 11) for oberon in (False, True)]
+    width = matchmaking.settings.MATCH_BUCKET_WIDTH
+    table = matchmaking.pool_key(7, True, True, False, True)
+    opened: List[str] = []
+
+    async def fill() -> None:
+        for i in range(5000):
+            pool = pools[i % len(pools)]
+            bucket = (i // len(pools)) % 120
+            matchmaking.enqueue(f"q{i}", f"Queued {i}", bucket * width, pool)
+
+    async def refill() -> None:
+        for i in range(7):
+            matchmaking.enqueue(f"m{i}", f"Match {i}", 500 * width, table)
+
+    loop.run_until_complete(fill())
+
+    def setup() -> float:
+        for room_id in opened:
+            state.rooms.pop(room_id, None)
+        opened.clear()
+        loop.run_until_complete(refill())
+        return time.monotonic()
+
+    async def run(now: float) -> None:
+        formed = matchmaking.match_once(now)
+        opened.extend(room_id for room_id, _ in formed)
+
+    return setup, run
+
+
+# -----------------------------
+# Structured logging (1000 calls per run)
+# -----------------------------
+
+def _logger(level: str) -> Any:
+    from backend import logs
+
+    path = os.path.join(tempfile.mkdtemp(prefix="avalon-bench-"), "bench.log")
+    return logs.StructuredLogger(logs.parse_level(level), path, 0, 0, {}, 0.05, 512, 0)
+
+
+@case("log_disabled[1000 debug at info]")
+def _log_disabled(args: argparse.Namespace) -> Case:
+    log = _logger("info")
+
+    async def run(_: None) -> None:
+        for _ in range(1000):
+            log.debug("ws_message", room_id="r", user_id="u", type="vote_team")
+
+    return (lambda: None), run
+
+
+@case("log_queued[1000 info]")
+def _log_queued(args: argparse.Namespace) -> Case:
+    log = _logger("info")
+
+    async def run(_: None) -> None:
+        for _ in range(1000):
+            log.info("ws_message", room_id="r", user_id="u", type="vote_team")
+
+    return (lambda: None), run
+
+
+# -----------------------------
+# Database
+# -----------------------------
+
+@case("record_game_stats[7p sqlite]")
+def _stats(args: argparse.Namespace) -> Case:
+    from tortoise import Tortoise
+
+    from backend.db import build_tortoise_config
+    from backend.models import User
+
+    tmp = tempfile.mkdtemp(prefix="avalon-bench-")
+    loop = asyncio.get_event_loop()
+
+    room = make_started_room(7)
+
+    async def init() -> Room:
+        await Tortoise.init(config=build_tortoise_config(os.path.join(tmp, "bench.db")))
+        await Tortoise.generate_schemas()
+        for uid, p in list(room.players.items()):
+            user = await User.create(username=f"bench_{uid}", password_hash="x", display_name=p.name)
+            p.user_id = str(user.id)
+        room.players = {p.user_id: p for p in room.players.values()}
+        room.phase = "finished"
+        room.winner = "good"
+        return room
+
+    loop.run_until_complete(init())
+
+    def setup() -> Room:
+        room.stats_recorded = False
+        return room
+
+    return setup, game_logic.record_game_stats
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+
+
+def measure(loop: asyncio.AbstractEventLoop, c: Case, min_time: float, min_iter: int) -> Dict[str, float]:
+    setup, run = c
+    times: List[float] = []
+    # Warm-up
+    loop.run_until_complete(run(setup()))
+    deadline = time.perf_counter() + min_time
+    while len(times) < min_iter or time.perf_counter() < deadline:
+        ctx = setup()
+        t0 = time.perf_counter()
+        loop.run_until_complete(run(ctx))
+        times.append(time.perf_counter() - t0)
+        if len(times) >= 100_000:
+            break
+    times.sort()
+    return {
+        "median_us": statistics.median(times) * 1e6,
+        "p90_us": times[int(len(times) * 0.9)] * 1e6,
+        "iterations": len(times),
+    }
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+async def _close_database() -> None:
+    from tortoise import Tortoise
+
+    if Tortoise._inited:
+        await Tortoise.close_connections()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="filter", default="", help="substring filter on case names")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="fail when median > baseline median * threshold")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent per case")
+    parser.add_argument("--min-iter", type=int, default=20)
+    parser.add_argument("--lobby-rooms", type=int, default=300)
+    parser.add_argument("--lobby-watchers", type=int, default=2000)
+    args = parser.parse_args(argv)
+    # Cases measure the server paths, not the server's log output (the
+    # logging cases use loggers of their own).
+    LOG.configure(level=parse_level("off"))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, factory in CASES.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(loop, factory(args), args.min_time, args.min_iter)
+        state.rooms.clear()
+        state.lobby_connections.clear()
+    # aiosqlite threads would otherwise keep the interpreter alive.
+    loop.run_until_complete(_close_database())
+
+    baseline = load_baseline(args.baseline)
+    regressions: List[str] = []
+    print(f"{'case':<44}{'median µs':>12}{'p90 µs':>12}{'baseline':>12}{'ratio':>8}")
+    for name, res in results.items():
+        base = (baseline or {}).get("results", {}).get(name)
+        ratio = res["median_us"] / base["median_us"] if base else None
+        flag = ""
+        if ratio is not None and ratio > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<44}{res['median_us']:>12.1f}{res['p90_us']:>12.1f}"
+            f"{(base['median_us'] if base else float('nan')):>12.1f}"
+            f"{(ratio if ratio is not None else float('nan')):>8.2f}{flag}"
+        )
+
+    if args.save_baseline or baseline is None:
+        merged = dict((baseline or {}).get("results", {}))
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({
+                "python": sys.version.split()[0],
+                "machine": platform.platform(),
+                "results": merged,
+            }, fh, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed beyond x{args.threshold}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Per-room memory footprint of the in-memory game state.
+
+Builds many fully populated rooms (lobby and mid-game) under
+:mod:`tracemalloc` and reports the traced bytes per room, optionally with
+the allocation sites that dominate. No websockets are attached, so the
+numbers cover exactly what an idle room keeps alive between messages.
+
+Usage::
+
+    python -m benchmarks.room_memory --rooms 2000 --players 7
+    python -m benchmarks.room_memory --top 5      # also list the biggest allocation sites
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import tracemalloc
+from typing import List
+
+from backend import engine
+from backend.room import Room, RoomPlayer
+
+
+def build(n_rooms: int, n_players: int, started: bool) -> List[Room]:
+    rooms = []
+    for r in range(n_rooms):
+        room = Room(f"room-{r:06d}", RoomPlayer(f"r{r}u0", "Player 0", wins=3))
+        for i in range(1, n_players):
+            room.add_player(RoomPlayer(f"r{r}u{i}", f"Player {i}", wins=i))
+        if started:
+            for p in room.players.values():
+                p.ready = True
+            engine.start_game(room, random.Random(r))
+        rooms.append(room)
+    return rooms
+
+
+def measure(n_rooms: int, n_players: int, started: bool, top: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot() if top else None
+    base = tracemalloc.get_traced_memory()[0]
+    rooms = build(n_rooms, n_players, started)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - base
+    if before is not None:
+        for stat in tracemalloc.take_snapshot().compare_to(before, "lineno")[:top]:
+            print(f"    {stat.size_diff / n_rooms:>8.0f} B/room  {stat.traceback[0]}")
+    tracemalloc.stop()
+    del rooms
+    return used / n_rooms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=7)
+    parser.add_argument("--top", type=int, default=0, help="show the N largest allocation sites per scenario")
+    args = parser.parse_args()
+
+    for label, started in (("lobby", False), ("in_game", True)):
+        per_room = measure(args.rooms, args.players, started, args.top)
+        print(f"{label:<8} {args.players}p  {per_room:>8.0f} B/room  ({args.rooms} rooms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,14 +20,118 @@ let roomId = null;
 let userId = null;
 let authToken = null; // base64(username:password)
 let ws = null;
+let lastSeq = null; // newest room event sequence number seen, sent back on reconnect
+let lastSeqRoom = null; // room that lastSeq belongs to
 let roomWs = null; // websocket for room list updates
 
+// ---- Reconnect backoff ---- //
+// Exponential backoff with jitter, so a server restart does not bring every
+// client back at the same instant. A "retry-after=<s>" close reason from the
+// server (sent when it is refusing connections under load) is a lower bound.
+const RECONNECT_BASE_MS = 1000;
+const RECONNECT_MAX_MS = 30000;
+
+function reconnectDelay(attempt, retryAfterSeconds = 0) {
+  const ceiling = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** attempt);
+  const jittered = ceiling / 2 + Math.random() * (ceiling / 2);
+  return Math.max(jittered, retryAfterSeconds * 1000 + Math.random() * RECONNECT_BASE_MS);
+}
+
+function retryAfterFrom(event) {
+  const match = /retry-after=(\d+(?:\.\d+)?)/.exec((event && event.reason) || "");
+  return match ? Number(match[1]) : 0;
+}
+
+let roomReconnects = 0; // consecutive failed room (re)connects
+let lobbyReconnects = 0; // same for the lobby feed
+
+// ---- Multiplexed websocket ---- //
+// The lobby feed and the current room share one /mux connection as named
+// channels. A MuxChannel behaves like a WebSocket for the code below, so
+// `ws` and `roomWs` keep their usual onmessage / onclose / send / close.
+let muxSocket = null;
+const muxChannels = new Map(); // channel name -> MuxChannel
+
+class MuxChannel {
+  constructor(name, subscribeFields) {
+    this.name = name;
+    this.subscribeFields = subscribeFields; // evaluated on every (re)subscribe
+    this.readyState = WebSocket.CONNECTING;
+    this.onmessage = null;
+    this.onclose = null;
+    this.onerror = null;
+  }
+
+  send(text) {
+    if (this.readyState !== WebSocket.OPEN) return;
+    // text is a serialised object: splice the channel in front.
+    muxSocket.send(`{"channel":${JSON.stringify(this.name)},${text.slice(1)}`);
+  }
+
+  close(code = 1000) {
+    if (this.readyState === WebSocket.CLOSED) return;
+    if (muxSocket && muxSocket.readyState === WebSocket.OPEN) {
+      muxSocket.send(JSON.stringify({ op: "unsubscribe", channel: this.name }));
+    }
+    this._closed(code, "");
+  }
+
+  _subscribe() {
+    muxSocket.send(JSON.stringify({ op: "subscribe", channel: this.name, ...this.subscribeFields() }));
+    this.readyState = WebSocket.OPEN;
+  }
+
+  _closed(code, reason) {
+    if (muxChannels.get(this.name) === this) muxChannels.delete(this.name);
+    this.readyState = WebSocket.CLOSED;
+    if (this.onclose) this.onclose({ code, reason: reason || "" });
+  }
+}
+
+function openMuxChannel(name, subscribeFields = () => ({})) {
+  const previous = muxChannels.get(name);
+  if (previous) {
+    previous.onclose = null; // replaced, not lost: no reconnect from the old handler
+    previous.close();
+  }
+  const channel = new MuxChannel(name, subscribeFields);
+  muxChannels.set(name, channel);
+  connectMux();
+  if (muxSocket.readyState === WebSocket.OPEN) channel._subscribe();
+  return channel;
+}
+
+function connectMux() {
+  if (muxSocket && muxSocket.readyState <= WebSocket.OPEN) return;
+  muxSocket = new WebSocket(`${WS_PROTOCOL}://${API_HOST}/mux`);
+  muxSocket.onopen = () => muxChannels.forEach(channel => channel._subscribe());
+  muxSocket.onmessage = event => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === "ping") {
+      muxSocket.send(JSON.stringify({ type: "pong", ts: msg.ts }));
+      return;
+    }
+    const channel = muxChannels.get(msg.channel);
+    if (!channel) return;
+    if (msg.type === "closed") channel._closed(msg.code, msg.reason);
+    else if (channel.onmessage) channel.onmessage({ data: event.data });
+  };
+  muxSocket.onerror = () => {
+    muxChannels.forEach(channel => channel.onerror && channel.onerror());
+  };
+  // Every channel sees the drop; their own onclose handlers reconnect.
+  muxSocket.onclose = event => {
+    [...muxChannels.values()].forEach(channel => channel._closed(event.code || 1006, event.reason));
+  };
+}
+
 // DOM Elements
 const landingSection = document.getElementById("landing");
 const lobbySection = document.getElementById("lobby");
 const gameSection = document.getElementById("game");
 const createRoomBtn = document.getElementById("createRoomBtn");
 const joinRoomBtn = document.getElementById("joinRoomBtn");
+const quickMatchBtn = document.getElementById("quickMatchBtn");
 const roleContainer = document.getElementById("roleContainer");
 const phaseContainer = document.getElementById("phaseContainer");
 const actionsContainer = document.getElementById("actionsContainer");
@@ -79,6 +183,11 @@ apiFetch("/game-details.json")
   .then(r => r.ok ? r.json() : null)
   .then(data => {
     GAME_DETAILS = data;
+    // Team membership comes from the role table, like on the server.
+    if (data && data.roles) {
+      const evil = Object.keys(data.roles).filter(r => data.roles[r].team === "Evil");
+      EVIL_ROLES.splice(0, EVIL_ROLES.length, ...evil);
+    }
   })
   .catch(err => console.warn("Failed to load game-details.json", err));
 
@@ -133,7 +242,7 @@ function renderLeaderboard(entries) {
     const row = document.createElement("div");
     row.className = "leaderboard-entry";
     row.innerHTML = `
-      <span><strong>${e.display_name}</strong> <span class="wins-badge">🏆 ${e.wins}</span></span>
+      <span><strong>${e.display_name}</strong> <span class="wins-badge">★ ${Math.round(e.rating)}</span> <span class="wins-badge">🏆 ${e.wins}</span></span>
       <button class="btn" data-user="${e.username}">Details</button>
     `;
     row.querySelector("button").onclick = async evt => {
@@ -191,6 +300,7 @@ function renderProfile(p) {
     <button class="btn" id="saveProfileBtn">Save</button>
     <hr style="margin:1rem 0;border-color:var(--color-border);"/>
     <p>Total Games: ${p.total_games}</p>
+    <p>Rating: <span class="wins-badge">★ ${Math.round(p.rating)}</span>${p.rated_games < 10 ? " (provisional)" : ""}</p>
     <p><span class="wins-badge">🏆 ${p.good_wins + p.evil_wins}</span> (${p.good_wins} Good, ${p.evil_wins} Evil wins)</p>
   `;
   profileSection.appendChild(form);
@@ -425,6 +535,13 @@ async function createRoom(password = null) {
       show(landingSection);
       return;
     }
+    if (res.status === 429 || res.status === 503) {
+      // Refused by the server's room limits; the detail says which.
+      const { detail } = await res.json().catch(() => ({}));
+      showToast(detail || "The server is busy – please try again in a moment.");
+      show(landingSection);
+      return;
+    }
     if (!res.ok) throw new Error(`Server responded ${res.status}`);
 
     const data = await res.json();
@@ -445,6 +562,38 @@ async function createRoom(password = null) {
 }
 
 
+// ---- Matchmaking queue ---- //
+let matchQueued = false;
+
+function setMatchQueued(queued) {
+  matchQueued = queued;
+  quickMatchBtn.textContent = queued ? "Leave Queue" : "Quick Match";
+}
+
+quickMatchBtn.onclick = async () => {
+  try {
+    const res = await apiFetch(`/matchmaking`, {
+      method: matchQueued ? "DELETE" : "POST",
+      headers: {
+        Authorization: `Basic ${authToken}`,
+        "Content-Type": "application/json",
+      },
+      body: matchQueued ? undefined : JSON.stringify({}),
+    });
+    if (res.status === 401) {
+      redirectHomeWithMessage("Your credentials were invalid.", true);
+      return;
+    }
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) return showToast(data.detail || "Matchmaking is unavailable right now.");
+    if (data.status === "matched") return joinRoom(data.room_id);
+    setMatchQueued(data.status === "queued");
+    if (matchQueued) showToast(`Looking for a ${data.players}-player table…`);
+  } catch (err) {
+    showToast("Network error.");
+  }
+};
+
 async function joinRoom(id, password = null) {
   show(lobbySection);
   lobbySection.style.padding = '2rem';
@@ -503,12 +652,25 @@ async function joinRoom(id, password = null) {
 }
 
 function initWebSocket() {
-  const wsUrl = `${WS_PROTOCOL}://${API_HOST}/ws/${roomId}?auth=${encodeURIComponent(authToken)}`;
-  ws = new WebSocket(wsUrl);
+  // Resuming the same room: ask the server to replay only what we missed.
+  ws = openMuxChannel(`room:${roomId}`, () => {
+    const fields = { auth: authToken };
+    if (lastSeqRoom === roomId && lastSeq !== null) fields.since = lastSeq;
+    return fields;
+  });
 
   ws.onmessage = event => {
     const msg = JSON.parse(event.data);
-    if (msg.type === "state") renderState(msg.data);
+    if (typeof msg.seq === "number") {
+      const known = lastSeqRoom === roomId && lastSeq !== null;
+      if (known && msg.type !== "state" && msg.seq <= lastSeq) return; // already handled
+      lastSeq = known ? Math.max(lastSeq, msg.seq) : msg.seq;
+      lastSeqRoom = roomId;
+    }
+    if (msg.type === "state") {
+      roomReconnects = 0;
+      renderState(msg.data);
+    }
     else if (msg.type === "info") {
       privateInfo = msg;
       if (!roleModal.classList.contains("hidden") && window._currentRoleName) {
@@ -536,6 +698,15 @@ function initWebSocket() {
       // Globally announce who inspected whom using the Lady of the Lake
       showToast(`${msg.inspector} inspected ${msg.target} with the Lady of the Lake`);
     }
+    else if (msg.type === "phase_timeout") {
+      showToast(`Time ran out (${msg.phase}) – default moves were played.`);
+    }
+    else if (msg.type === "overloaded") {
+      showToast(msg.reason);
+    }
+    else if (msg.type === "throttled") {
+      showToast("You're doing that too fast – slow down a little.");
+    }
   };
 
   ws.onclose = event => {
@@ -543,14 +714,19 @@ function initWebSocket() {
       return redirectHomeWithMessage("Your credentials were invalid.", true);
     if (event.code === 4002)
       return redirectHomeWithMessage("Room connection was invalid.", false);
+    if (event.code === 4004)
+      return redirectHomeWithMessage("The game is over and the room has closed.", false);
     if (event.code === 4003) {
       showToast(
         "Connection closed – this tab is paused because another one is active."
       );
       return;
     }
-    showToast("Disconnected. Attempting to reconnect...");
-    setTimeout(initWebSocket, 3000);
+    const retryAfter = retryAfterFrom(event);
+    showToast(retryAfter
+      ? `The server is busy – reconnecting in ${Math.ceil(retryAfter)}s...`
+      : "Disconnected. Attempting to reconnect...");
+    setTimeout(initWebSocket, reconnectDelay(roomReconnects++, retryAfter));
   };
 
   ws.onerror = () => {
@@ -633,6 +809,7 @@ function renderLobby(state) {
         <p id="startRequirement" class="hidden" style="color: var(--color-text-secondary); font-style: italic;">At least 5 players are needed to start.</p>
         <button class="btn" id="readyBtn">Ready</button>
         <button class="btn hidden" id="startGameBtn">Start Game</button>
+        <button class="btn hidden" id="addBotBtn">Add Bot</button>
       </div>
     `;
     lobbySection.innerHTML = lobbyHTML;
@@ -658,6 +835,20 @@ function renderLobby(state) {
         ws.send(JSON.stringify({ type: "start_game" }));
       }
     };
+    document.getElementById("addBotBtn").onclick = async () => {
+      const res = await apiFetch(`/rooms/${roomId}/bots`, {
+        method: "POST",
+        headers: {
+          Authorization: `Basic ${authToken}`,
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({ count: 1 }),
+      });
+      if (!res.ok) {
+        const err = await res.json().catch(() => ({}));
+        showToast(err.detail || "Could not add a bot.");
+      }
+    };
   }
 
   const roomIdDisplay = document.getElementById("roomIdDisplay");
@@ -665,6 +856,7 @@ function renderLobby(state) {
   const readyBtn = document.getElementById("readyBtn");
   const startGameBtn = document.getElementById("startGameBtn");
   const startRequirement = document.getElementById("startRequirement");
+  const addBotBtn = document.getElementById("addBotBtn");
 
   roomIdDisplay.textContent = state.room_id;
 
@@ -716,8 +908,10 @@ function renderLobby(state) {
       state.players.length >= 5 &&
       state.players.length <= 10;
     startGameBtn.disabled = !canStart;
+    addBotBtn.classList.toggle("hidden", state.players.length >= 10);
   } else {
     startGameBtn.classList.add("hidden");
+    addBotBtn.classList.add("hidden");
   }
 
   renderConfigOptions(state);
@@ -778,21 +972,21 @@ function renderConfigOptions(state) {
     {
       key: "mp",
       name: "Morgana & Percival",
-      img: "/images/morgana.png", // Using Morgana to represent the pair
+      img: "/images/morgana.png?w=320", // Using Morgana to represent the pair
       enabled: cfg.morgana && cfg.percival,
       available: true,
     },
     {
       key: "oberon",
       name: "Oberon",
-      img: "/images/oberon.png",
+      img: "/images/oberon.png?w=320",
       enabled: cfg.oberon,
       available: isOberonAvailable,
     },
     {
       key: "lady",
       name: "Lady of the Lake",
-      img: "/images/ladyofthelake.png",
+      img: "/images/ladyofthelake.png?w=320",
       enabled: cfg.lady_enabled,
       available: true,
     },
@@ -821,8 +1015,8 @@ function renderConfigOptions(state) {
       card.classList.add("dual");
       card.innerHTML = `
         <div class="dual-img-wrapper">
-          <img src="/images/morgana.png" alt="Morgana">
-          <img src="/images/percival.png" alt="Percival">
+          <img src="/images/morgana.png?w=320" alt="Morgana">
+          <img src="/images/percival.png?w=320" alt="Percival">
         </div>
         <div class="overlay-icon"></div>
         <span class="info-icon" title="Open Wiki">?</span>
@@ -955,7 +1149,7 @@ function renderGame(state) {
     btn.textContent = "View Your Role";
     btn.className = "btn lg";
     const imgFile = `${me.role.toLowerCase().replace(/ /g, "")}.png`;
-    const imgSrc = `/images/${imgFile}`;
+    const imgSrc = `/images/${imgFile}?w=640`;
     btn.onclick = () => showRoleModal(me.role, imgSrc);
     roleContainer.style.textAlign = "center";
     roleContainer.style.marginTop = "2rem";
@@ -1136,7 +1330,7 @@ function renderGameOver(state) {
       <strong>${pl.name}</strong><br/>
       <img src="/images/${pl.role
         .toLowerCase()
-        .replace(/ /g, "")}.png" style="max-width:80px;"><br/>
+        .replace(/ /g, "")}.png?w=160" style="max-width:80px;"><br/>
       <span>${pl.role}</span><br/>
       <span class="wins-badge">🏆 ${pl.wins}</span>
     `;
@@ -1679,18 +1873,24 @@ function renderRoomList(rooms) {
 
 function initRoomWebSocket() {
   if (roomWs && roomWs.readyState !== WebSocket.CLOSED) return;
-  const wsUrl = `${WS_PROTOCOL}://${API_HOST}/lobbies_ws${authToken ? `?auth=${encodeURIComponent(authToken)}` : ""}`;
-  roomWs = new WebSocket(wsUrl);
+  roomWs = openMuxChannel("lobbies", () => (authToken ? { auth: authToken } : {}));
   roomWs.onmessage = event => {
     try {
       const msg = JSON.parse(event.data);
       if (msg.type === "lobbies" && Array.isArray(msg.data)) {
+        lobbyReconnects = 0;
         renderRoomList(msg.data);
+      } else if (msg.type === "match_found") {
+        setMatchQueued(false);
+        joinRoom(msg.room_id);
+      } else if (msg.type === "matchmaking_expired") {
+        setMatchQueued(false);
+        showToast("No table was found in time – please queue again.");
       }
     } catch (e) { /* ignore parse errors */ }
   };
-  roomWs.onclose = () => {
-    setTimeout(initRoomWebSocket, 3000);
+  roomWs.onclose = event => {
+    setTimeout(initRoomWebSocket, reconnectDelay(lobbyReconnects++, retryAfterFrom(event)));
   };
   roomWs.onerror = () => {};
 }